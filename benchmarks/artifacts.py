@@ -0,0 +1,283 @@
+"""
+Checks of the Checkstyle artifact cache against a local HTTP server: fetches a generated
+artifact into a fresh cache directory and checks that downloads are verified against pinned
+checksums, that a partial file left by a stopped run is resumed with a range request, that a
+failed download is reported cleanly and resumed by the next run, that concurrent runs only
+download once and that artifacts can be used offline from a mirror directory, timing each
+scenario
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+import http.server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import run_checkstyle
+
+DESCRIPTION = "Checks downloading, verifying and mirroring artifacts against a local server"
+ARTIFACT_NAME = "artifact-1.0.bin"
+RESULT_FORMAT = "{:<20} {:>8.3f}s  {}"
+CRASH_TEXT = "An unexpected error has occurred"
+
+
+class ArtifactHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the server's artifact, honouring range requests and cutting the response
+    short when the server is set to truncate it
+    """
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """
+        Sends the artifact (or the requested range of it), recording the request
+        """
+
+        content = self.server.content
+        self.server.requests.append(self.headers.get("Range"))
+        offset = 0
+        requested = self.headers.get("Range", "")
+        if requested.startswith("bytes=") and requested.endswith("-"):
+            offset = int(requested[len("bytes="):-1])
+        if offset >= len(content):
+            self.send_response(416)
+            self.end_headers()
+            return
+
+        self.send_response(206 if offset else 200)
+        if offset:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(
+                offset, len(content) - 1, len(content)))
+        self.send_header("Content-Length", str(len(content) - offset))
+        self.end_headers()
+        body = content[offset:]
+        if self.server.truncate:
+            body = body[:len(body) // 2]
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        """
+        Keeps the server quiet
+        """
+
+
+@contextlib.contextmanager
+def artifact_server(content):
+    """
+    Serves content on a local port for the duration of the block, yielding the server
+    """
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ArtifactHandler)
+    server.content = content
+    server.requests = []
+    server.truncate = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch(url, mirror=None, offline=False):
+    """
+    Runs find_or_download for the artifact, returning its path and everything it printed
+    """
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        path, _ = run_checkstyle.find_or_download(ARTIFACT_NAME, url, mirror=mirror,
+                                                  offline=offline)
+    return path, output.getvalue()
+
+
+def cached_path():
+    """
+    Gets the path the artifact is cached at
+    """
+
+    return os.path.join(run_checkstyle.get_cache_directory(), run_checkstyle.ARTIFACT_DIRECTORY,
+                        ARTIFACT_NAME)
+
+
+def clear_cache():
+    """
+    Removes the artifact cache directory
+    """
+
+    shutil.rmtree(os.path.dirname(cached_path()), ignore_errors=True)
+
+
+def read_file(path):
+    """
+    Reads the file at path as bytes
+    """
+
+    with open(path, "rb") as artifact_file:
+        return artifact_file.read()
+
+
+def check_download(server, content):
+    """
+    Downloads the artifact into an empty cache, then uses the cached copy
+    """
+
+    path, _ = fetch(server.url)
+    downloaded = path is not None and read_file(path) == content
+    again, _ = fetch(server.url)
+    return downloaded and again == path and len(server.requests) == 1
+
+
+def check_resume(server, content):
+    """
+    Resumes the partial file a stopped run left behind with a range request
+    """
+
+    os.makedirs(os.path.dirname(cached_path()), exist_ok=True)
+    with open(cached_path() + run_checkstyle.PARTIAL_SUFFIX, "wb") as partial_file:
+        partial_file.write(content[:len(content) // 3])
+    path, _ = fetch(server.url)
+    return path is not None and read_file(path) == content and \
+        server.requests == ["bytes={}-".format(len(content) // 3)]
+
+
+def check_interrupted(server, content):
+    """
+    Reports a download cut short by the server without crashing, keeping what was
+    downloaded so that the next run resumes it with a range request
+    """
+
+    server.truncate = True
+    path, output = fetch(server.url)
+    partial_path = cached_path() + run_checkstyle.PARTIAL_SUFFIX
+    kept = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    server.truncate = False
+    resumed, _ = fetch(server.url)
+    return path is None and CRASH_TEXT not in output and "could not be downloaded" in output \
+        and 0 < kept < len(content) and resumed is not None and read_file(resumed) == content \
+        and server.requests == [None, "bytes={}-".format(kept)]
+
+
+def check_mismatch(server, _):
+    """
+    Refuses to cache a download that doesn't match its pinned checksum
+    """
+
+    run_checkstyle.ARTIFACT_CHECKSUMS[ARTIFACT_NAME] = hashlib.sha256(b"other").hexdigest()
+    path, output = fetch(server.url)
+    return path is None and CRASH_TEXT not in output and not os.path.exists(cached_path())
+
+
+def check_tampered(server, content):
+    """
+    Fetches the artifact again once its cached copy no longer matches its pinned checksum
+    """
+
+    fetch(server.url)
+    with open(cached_path(), "ab") as artifact_file:
+        artifact_file.write(b"tampered")
+    path, _ = fetch(server.url)
+    return path is not None and read_file(path) == content and len(server.requests) == 2
+
+
+def fetch_in_process(url, cache_directory, pinned):
+    """
+    Runs find_or_download in a separate process using the given cache directory,
+    returning the path it found
+    """
+
+    os.environ["XDG_CACHE_HOME"] = cache_directory
+    run_checkstyle.ARTIFACT_CHECKSUMS.update(pinned)
+    return fetch(url)[0]
+
+
+def check_concurrent(server, content):
+    """
+    Starts several runs at once, which only download the artifact once between them
+    """
+
+    arguments = (server.url, os.environ["XDG_CACHE_HOME"], run_checkstyle.ARTIFACT_CHECKSUMS)
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        paths = pool.starmap(fetch_in_process, [arguments] * 4)
+    return len(set(paths)) == 1 and paths[0] is not None and \
+        read_file(paths[0]) == content and len(server.requests) == 1
+
+
+def check_offline(server, content):
+    """
+    Copies the artifact from a mirror directory without touching the network, and
+    refuses to download it offline when the mirror doesn't have it
+    """
+
+    mirror = tempfile.mkdtemp(prefix="artifact-mirror-")
+    try:
+        missing, _ = fetch(server.url, mirror=mirror, offline=True)
+        with open(os.path.join(mirror, ARTIFACT_NAME), "wb") as mirror_file:
+            mirror_file.write(content)
+        path, _ = fetch(server.url, mirror=mirror, offline=True)
+    finally:
+        shutil.rmtree(mirror)
+    return missing is None and path is not None and read_file(path) == content and \
+        not server.requests
+
+
+CHECKS = {"download": check_download, "resume": check_resume,
+          "interrupted": check_interrupted, "checksum mismatch": check_mismatch,
+          "tampered cache": check_tampered, "concurrent": check_concurrent,
+          "offline mirror": check_offline}
+
+
+def run_check(name, content):
+    """
+    Runs the named check against a fresh server and cache, with the artifact's checksum
+    pinned, printing how long it took and whether it passed
+    """
+
+    clear_cache()
+    run_checkstyle.ARTIFACT_CHECKSUMS[ARTIFACT_NAME] = hashlib.sha256(content).hexdigest()
+    with artifact_server(content) as server:
+        server.url = "http://127.0.0.1:{}/{}".format(server.server_address[1], ARTIFACT_NAME)
+        start = time.perf_counter()
+        passed = CHECKS[name](server, content)
+        elapsed = time.perf_counter() - start
+    print(RESULT_FORMAT.format(name, elapsed, "OK" if passed else "FAILED"))
+    return passed
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--size", type=int, default=10 * 1024 * 1024,
+                        help="the size of the generated artifact in bytes")
+    parser.add_argument("--checks", nargs="+", choices=list(CHECKS), default=list(CHECKS),
+                        help="the checks to run")
+    parsed_args = parser.parse_args()
+
+    content = os.urandom(parsed_args.size)
+    cache_directory = tempfile.mkdtemp(prefix="artifact-cache-")
+    os.environ["XDG_CACHE_HOME"] = cache_directory
+    passed = True
+    try:
+        for name in parsed_args.checks:
+            passed = run_check(name, content) and passed
+    finally:
+        shutil.rmtree(cache_directory)
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,115 @@
+"""
+Benchmark comparing the ignore-aware file discovery used by the checker scripts
+against the os.walk-based discovery it replaced, on a large synthetic project tree
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import run_checkstyle
+
+DESCRIPTION = "Benchmarks file discovery over a synthetic project tree"
+EXTENSION = ".java"
+RESULT_FORMAT = "{:<12} {:>8.3f}s (best of {}) {:>8} files"
+
+
+def walk_files(path, extension):
+    """
+    The original os.walk-based discovery, which visits every directory
+    """
+
+    file_list = []
+    for root, _, files in os.walk(path):
+        for file in files:
+            if file.endswith(extension):
+                file_list.append(os.path.join(root, file))
+
+    return file_list
+
+
+def generate_tree(path, source_dirs, files_per_dir, ignored_files):
+    """
+    Generates a project with source_dirs directories of source files, plus
+    dependency/build directories holding ignored_files files in total that
+    either match the default ignored directories or the project's .gitignore
+    """
+
+    for index in range(source_dirs):
+        directory = os.path.join(path, "src", "package{}".format(index // 10),
+                                 "module{}".format(index))
+        os.makedirs(directory)
+        for file_index in range(files_per_dir):
+            with open(os.path.join(directory, "File{}{}".format(file_index, EXTENSION)), "w"):
+                pass
+
+    with open(os.path.join(path, ".gitignore"), "w") as gitignore:
+        gitignore.write("/generated/\n*.class\n")
+
+    # Spread the ignored files over directories of 100 files each
+    ignored_roots = ["node_modules", os.path.join(".git", "objects"), "build", "generated"]
+    for index in range(ignored_files // 100):
+        root = ignored_roots[index % len(ignored_roots)]
+        directory = os.path.join(path, root, "dir{}".format(index))
+        os.makedirs(directory)
+        for file_index in range(100):
+            name = "file{}{}".format(file_index, EXTENSION if file_index % 2 else ".js")
+            with open(os.path.join(directory, name), "w"):
+                pass
+
+
+def best_time(function, repeat):
+    """
+    Runs function repeat times, returning the fastest time and the last result
+    """
+
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--dirs", type=int, default=500,
+                        help="the number of source directories to generate")
+    parser.add_argument("--files", type=int, default=10,
+                        help="the number of source files in each source directory")
+    parser.add_argument("--ignored", type=int, default=40000,
+                        help="the number of files in ignored directories")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="the number of times to time each implementation")
+    parsed_args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="discovery-benchmark-")
+    try:
+        print("Generating {} source files and {} ignored files in {}".format(
+            parsed_args.dirs * parsed_args.files, parsed_args.ignored, path))
+        generate_tree(path, parsed_args.dirs, parsed_args.files, parsed_args.ignored)
+
+        implementations = [("os.walk", lambda: walk_files(path, EXTENSION)),
+                           ("find_files", lambda: run_checkstyle.find_files(path, EXTENSION))]
+        for name, function in implementations:
+            elapsed, files = best_time(function, parsed_args.repeat)
+            print(RESULT_FORMAT.format(name, elapsed, parsed_args.repeat, len(files)))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    bootstrap()
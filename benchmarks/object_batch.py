@@ -0,0 +1,96 @@
+"""
+Benchmark of bulk imports through the Object API: creates, fetches and deletes the same
+objects one request at a time and then in batches through the Flask test client, for each
+storage backend, reporting the objects handled per second
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "flask"))
+
+# pylint: disable=wrong-import-position
+from models.store import STORES
+
+DESCRIPTION = "Compares per-object and batched requests for bulk imports"
+RESULT_FORMAT = "{:<8} {:<10} {:>12,.0f} creations/s {:>12,.0f} gets/s {:>12,.0f} deletions/s"
+
+
+def time_requests(function, calls):
+    """
+    Calls function once per item of calls, returning the time taken
+    """
+
+    start = time.perf_counter()
+    for call in calls:
+        function(call)
+    return time.perf_counter() - start
+
+
+def run_backend(backend, path, object_count, batch_size):
+    """
+    Times creating, fetching and deleting object_count objects one request at a time and
+    in batches of batch_size through an app using the given backend, returning the rates
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from api import app_factory
+
+    app = app_factory({"OBJECT_STORE": backend, "OBJECT_STORE_PATH": path})
+    names = ["object{}".format(index) for index in range(object_count)]
+    batches = [names[index:index + batch_size] for index in range(0, len(names), batch_size)]
+    rates = {}
+    with app.test_client() as client:
+        times = (
+            time_requests(lambda name: client.post("/object/" + name, json={"value": name}),
+                          names),
+            time_requests(lambda name: client.get("/object/" + name), names),
+            time_requests(lambda name: client.delete("/object/" + name), names))
+        rates["single"] = [object_count / elapsed for elapsed in times]
+
+        times = (
+            time_requests(lambda batch: client.post(
+                "/objects", json=[{"name": name, "value": name} for name in batch]), batches),
+            time_requests(lambda batch: client.get("/objects", query_string={"name": batch}),
+                          batches),
+            time_requests(lambda batch: client.delete("/objects", json=batch), batches))
+        rates["batched"] = [object_count / elapsed for elapsed in times]
+
+    return rates
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--backends", nargs="+", choices=list(STORES), default=list(STORES),
+                        help="the backends to benchmark")
+    parser.add_argument("--objects", type=int, default=2000,
+                        help="the number of objects to import")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="the number of objects in each batch")
+    parsed_args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="object-batch-benchmark-")
+    try:
+        for backend in parsed_args.backends:
+            # The app can only be set up once, so each backend gets a fresh process
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                rates = pool.apply(run_backend, (backend, os.path.join(path, backend),
+                                                 parsed_args.objects, parsed_args.batch_size))
+            for mode, (creations, gets, deletions) in rates.items():
+                print(RESULT_FORMAT.format(backend, mode, creations, gets, deletions))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,121 @@
+"""
+Read-heavy load generator for the Object resource's HTTP caching: simulated clients poll
+objects (and the collection listing) through the Flask test client while a few writes
+change them, once always fetching full responses and once revalidating cached responses
+with If-None-Match, reporting the rate of 304 responses and the bytes and CPU time saved
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "flask"))
+
+# pylint: disable=wrong-import-position
+from models.store import STORES
+
+DESCRIPTION = "Measures 304 rates and CPU saved by conditional GETs under a read-heavy load"
+RESULT_FORMAT = "{:<14} {:>9,} requests {:>6.1%} 304s {:>12,} bytes {:>8.1f}us CPU/request"
+SAVINGS_FORMAT = "Revalidating saved {:.1%} of the bytes and {:.1%} of the CPU time"
+
+
+def reset_objects(client, object_count, value_size):
+    """
+    Recreates every object with a fresh value
+    """
+
+    for index in range(object_count):
+        client.delete("/object/object{}".format(index))
+        client.post("/object/object{}".format(index), json={"value": "v" * value_size})
+
+
+def generate_load(client, settings, conditional):
+    """
+    Sends settings["requests"] requests, returning the number of 304 responses, the bytes
+    received and the CPU time taken
+    """
+
+    generator = random.Random(0)
+    etags = {}
+    not_modified = 0
+    received = 0
+    start = time.process_time()
+    for _ in range(settings["requests"]):
+        roll = generator.random()
+        if roll < settings["write_ratio"]:
+            # Replaces an object's value, so cached copies of it (and the listing) go stale
+            path = "/object/object{}".format(generator.randrange(settings["objects"]))
+            client.delete(path)
+            client.post(path, json={"value": "w" * settings["value_size"]})
+            continue
+
+        if roll < settings["write_ratio"] + settings["list_ratio"]:
+            path = "/objects"
+        else:
+            path = "/object/object{}".format(generator.randrange(settings["objects"]))
+        headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+        response = client.get(path, headers=headers)
+        received += len(response.data)
+        if response.status_code == 304:
+            not_modified += 1
+        elif "ETag" in response.headers:
+            etags[path] = response.headers["ETag"]
+
+    return not_modified, received, time.process_time() - start
+
+
+def bootstrap(): # pylint: disable=too-many-locals
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--backend", choices=list(STORES), default="memory",
+                        help="the backend storing the objects")
+    parser.add_argument("--objects", type=int, default=100,
+                        help="the number of objects the clients poll")
+    parser.add_argument("--value-size", type=int, default=1024,
+                        help="the length of each object's value")
+    parser.add_argument("--requests", type=int, default=20000,
+                        help="the number of requests to send in each mode")
+    parser.add_argument("--write-ratio", type=float, default=0.02,
+                        help="the fraction of requests replacing an object")
+    parser.add_argument("--list-ratio", type=float, default=0.05,
+                        help="the fraction of requests fetching the collection listing")
+    parsed_args = parser.parse_args()
+
+    settings = {"objects": parsed_args.objects, "value_size": parsed_args.value_size,
+                "requests": parsed_args.requests, "write_ratio": parsed_args.write_ratio,
+                "list_ratio": parsed_args.list_ratio}
+    path = tempfile.mkdtemp(prefix="object-cache-benchmark-")
+    try:
+        # pylint: disable=import-outside-toplevel
+        from api import app_factory
+
+        app = app_factory({"OBJECT_STORE": parsed_args.backend,
+                           "OBJECT_STORE_PATH": os.path.join(path, "objects")})
+        results = {}
+        with app.test_client() as client:
+            for mode, conditional in (("full", False), ("revalidating", True)):
+                reset_objects(client, parsed_args.objects, parsed_args.value_size)
+                results[mode] = generate_load(client, settings, conditional)
+                not_modified, received, cpu_time = results[mode]
+                reads = parsed_args.requests * (1 - parsed_args.write_ratio)
+                print(RESULT_FORMAT.format(mode, parsed_args.requests, not_modified / reads,
+                                           received, cpu_time / parsed_args.requests * 1e6))
+    finally:
+        shutil.rmtree(path)
+
+    _, full_received, full_time = results["full"]
+    _, received, cpu_time = results["revalidating"]
+    print(SAVINGS_FORMAT.format(1 - received / max(1, full_received),
+                                1 - cpu_time / max(1e-9, full_time)))
+
+
+if __name__ == "__main__":
+    bootstrap()
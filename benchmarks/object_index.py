@@ -0,0 +1,188 @@
+"""
+Benchmark of the sorted index behind GET /objects: loads a million keys into each storage
+backend, then times listing pages by prefix and cursor against scanning every key, and
+checks that paging through a prefix while other threads create and delete keys under it
+returns every key that was there throughout, in order and without repeats
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "flask"))
+
+# pylint: disable=wrong-import-position
+from models.store import STORES, create_store
+
+DESCRIPTION = "Benchmarks prefix and cursor listing over a million keys"
+KEY_FORMAT = "key{:07d}"
+LOAD_BATCH_SIZE = 10000
+LOAD_FORMAT = "{:<8} loaded {:,} keys in {:.2f}s ({:,.0f} keys/s)"
+REOPEN_FORMAT = "{:<8} reopened in {:.2f}s"
+PAGE_FORMAT = "{:<8} {:<10} {:>10,.0f} pages/s ({:.1f}us/page)"
+CHECK_FORMAT = "{:<8} paged {:,} keys with {:,} concurrent changes  {}"
+
+
+def load_keys(store, key_count):
+    """
+    Creates key_count keys in batches, returning the time taken
+    """
+
+    start = time.perf_counter()
+    for first in range(0, key_count, LOAD_BATCH_SIZE):
+        store.put_many([(KEY_FORMAT.format(index), index)
+                        for index in range(first, min(key_count, first + LOAD_BATCH_SIZE))])
+    return time.perf_counter() - start
+
+
+def random_queries(key_count, query_count):
+    """
+    Generates query_count (prefix, cursor) pairs: prefixes matching a thousand keys, each
+    starting at a random key under it
+    """
+
+    generator = random.Random(0)
+    queries = []
+    for _ in range(query_count):
+        key = KEY_FORMAT.format(generator.randrange(key_count))
+        queries.append((key[:-3], key))
+    return queries
+
+
+def time_pages(list_page, queries, limit):
+    """
+    Lists a page for each query, returning the rate of pages per second
+    """
+
+    start = time.perf_counter()
+    for prefix, cursor in queries:
+        list_page(prefix, cursor, limit)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def scan_page(names, prefix, after, limit):
+    """
+    Lists a page the naive way, by filtering and sorting every name
+    """
+
+    return sorted(name for name in names
+                  if name.startswith(prefix) and (after is None or name > after))[:limit]
+
+
+def check_concurrent_paging(store, prefix, writer_count, limit):
+    """
+    Pages through every key under prefix while writer threads create and delete other keys
+    under it, returning the keys seen, the number of changes made and whether every
+    pre-existing key was seen once and in order
+    """
+
+    stable, _ = store.list_page(prefix, None, 10 ** 9)
+    stable = [name for name, _ in stable]
+    stop = threading.Event()
+    changes = [0] * writer_count
+
+    def write(index):
+        generator = random.Random(index)
+        while not stop.is_set():
+            name = "{}x{}".format(generator.choice(stable), index)
+            store.put_if_absent(name, index)
+            store.delete(name)
+            changes[index] += 2
+
+    writers = [threading.Thread(target=write, args=(index,)) for index in range(writer_count)]
+    for writer in writers:
+        writer.start()
+    seen = []
+    cursor = None
+    try:
+        while True:
+            items, cursor = store.list_page(prefix, cursor, limit)
+            seen.extend(name for name, _ in items)
+            if cursor is None:
+                break
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+
+    in_order = all(first < second for first, second in zip(seen, seen[1:]))
+    return len(seen), sum(changes), in_order and set(stable) <= set(seen)
+
+
+def run_backend(backend, path, settings):
+    """
+    Loads the keys into the given backend and prints its timings, returning whether the
+    concurrent paging check passed
+    """
+
+    store = create_store(backend, path)
+    elapsed = load_keys(store, settings["keys"])
+    print(LOAD_FORMAT.format(backend, settings["keys"], elapsed, settings["keys"] / elapsed))
+    if backend != "memory":
+        store.close()
+        start = time.perf_counter()
+        store = create_store(backend, path)
+        print(REOPEN_FORMAT.format(backend, time.perf_counter() - start))
+
+    queries = random_queries(settings["keys"], settings["queries"])
+    rate = time_pages(store.list_page, queries, settings["limit"])
+    print(PAGE_FORMAT.format(backend, "index", rate, 1e6 / rate))
+    if backend == "memory" and not settings["skip_scan"]:
+        names, _ = store.list_page("", None, settings["keys"])
+        names = [name for name, _ in names]
+        rate = time_pages(lambda prefix, after, limit: scan_page(names, prefix, after, limit),
+                          queries[:settings["scan_queries"]], settings["limit"])
+        print(PAGE_FORMAT.format(backend, "full scan", rate, 1e6 / rate))
+
+    seen, changes, passed = check_concurrent_paging(store, KEY_FORMAT.format(0)[:-4],
+                                                    settings["writers"], settings["limit"])
+    print(CHECK_FORMAT.format(backend, seen, changes, "OK" if passed else "FAILED"))
+    store.close()
+    return passed
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--backends", nargs="+", choices=list(STORES), default=list(STORES),
+                        help="the backends to benchmark")
+    parser.add_argument("--keys", type=int, default=1000000,
+                        help="the number of keys to load")
+    parser.add_argument("--queries", type=int, default=10000,
+                        help="the number of pages to list")
+    parser.add_argument("--scan-queries", type=int, default=10,
+                        help="the number of pages to list by scanning every key")
+    parser.add_argument("--limit", type=int, default=100,
+                        help="the number of keys in each page")
+    parser.add_argument("--writers", type=int, default=4,
+                        help="the number of threads changing keys while paging")
+    parser.add_argument("--skip-scan", action="store_true",
+                        help="skips timing the full scan")
+    parsed_args = parser.parse_args()
+
+    settings = {"keys": parsed_args.keys, "queries": parsed_args.queries,
+                "scan_queries": parsed_args.scan_queries, "limit": parsed_args.limit,
+                "writers": parsed_args.writers, "skip_scan": parsed_args.skip_scan}
+    path = tempfile.mkdtemp(prefix="object-index-benchmark-")
+    passed = True
+    try:
+        for backend in parsed_args.backends:
+            passed = run_backend(backend, os.path.join(path, backend), settings) and passed
+            print()
+    finally:
+        shutil.rmtree(path)
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    bootstrap()
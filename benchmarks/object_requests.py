@@ -0,0 +1,136 @@
+"""
+Microbenchmark of the Object resource's request path: times GET, POST and DELETE requests
+through the Flask test client with each JSON representation, saving the rates as JSON and
+comparing them against a saved baseline (such as a run before a change)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "flask"))
+
+DESCRIPTION = "Measures requests/second for GET, POST and DELETE on the Object resource"
+REPRESENTATIONS = ["default", "fast"]
+RESULT_FORMAT = "{:<24} {:>10,.0f} requests/s (best of {})"
+COMPARISON_FORMAT = "{:<24} {:>10,.0f} {:>10,.0f} {:>+8.1f}%"
+COMPARISON_HEADER = "{:<24} {:>10} {:>10} {:>9}".format("request", "baseline", "current",
+                                                           "change")
+RESULTS_VERSION = 1
+
+
+def best_rate(function, calls, repeat):
+    """
+    Calls function once per item of calls, repeat times, returning the best rate of calls
+    per second
+    """
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for call in calls:
+            function(call)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return len(calls) / best
+
+
+def run_representation(representation, request_count, repeat):
+    """
+    Times each kind of request through an app using the given JSON representation,
+    returning the rates
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from api import app_factory
+
+    app = app_factory({"JSON_REPRESENTATION": representation})
+    names = ["object{}".format(index) for index in range(request_count)]
+    rates = {}
+    with app.test_client() as client:
+        client.post("/object/polled", json={"value": "value"})
+        rates["GET"] = best_rate(lambda _: client.get("/object/polled"), names, repeat)
+
+        # Each POST needs a name that doesn't exist yet, so every round deletes them all
+        post_best = None
+        delete_best = None
+        for _ in range(repeat):
+            post_rate = best_rate(
+                lambda name: client.post("/object/" + name, json={"value": name}), names, 1)
+            delete_rate = best_rate(lambda name: client.delete("/object/" + name), names, 1)
+            post_best = max(post_rate, post_best or 0)
+            delete_best = max(delete_rate, delete_best or 0)
+        rates["POST"] = post_best
+        rates["DELETE"] = delete_best
+
+    return rates
+
+
+def compare_results(rates, baseline):
+    """
+    Prints each rate next to its rate in the baseline results, for the requests timed in
+    both
+    """
+
+    print(COMPARISON_HEADER)
+    for request, rate in rates.items():
+        previous = baseline["rates"].get(request)
+        if previous is None:
+            continue
+        print(COMPARISON_FORMAT.format(request, previous, rate,
+                                       (rate - previous) / previous * 100))
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--representations", nargs="+", choices=REPRESENTATIONS,
+                        default=REPRESENTATIONS, help="the JSON representations to time")
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="the number of requests of each kind")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="the number of times to time each kind of request")
+    parser.add_argument("--output", "-o", metavar="path",
+                        help="saves the results as JSON to the given file")
+    parser.add_argument("--baseline", "-b", metavar="path",
+                        help="compares the results against results saved with --output")
+    parsed_args = parser.parse_args()
+
+    rates = {}
+    for representation in parsed_args.representations:
+        # The app can only be set up once, so each representation gets a fresh process
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            representation_rates = pool.apply(run_representation, (
+                representation, parsed_args.requests, parsed_args.repeat))
+        for request, rate in representation_rates.items():
+            rates["{} {}".format(representation, request)] = rate
+            print(RESULT_FORMAT.format("{} {}".format(representation, request), rate,
+                                       parsed_args.repeat))
+
+    results = {"version": RESULTS_VERSION, "rates": rates,
+               "settings": {"requests": parsed_args.requests, "repeat": parsed_args.repeat},
+               "environment": {"python": platform.python_version(),
+                               "platform": platform.platform(),
+                               "cpus": os.cpu_count()}}
+    if parsed_args.output is not None:
+        with open(parsed_args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if parsed_args.baseline is not None:
+        with open(parsed_args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        compare_results(rates, baseline)
+
+
+if __name__ == "__main__":
+    bootstrap()
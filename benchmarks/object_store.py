@@ -0,0 +1,323 @@
+"""
+Stress test of the stores behind the Object resource: many threads (and, for the
+persistent backends, processes) race to create and delete the same keys, which must each
+be created and deleted exactly once, both through each store directly and through the
+Flask app. Also measures each backend's throughput under concurrent load, against a store
+guarded by a single lock as a baseline
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import collections
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "flask"))
+
+# pylint: disable=wrong-import-position
+from models.store import STORES, create_store
+
+DESCRIPTION = "Stress tests and benchmarks the Object resource's stores under concurrent load"
+CHECK_FORMAT = "{:<24} {:>8} creations {:>8} deletions  {}"
+THROUGHPUT_FORMAT = "{:<24} {:>12,.0f} ops/s"
+PERSISTENT_BACKENDS = [backend for backend in STORES if backend != "memory"]
+
+
+class SingleLockStore:
+    """
+    The same API as ObjectStore guarded by one lock, as a baseline
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            return self._values.get(name)
+
+    def put_if_absent(self, name, value):
+        with self._lock:
+            if name in self._values:
+                return False
+            self._values[name] = value
+            return True
+
+    def delete(self, name):
+        with self._lock:
+            return self._values.pop(name, None) is not None
+
+
+def run_threads(thread_count, target):
+    """
+    Runs target(index, barrier) on thread_count threads that all start at once, returning
+    their results and the elapsed time
+    """
+
+    barrier = threading.Barrier(thread_count + 1)
+    results = [None] * thread_count
+
+    def run(index):
+        results[index] = target(index, barrier)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+
+    return results, time.perf_counter() - start
+
+
+def race(thread_count, keys, create, delete):
+    """
+    Has every thread try to create and then delete every key (in its own random order),
+    counting how many times each key was successfully created and deleted
+    """
+
+    # Deletions only start once every thread is done creating, or keys could be recreated
+    created_all = threading.Barrier(thread_count)
+
+    def work(index, barrier):
+        order = list(keys)
+        random.Random(index).shuffle(order)
+        created = collections.Counter()
+        deleted = collections.Counter()
+        barrier.wait()
+        for key in order:
+            if create(key):
+                created[key] += 1
+        created_all.wait()
+        for key in order:
+            if delete(key):
+                deleted[key] += 1
+        return created, deleted
+
+    results, _ = run_threads(thread_count, work)
+    created = sum((counts for counts, _ in results), collections.Counter())
+    deleted = sum((counts for _, counts in results), collections.Counter())
+    return created, deleted
+
+
+def check_counts(name, keys, created, deleted):
+    """
+    Prints whether every key was created and deleted exactly once, returning whether
+    that was the case
+    """
+
+    lost = [key for key in keys if created[key] != 1 or deleted[key] != 1]
+    status = "OK" if not lost else "FAILED: {} keys created/deleted more or less than " \
+                                   "once".format(len(lost))
+    print(CHECK_FORMAT.format(name, sum(created.values()), sum(deleted.values()), status))
+    return not lost
+
+
+def measure_throughput(store, thread_count, operations):
+    """
+    Measures the rate of mixed put/get/delete operations on distinct keys per thread
+    """
+
+    def work(index, barrier):
+        barrier.wait()
+        for operation in range(operations):
+            key = "{}-{}".format(index, operation % 64)
+            store.put_if_absent(key, operation)
+            store.get(key)
+            store.delete(key)
+
+    _, elapsed = run_threads(thread_count, work)
+    return thread_count * operations * 3 / elapsed
+
+
+def create_keys(path, backend, keys):
+    """
+    Tries to create every key in a process of its own, returning the keys it created
+    """
+
+    store = create_store(backend, path)
+    created = collections.Counter(key for key in keys if store.put_if_absent(key, key))
+    store.close()
+    return created
+
+
+def delete_keys(path, backend, keys):
+    """
+    Tries to delete every key in a process of its own, returning the keys it deleted
+    """
+
+    store = create_store(backend, path)
+    deleted = collections.Counter(key for key in keys if store.delete(key))
+    store.close()
+    return deleted
+
+
+def race_processes(pool, process_count, path, backend, keys):
+    """
+    Has process_count processes in pool try to create and then delete every key (in their
+    own random order) in the persistent store at path, counting how many times each key
+    was successfully created and deleted
+    """
+
+    orders = []
+    for index in range(process_count):
+        order = list(keys)
+        random.Random(index).shuffle(order)
+        orders.append((path, backend, order))
+
+    created = sum(pool.starmap(create_keys, orders), collections.Counter())
+    deleted = sum(pool.starmap(delete_keys, orders), collections.Counter())
+    return created, deleted
+
+
+def run_operations(path, backend, index, operations):
+    """
+    Runs operations mixed put/get/delete operations on keys of its own in a process of
+    its own
+    """
+
+    store = create_store(backend, path)
+    for operation in range(operations):
+        key = "{}-{}".format(index, operation % 64)
+        store.put_if_absent(key, operation)
+        store.get(key)
+        store.delete(key)
+    store.close()
+
+
+def measure_process_throughput(pool, process_count, path, backend, operations):
+    """
+    Measures the rate of mixed put/get/delete operations with process_count processes in
+    pool sharing the persistent store at path
+    """
+
+    start = time.perf_counter()
+    pool.starmap(run_operations, [(path, backend, index, operations)
+                                  for index in range(process_count)])
+    return process_count * operations * 3 / (time.perf_counter() - start)
+
+
+def check_resource(thread_count, keys, config):
+    """
+    Races the same creations and deletions through the Flask app's Object resource
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from api import app_factory
+
+    app = app_factory(config)
+
+    def create(key):
+        with app.test_client() as client:
+            return client.post("/object/" + key, json={"value": key}).status_code == 201
+
+    def delete(key):
+        with app.test_client() as client:
+            return client.delete("/object/" + key).status_code == 200
+
+    return race(thread_count, keys, create, delete)
+
+
+def check_backends(settings, path, pool):
+    """
+    Races creations and deletions through each backend's store with threads and (for the
+    persistent backends) processes, and through the Flask app, returning whether every
+    key was created and deleted exactly once
+    """
+
+    keys = ["key{}".format(index) for index in range(settings["keys"])]
+    app_keys = keys[:max(1, len(keys) // 10)]
+    passed = True
+    for backend in settings["backends"]:
+        store = create_store(backend, os.path.join(path, backend + "-threads"))
+        passed = check_counts(backend, keys,
+                              *race(settings["threads"], keys,
+                                    lambda key, store=store: store.put_if_absent(key, key),
+                                    store.delete)) and passed
+        store.close()
+        if backend in PERSISTENT_BACKENDS and settings["processes"] > 1:
+            passed = check_counts("{} processes".format(backend), keys,
+                                  *race_processes(pool, settings["processes"],
+                                                  os.path.join(path, backend + "-processes"),
+                                                  backend, keys)) and passed
+        if not settings["skip_app"]:
+            # The app can only be set up once, so each backend gets a fresh process
+            config = {"OBJECT_STORE": backend,
+                      "OBJECT_STORE_PATH": os.path.join(path, backend + "-app")}
+            with multiprocessing.get_context("spawn").Pool(1) as app_pool:
+                counts = app_pool.apply(check_resource, (settings["threads"], app_keys, config))
+            passed = check_counts("{} resource".format(backend), app_keys, *counts) and passed
+
+    return passed
+
+
+def measure_backends(settings, path, pool):
+    """
+    Prints each backend's throughput with threads and (for the persistent backends)
+    processes sharing a store, and that of a single lock store as a baseline
+    """
+
+    for backend in settings["backends"]:
+        store = create_store(backend, os.path.join(path, backend + "-throughput"))
+        rate = measure_throughput(store, settings["threads"], settings["operations"])
+        store.close()
+        print(THROUGHPUT_FORMAT.format("{} ({} threads)".format(backend, settings["threads"]),
+                                       rate))
+        if backend in PERSISTENT_BACKENDS and settings["processes"] > 1:
+            rate = measure_process_throughput(pool, settings["processes"],
+                                              os.path.join(path, backend + "-throughput"),
+                                              backend, settings["operations"])
+            print(THROUGHPUT_FORMAT.format(
+                "{} ({} processes)".format(backend, settings["processes"]), rate))
+
+    rate = measure_throughput(SingleLockStore(), settings["threads"], settings["operations"])
+    print(THROUGHPUT_FORMAT.format("single lock ({} threads)".format(settings["threads"]), rate))
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--backends", nargs="+", choices=list(STORES), default=list(STORES),
+                        help="the backends to test")
+    parser.add_argument("--threads", type=int, default=32,
+                        help="the number of threads racing each other")
+    parser.add_argument("--processes", type=int, default=4,
+                        help="the number of processes sharing each persistent store")
+    parser.add_argument("--keys", type=int, default=2000,
+                        help="the number of keys each thread creates and deletes")
+    parser.add_argument("--operations", type=int, default=2000,
+                        help="the number of operations per thread when measuring throughput")
+    parser.add_argument("--skip-app", action="store_true",
+                        help="skips racing requests through the Flask app")
+    parsed_args = parser.parse_args()
+
+    settings = {"backends": parsed_args.backends, "threads": parsed_args.threads,
+                "processes": parsed_args.processes, "keys": parsed_args.keys,
+                "operations": parsed_args.operations, "skip_app": parsed_args.skip_app}
+    path = tempfile.mkdtemp(prefix="object-store-benchmark-")
+    try:
+        with multiprocessing.Pool(max(1, parsed_args.processes)) as pool:
+            # Switch threads as often as possible to make races more likely
+            sys.setswitchinterval(1e-6)
+            passed = check_backends(settings, path, pool)
+            sys.setswitchinterval(0.005)
+            print()
+            measure_backends(settings, path, pool)
+    finally:
+        shutil.rmtree(path)
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,315 @@
+"""
+Benchmark timing each stage of the pylint and Checkstyle pipelines (discovery, linting,
+output parsing, statement counting and scoring) on generated Python and Java projects,
+saving the results as JSON and comparing them against a saved baseline
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib.util
+from shutil import which
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import run_checkstyle
+
+DESCRIPTION = "Benchmarks each stage of both checkers over generated projects"
+RESULT_FORMAT = "{:<24} {:>9.3f}s (best of {})"
+COMPARISON_FORMAT = "{:<24} {:>9.3f}s {:>9.3f}s {:>+8.1f}%"
+COMPARISON_HEADER = "{:<24} {:>10} {:>10} {:>9}".format("stage", "baseline", "current",
+                                                           "change")
+SKIPPED_FORMAT = "{:<24} skipped ({})"
+RESULTS_VERSION = 1
+
+# Each generated unit is a function or method, which either follows the style guide or
+# breaks it in a few places, depending on the violation density
+PYTHON_UNIT = '''
+def function_{index}(value):
+    total = value + {index}
+    return total
+'''
+PYTHON_VIOLATING_UNIT = '''
+def Function{index}(value):
+    unused = {index}
+    return value
+'''
+PYTHON_HEADER = '"""\nGenerated module {index}\n"""\n'
+JAVA_UNIT = '''
+    public int method{index}(int value) {{
+        int total = value + {index};
+        return total;
+    }}
+'''
+JAVA_VIOLATING_UNIT = '''
+    public int Method_{index}(int value) {{
+        int total=value+{index};
+        return total;
+    }}
+'''
+JAVA_FILE = '''package {package};
+
+/**
+ * Generated class {index}.
+ */
+public class Generated{index} {{
+{units}}}
+'''
+# Violations in the synthetic Checkstyle output parsed when Java isn't available
+CHECKSTYLE_LINE_FORMAT = "[WARN] {}:{}:{}: Name 'Method_{}' must match pattern " \
+                         "'^[a-z][a-zA-Z0-9]*$'. [MethodName]"
+
+
+def generate_project(path, language, file_count, lines, density, depth): # pylint: disable=too-many-arguments
+    """
+    Generates a Python or Java project of file_count files with roughly the given number
+    of lines each, spread over directories nested depth levels deep, where about the
+    given fraction (density) of functions/methods break the style guide
+
+    Returns:
+    the generated files
+    """
+
+    # A fixed seed generates the same project on every run, keeping results comparable
+    generator = random.Random(0)
+    files = []
+    for index in range(file_count):
+        parts = ["pkg{}".format((index + level) % 4) for level in range(depth)]
+        directory = os.path.join(path, *parts)
+        os.makedirs(directory, exist_ok=True)
+
+        units = generate_units(generator, language, max(1, lines // 5), density)
+        if language == "python":
+            filename = os.path.join(directory, "module_{}.py".format(index))
+            contents = PYTHON_HEADER.format(index=index) + "\n".join(units)
+        else:
+            filename = os.path.join(directory, "Generated{}.java".format(index))
+            contents = JAVA_FILE.format(package=".".join(parts) or "generated", index=index,
+                                        units="".join(units))
+        with open(filename, "w") as source_file:
+            source_file.write(contents)
+        files.append(filename)
+
+    return files
+
+
+def generate_units(generator, language, unit_count, density):
+    """
+    Generates unit_count functions/methods, each of which breaks the style guide with
+    probability density
+    """
+
+    if language == "python":
+        templates = (PYTHON_UNIT, PYTHON_VIOLATING_UNIT)
+    else:
+        templates = (JAVA_UNIT, JAVA_VIOLATING_UNIT)
+
+    return [templates[generator.random() < density].format(index=index)
+            for index in range(unit_count)]
+
+
+def synthesize_checkstyle_output(files, density, lines):
+    """
+    Generates Checkstyle output with about as many violations as a real run would find,
+    so that output parsing can be benchmarked without Java
+    """
+
+    output = [run_checkstyle.AUDIT_STARTED_TEXT]
+    per_file = max(1, int(lines // 5 * density))
+    for filename in files:
+        for index in range(per_file):
+            output.append(CHECKSTYLE_LINE_FORMAT.format(filename, 8 + index * 5, 16, index))
+    output.append(run_checkstyle.AUDIT_DONE_TEXT)
+    return "\n".join(output)
+
+
+def best_time(function, repeat):
+    """
+    Runs function repeat times, returning the fastest time and the last result
+    """
+
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+def benchmark_python(path, settings, stages):
+    """
+    Times the stages of run_pylint.py over a generated Python project, recording the
+    times (or why a stage was skipped) in stages
+    """
+
+    reason = "--skip-pylint" if settings["skip_pylint"] else None
+    if reason is None and importlib.util.find_spec("pylint") is None:
+        reason = "pylint is not installed"
+    if reason is not None:
+        for stage in ("discovery", "lint", "parse", "statements", "scoring"):
+            stages["python." + stage] = reason
+        return
+
+    # pylint: disable=import-outside-toplevel
+    import run_pylint
+
+    generate_project(path, "python", settings["files"], settings["lines"], settings["density"],
+                     settings["depth"])
+    repeat = settings["repeat"]
+    stages["python.discovery"], files = best_time(
+        lambda: run_pylint.find_files(path, run_pylint.PYTHON_EXTENSION), repeat)
+    stages["python.lint"], output = best_time(lambda: run_pylint.run_linter(files, []), repeat)
+    stages["python.parse"], (results, _) = best_time(
+        lambda: run_pylint.parse_linter_output(output, files), repeat)
+    stages["python.statements"], _ = best_time(
+        lambda: [run_pylint.count_statements(filename) for filename in files], repeat)
+    stages["python.scoring"], _ = best_time(
+        lambda: run_pylint.compute_score(results.values()), repeat)
+
+
+def benchmark_java(path, settings, stages):
+    """
+    Times the stages of run_checkstyle.py over a generated Java project, recording the
+    times (or why a stage was skipped) in stages. Only running Checkstyle itself needs
+    Java, so output parsing uses synthetic output when it isn't available
+    """
+
+    files = generate_project(path, "java", settings["files"], settings["lines"],
+                             settings["density"], settings["depth"])
+    repeat = settings["repeat"]
+    stages["java.discovery"], files = best_time(
+        lambda: run_checkstyle.find_files(path, run_checkstyle.JAVA_EXTENSION), repeat)
+
+    output = None
+    if settings["skip_java"]:
+        stages["java.checkstyle"] = "--skip-java"
+    elif which("java") is None:
+        stages["java.checkstyle"] = "Java is not installed"
+    else:
+        mirror = os.environ.get(run_checkstyle.MIRROR_VARIABLE)
+        xml_path, _ = run_checkstyle.find_or_download(
+            run_checkstyle.CHECKSTYLE_XML_NAME, run_checkstyle.CHECKSTYLE_XML_URL,
+            mirror=mirror, offline=settings["offline"])
+        jar_path, _ = run_checkstyle.find_or_download(
+            run_checkstyle.CHECKSTYLE_JAR_NAME, run_checkstyle.CHECKSTYLE_JAR_URL,
+            mirror=mirror, offline=settings["offline"])
+        if xml_path is None or jar_path is None:
+            stages["java.checkstyle"] = "the Checkstyle artifacts are not available"
+        else:
+            stages["java.checkstyle"], output = best_time(
+                lambda: "\n".join(run_checkstyle.iter_checkstyle(files, jar_path=jar_path,
+                                                                 xml_path=xml_path)), repeat)
+    if output is None:
+        output = synthesize_checkstyle_output(files, settings["density"], settings["lines"])
+
+    def parse():
+        report = run_checkstyle.empty_report()
+        for line in output.splitlines():
+            run_checkstyle.update_report(report, line, run_checkstyle.parse_violation(line))
+        return report
+
+    stages["java.parse"], report = best_time(parse, repeat)
+    stages["java.statements"], counts = best_time(
+        lambda: run_checkstyle.count_batch_statements(files), repeat)
+    stages["java.scoring"], _ = best_time(
+        lambda: run_checkstyle.calculate_score(report["violations"], sum(counts)), repeat)
+
+
+def print_results(stages, repeat):
+    """
+    Prints the time taken by each stage, or why it was skipped
+    """
+
+    for stage, value in stages.items():
+        if isinstance(value, str):
+            print(SKIPPED_FORMAT.format(stage, value))
+        else:
+            print(RESULT_FORMAT.format(stage, value, repeat))
+
+
+def compare_results(stages, baseline):
+    """
+    Prints each stage's time next to its time in the baseline results, for the stages
+    that were timed in both
+    """
+
+    print(COMPARISON_HEADER)
+    for stage, value in stages.items():
+        previous = baseline["stages"].get(stage)
+        if isinstance(value, str) or not isinstance(previous, (int, float)):
+            continue
+        change = (value - previous) / previous * 100 if previous else 0.0
+        print(COMPARISON_FORMAT.format(stage, previous, value, change))
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--files", type=int, default=50,
+                        help="the number of files to generate for each language")
+    parser.add_argument("--lines", type=int, default=200,
+                        help="the approximate number of lines in each generated file")
+    parser.add_argument("--density", type=float, default=0.1,
+                        help="the fraction of functions/methods that break the style guide")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="how many directories deep the generated files are nested")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="the number of times to time each stage")
+    parser.add_argument("--skip-pylint", action="store_true",
+                        help="skips the Python stages")
+    parser.add_argument("--skip-java", action="store_true",
+                        help="skips running Checkstyle (the other Java stages still run)")
+    parser.add_argument("--offline", action="store_true",
+                        help="never downloads the Checkstyle artifacts")
+    parser.add_argument("--output", "-o", metavar="path",
+                        help="saves the results as JSON to the given file")
+    parser.add_argument("--baseline", "-b", metavar="path",
+                        help="compares the results against results saved with --output")
+    parsed_args = parser.parse_args()
+
+    settings = {"files": parsed_args.files, "lines": parsed_args.lines,
+                "density": parsed_args.density, "depth": parsed_args.depth,
+                "repeat": parsed_args.repeat, "skip_pylint": parsed_args.skip_pylint,
+                "skip_java": parsed_args.skip_java, "offline": parsed_args.offline}
+    stages = {}
+    path = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    try:
+        print("Generating {} Python and {} Java files in {}".format(
+            parsed_args.files, parsed_args.files, path))
+        benchmark_python(os.path.join(path, "python"), settings, stages)
+        benchmark_java(os.path.join(path, "java"), settings, stages)
+    finally:
+        shutil.rmtree(path)
+
+    print()
+    print_results(stages, parsed_args.repeat)
+    results = {"version": RESULTS_VERSION, "settings": settings, "stages": stages,
+               "environment": {"python": platform.python_version(),
+                               "platform": platform.platform(),
+                               "cpus": os.cpu_count()}}
+    if parsed_args.output is not None:
+        with open(parsed_args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if parsed_args.baseline is not None:
+        with open(parsed_args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        compare_results(stages, baseline)
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,228 @@
+"""
+Load generator comparing the ways of serving the flask demo: the Werkzeug development
+server (app.py), several WSGI worker processes under gunicorn (wsgi.py) and the async
+variant under gunicorn's uvicorn workers (asgi.py). Each server is started on a local port
+and driven by concurrent keep-alive clients reading, creating and deleting objects,
+reporting its throughput and latency percentiles
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import importlib.util
+
+FLASK_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "flask")
+
+DESCRIPTION = "Compares throughput and latency of the dev server, WSGI workers and ASGI"
+RESULT_FORMAT = "{:<14} {:>10,.0f} requests/s  p50 {:>8.2f}ms  p99 {:>8.2f}ms  {:>6,} errors"
+SKIPPED_FORMAT = "{:<14} skipped ({})"
+STARTUP_TIMEOUT = 30
+SHUTDOWN_TIMEOUT = 10
+# The share of requests fetching, creating and deleting objects
+READ_RATIO = 0.8
+CREATE_RATIO = 0.1
+
+
+def find_port():
+    """
+    Returns a free local port
+    """
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def server_command(mode, port, workers):
+    """
+    Returns the command starting the server for the given mode, and the modules it needs
+    """
+
+    if mode == "dev":
+        return [sys.executable, "app.py"], []
+    elif mode == "multi-worker":
+        return [sys.executable, "-m", "gunicorn", "--workers", str(workers),
+                "--bind", "127.0.0.1:{}".format(port), "wsgi:application"], ["gunicorn"]
+    return [sys.executable, "-m", "gunicorn", "--workers", str(workers),
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--bind", "127.0.0.1:{}".format(port), "asgi:application"], ["gunicorn", "uvicorn"]
+
+
+def wait_until_ready(port, server):
+    """
+    Waits for the server to answer requests, returning whether it did in time
+    """
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/status")
+            if connection.getresponse().status == 204:
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def choose_request(generator, settings, created, name):
+    """
+    Picks the next request at random: reading a random object, creating an object with the
+    given name (remembering it in created) or deleting one created earlier
+
+    Returns:
+    the method, path, body and headers of the request
+    """
+
+    roll = generator.random()
+    if roll < CREATE_RATIO or not created and roll < 1 - READ_RATIO:
+        created.append(name)
+        return "POST", "/object/" + name, json.dumps({"value": "value"}), \
+            {"Content-Type": "application/json"}
+    elif roll < 1 - READ_RATIO:
+        return "DELETE", "/object/" + created.pop(), None, {}
+    return "GET", "/object/object{}".format(generator.randrange(settings["objects"])), None, {}
+
+
+def run_client(port, settings, index, results): # pylint: disable=too-many-locals
+    """
+    Sends requests over one keep-alive connection until the run's duration is up, adding
+    each request's latency (and whether it failed) to results
+    """
+
+    generator = random.Random(index)
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    created = []
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + settings["duration"]
+    while time.perf_counter() < deadline:
+        method, path, body, headers = choose_request(
+            generator, settings, created, "client{}-{}".format(index, len(latencies)))
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            failed = response.status >= 500
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            failed = True
+        latencies.append(time.perf_counter() - start)
+        errors += failed
+
+    connection.close()
+    results[index] = (latencies, errors)
+
+
+def generate_load(port, settings):
+    """
+    Creates the polled objects, then runs every client at once, returning the throughput,
+    the median and 99th percentile latencies and the number of errors
+    """
+
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    for index in range(settings["objects"]):
+        connection.request("POST", "/object/object{}".format(index),
+                           body=json.dumps({"value": "value"}),
+                           headers={"Content-Type": "application/json"})
+        connection.getresponse().read()
+    connection.close()
+
+    results = [None] * settings["clients"]
+    clients = [threading.Thread(target=run_client, args=(port, settings, index, results))
+               for index in range(settings["clients"])]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for client_latencies, _ in results
+                       for latency in client_latencies)
+    if not latencies:
+        return 0.0, 0.0, 0.0, sum(errors for _, errors in results)
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2],
+            latencies[int((len(latencies) - 1) * 0.99)], sum(errors for _, errors in results))
+
+
+def run_mode(mode, path, settings):
+    """
+    Starts the server for the given mode, generates load against it and stops it, printing
+    the results (or why the mode was skipped)
+    """
+
+    port = find_port()
+    command, modules = server_command(mode, port, settings["workers"])
+    missing = [module for module in modules if importlib.util.find_spec(module) is None]
+    if missing:
+        print(SKIPPED_FORMAT.format(mode, "{} is not installed".format(" and ".join(missing))))
+        return
+
+    environment = dict(os.environ, PORT=str(port), OBJECT_STORE=settings["backend"],
+                       OBJECT_STORE_PATH=os.path.join(path, mode))
+    with open(os.path.join(path, mode + ".log"), "w") as log_file, \
+            subprocess.Popen(command, cwd=FLASK_DIRECTORY, env=environment, stdout=log_file,
+                             stderr=subprocess.STDOUT) as server:
+        try:
+            if not wait_until_ready(port, server):
+                print(SKIPPED_FORMAT.format(mode, "the server didn't start"))
+                return
+            throughput, median, percentile, errors = generate_load(port, settings)
+            print(RESULT_FORMAT.format(mode, throughput, median * 1000, percentile * 1000,
+                                       errors))
+        finally:
+            server.terminate()
+            try:
+                server.wait(SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--modes", nargs="+", choices=["dev", "multi-worker", "async"],
+                        default=["dev", "multi-worker", "async"],
+                        help="the ways of serving the app to compare")
+    parser.add_argument("--backend", choices=["memory", "sqlite", "log"], default="sqlite",
+                        help="the backend storing objects (memory isn't shared by workers)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="the number of worker processes in the multi-worker and async "
+                             "modes")
+    parser.add_argument("--clients", type=int, default=16,
+                        help="the number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="the number of seconds to generate load for in each mode")
+    parser.add_argument("--objects", type=int, default=100,
+                        help="the number of objects the clients read")
+    parsed_args = parser.parse_args()
+
+    settings = {"backend": parsed_args.backend, "workers": parsed_args.workers,
+                "clients": parsed_args.clients, "duration": parsed_args.duration,
+                "objects": parsed_args.objects}
+    path = tempfile.mkdtemp(prefix="serving-benchmark-")
+    try:
+        for mode in parsed_args.modes:
+            run_mode(mode, path, settings)
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    bootstrap()
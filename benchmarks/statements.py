@@ -0,0 +1,162 @@
+"""
+Benchmark comparing the single-pass tokenizer used by run_checkstyle.py to count Java
+statements against the regex pipeline it replaced, on large generated Java files
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import run_checkstyle
+
+DESCRIPTION = "Benchmarks Java statement counting over generated source files"
+RESULT_FORMAT = "{:<16} {:>8.3f}s (best of {}) {:>10} statements"
+
+# The original statement counting pipeline
+MULTILINE_COMMENT_REGEX = r"\/\*([\S\s]+?)\*\/"
+SINGLELINE_COMMENT_REGEX = r"\/{2,}.+"
+STATEMENT_REGEX = r"[^;]+?;"
+AFTER_BRACE_REGEX = r"{\s*;"
+EMPTY_STATEMENT_REGEX = r"^\s*;"
+
+# Each generated method holds 7 statements, along with semicolons in comments,
+# literals and for loop headers that shouldn't be counted
+METHOD_TEMPLATE = '''
+    /**
+     * Does the work for step {index}; returns nothing.
+     */
+    public void step{index}(List<String> values) {{
+        // Skip empty lists; there's nothing to do
+        String separator = ";";
+        char terminator = ';';
+        for (int i = 0; i < values.size(); i++) {{
+            builder.append(values.get(i)).append(separator); /* keep going; */
+        }}
+        values.forEach(value -> {{ count++; }});
+        String query = """
+            SELECT * FROM steps WHERE id = {index};
+            """;
+        log("step {index} done; http://example.com/" + terminator + query);
+    }}
+'''
+FILE_TEMPLATE = '''package benchmark;
+
+import java.util.List;
+
+public class Generated{index} {{
+    private final StringBuilder builder = new StringBuilder();
+    private int count;
+{methods}}}
+'''
+STATEMENTS_PER_METHOD = 7
+STATEMENTS_PER_FILE = 4
+
+
+def legacy_count_statements(filename):
+    """
+    The original regex-based statement counter
+    """
+
+    count = 0
+    with open(filename, "r") as java_file:
+        contents = remove_comments(java_file.read())
+        for match in re.finditer(STATEMENT_REGEX, contents):
+            if not is_invalid_statement(match.group()):
+                count += 1
+
+    return count
+
+
+def remove_comments(java_source):
+    """
+    The original comment removal, stripping multiline and then single line comments
+    """
+
+    without_multiline = re.sub(MULTILINE_COMMENT_REGEX, "", java_source)
+    return re.sub(SINGLELINE_COMMENT_REGEX, "", without_multiline)
+
+
+def is_invalid_statement(statement):
+    """
+    The original filter for statement candidates such as "{ ;" and " ;"
+    """
+
+    return (re.search(AFTER_BRACE_REGEX, statement)
+            or re.search(EMPTY_STATEMENT_REGEX, statement))
+
+
+def generate_files(path, file_count, methods_per_file):
+    """
+    Generates file_count Java files with methods_per_file methods each
+    """
+
+    files = []
+    for index in range(file_count):
+        methods = "".join(METHOD_TEMPLATE.format(index=method)
+                          for method in range(methods_per_file))
+        filename = os.path.join(path, "Generated{}.java".format(index))
+        with open(filename, "w") as java_file:
+            java_file.write(FILE_TEMPLATE.format(index=index, methods=methods))
+        files.append(filename)
+
+    return files
+
+
+def best_time(function, repeat):
+    """
+    Runs function repeat times, returning the fastest time and the last result
+    """
+
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--files", type=int, default=20,
+                        help="the number of Java files to generate")
+    parser.add_argument("--methods", type=int, default=2000,
+                        help="the number of methods in each generated file")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="the number of times to time each implementation")
+    parsed_args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="statements-benchmark-")
+    try:
+        files = generate_files(path, parsed_args.files, parsed_args.methods)
+        size = sum(os.path.getsize(filename) for filename in files)
+        expected = parsed_args.files * (STATEMENTS_PER_FILE +
+                                        parsed_args.methods * STATEMENTS_PER_METHOD)
+        print("Generated {} files ({:.1f} MB) with {} statements in {}".format(
+            len(files), size / 1024 / 1024, expected, path))
+
+        implementations = [("regex pipeline", legacy_count_statements),
+                           ("tokenizer", run_checkstyle.count_statements)]
+        for name, function in implementations:
+            elapsed, count = best_time(lambda f=function: sum(map(f, files)),
+                                       parsed_args.repeat)
+            print(RESULT_FORMAT.format(name, elapsed, parsed_args.repeat, count))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    bootstrap()
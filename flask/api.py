@@ -1,7 +1,13 @@
+import os
 from flask import Flask
 from flask_restful import Api
-from models.object import Object
+from models.object import Object, INITIAL_OBJECTS
+from models.objects import Objects
+from models.store import create_store
+from representations import REPRESENTATIONS
 
+# Configuration app_factory takes from environment variables of the same name
+CONFIG_VARIABLES = ('OBJECT_STORE', 'OBJECT_STORE_PATH', 'JSON_REPRESENTATION')
 
 app = Flask(__name__)
 
@@ -21,7 +27,25 @@ def status():
     return "all systems operational", 204
 
 
-def app_factory():
+def environment_config(defaults=None):
+    config = dict(defaults or {})
+    config.update({key: os.environ[key] for key in CONFIG_VARIABLES if key in os.environ})
+    return config
+
+
+def app_factory(config=None):
+    # OBJECT_STORE picks the backend (memory, sqlite or log), OBJECT_STORE_PATH where a
+    # persistent backend keeps its data, and JSON_REPRESENTATION how responses are encoded
+    app.config.update(config or {})
+    store = create_store(app.config.get('OBJECT_STORE', 'memory'),
+                         app.config.get('OBJECT_STORE_PATH'), INITIAL_OBJECTS)
     api = Api(app)
-    api.add_resource(Object, "/object/<string:name>")
+    representation = app.config.get('JSON_REPRESENTATION', 'fast')
+    if representation != 'default':
+        if representation not in REPRESENTATIONS:
+            raise ValueError('Unknown JSON representation {!r} (expected default or {})'.format(
+                representation, ', '.join(REPRESENTATIONS)))
+        api.representation('application/json')(REPRESENTATIONS[representation])
+    api.add_resource(Object, "/object/<string:name>", resource_class_kwargs={'store': store})
+    api.add_resource(Objects, "/objects", resource_class_kwargs={'store': store})
     return app
@@ -1,5 +1,7 @@
-from api import app_factory
+import os
+from api import app_factory, environment_config
 
-application = app_factory()
+# The development server, for production use wsgi.py or asgi.py (see README.md)
+application = app_factory(environment_config())
 if __name__ == '__main__':
-    application.run(host='0.0.0.0')
+    application.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
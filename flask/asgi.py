@@ -0,0 +1,184 @@
+import re
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from werkzeug.http import parse_etags
+from api import environment_config
+from models.conditional import Conditions, cache_headers, has_preconditions, not_modified, \
+    preconditions_met
+from models.object_formatted import INITIAL_OBJECTS, format_message
+from models.store import POOL_SIZE, create_store
+from representations import dumps_fast
+
+# An async variant of api.py for ASGI servers, such as
+#     gunicorn --workers 4 --worker-class uvicorn.workers.UvicornWorker asgi:application
+# or uvicorn asgi:application for a single process. It serves the same routes, apart from
+# /objects, with the same configuration variables. Like wsgi.py, objects are kept in SQLite
+# unless OBJECT_STORE says otherwise, since workers don't share memory
+
+VERSION_PATH = re.compile(r'^/versions/([^/]+)$')
+OBJECT_PATH = re.compile(r'^/object/([^/]+)$')
+TEXT_TYPE = b'text/html; charset=utf-8'
+JSON_TYPE = b'application/json'
+
+
+class AsyncStore:
+    # Runs the store's calls on a thread pool, so waiting on the disk or on other processes
+    # never blocks the event loop. The in-memory store only ever waits on its own
+    # (briefly held) locks, so it is called directly
+    def __init__(self, store, blocking):
+        self.store = store
+        self._executor = ThreadPoolExecutor(POOL_SIZE) if blocking else None
+
+    async def call(self, method, *args):
+        function = getattr(self.store, method)
+        if self._executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.store.close()
+
+
+config = environment_config({'OBJECT_STORE': 'sqlite'})
+objects = AsyncStore(create_store(config['OBJECT_STORE'], config.get('OBJECT_STORE_PATH'),
+                                  INITIAL_OBJECTS),
+                     blocking=config['OBJECT_STORE'] != 'memory')
+
+
+def text_response(body, status=200):
+    return status, body.encode('utf-8'), [(b'content-type', TEXT_TYPE)]
+
+
+def json_response(data, status=200, headers=None):
+    body = dumps_fast(data)
+    response_headers = [(b'content-type', JSON_TYPE)]
+    response_headers.extend((key.lower().encode('latin-1'), value.encode('latin-1'))
+                            for key, value in (headers or {}).items())
+    return status, body if isinstance(body, bytes) else body.encode('utf-8'), response_headers
+
+
+def parse_value(scope, body):
+    # Like the resource's parser, the value can come from a JSON body, a form or the URL
+    headers = dict(scope['headers'])
+    if headers.get(b'content-type', b'').startswith(JSON_TYPE):
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return None
+        return data.get('value') if isinstance(data, dict) else None
+    for values in (parse_qs(body.decode('latin-1')), parse_qs(scope['query_string'].decode())):
+        if 'value' in values:
+            return values['value'][0]
+    return None
+
+
+def parse_conditions(scope):
+    headers = dict(scope['headers'])
+    return Conditions(parse_etags(headers.get(b'if-match', b'').decode('latin-1')),
+                      parse_etags(headers.get(b'if-none-match', b'').decode('latin-1')))
+
+
+async def current_version(name):
+    entry = await objects.call('get_entry', name)
+    return None if entry is None else entry[1]
+
+
+async def get_object(name, conditions):
+    entry = await objects.call('get_entry', name)
+    if entry is None:
+        return json_response(format_message(name, "not found"), 404)
+    value, version = entry
+    if not_modified(version, conditions):
+        return json_response(None, 304, cache_headers(version))
+    return json_response(value, 200, cache_headers(version))
+
+
+async def post_object(name, value, conditions):
+    if value is None:
+        return json_response("Malformed request", 400)
+    elif has_preconditions(conditions) and \
+            not preconditions_met(await current_version(name), conditions):
+        return json_response(format_message(name, "has changed"), 412)
+    version = await objects.call('put_if_absent', name, value)
+    if version is not None:
+        return json_response(format_message(name, "created successfully"), 201,
+                             cache_headers(version))
+    return json_response("Object {} already exists".format(name), 402)
+
+
+async def delete_object(name, conditions):
+    # Only deletes the version the preconditions were checked against
+    version = None
+    if has_preconditions(conditions):
+        version = await current_version(name)
+        if not preconditions_met(version, conditions):
+            return json_response(format_message(name, "has changed"), 412)
+    if await objects.call('delete', name, version):
+        return json_response("Object {} deleted".format(name), 200)
+    elif version is not None:
+        return json_response(format_message(name, "has changed"), 412)
+    return json_response(format_message(name, "not found"), 404)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def dispatch(scope, receive): # pylint: disable=too-many-return-statements
+    path = scope['path']
+    # HEAD is served like GET, with the body left out of the response (see application)
+    method = 'GET' if scope['method'] == 'HEAD' else scope['method']
+    object_match = OBJECT_PATH.match(path)
+    if object_match is not None:
+        name = object_match.group(1)
+        if method == 'GET':
+            return await get_object(name, parse_conditions(scope))
+        elif method == 'POST':
+            value = parse_value(scope, await read_body(receive))
+            return await post_object(name, value, parse_conditions(scope))
+        elif method == 'DELETE':
+            return await delete_object(name, parse_conditions(scope))
+        return text_response("Method Not Allowed", 405)
+
+    version_match = VERSION_PATH.match(path)
+    if method != 'GET':
+        return text_response("Method Not Allowed", 405)
+    elif path == '/':
+        return text_response("hello world")
+    elif version_match is not None:
+        return text_response("running on version {}".format(version_match.group(1)))
+    elif path == '/status':
+        return 204, b'', []
+    return text_response("Not Found", 404)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            objects.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    status, body, headers = await dispatch(scope, receive)
+    if status in (204, 304):
+        body = b''
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
@@ -0,0 +1,43 @@
+from collections import namedtuple
+from flask import request
+
+# Clients may cache responses, but must check they're still current (which is cheap, as
+# unchanged responses come back as an empty 304)
+CACHE_CONTROL = 'no-cache'
+
+# The conditional headers of a request outside of Flask, as werkzeug ETags
+Conditions = namedtuple('Conditions', ['if_match', 'if_none_match'])
+
+
+def format_etag(version):
+    return '"{}"'.format(version)
+
+
+def cache_headers(version):
+    return {'ETag': format_etag(version), 'Cache-Control': CACHE_CONTROL}
+
+
+def not_modified(version, conditions=None):
+    conditions = conditions or request
+    return conditions.if_none_match.contains_weak(str(version))
+
+
+def has_preconditions(conditions=None):
+    conditions = conditions or request
+    return bool(conditions.if_match or conditions.if_none_match)
+
+
+def current_version(store, name):
+    entry = store.get_entry(name)
+    return None if entry is None else entry[1]
+
+
+def preconditions_met(version, conditions=None):
+    # version is None when the object doesn't exist, which fails any If-Match
+    conditions = conditions or request
+    if_match = conditions.if_match
+    if if_match and (version is None or not if_match.contains(str(version))):
+        return False
+    if conditions.if_none_match and version is not None and not_modified(version, conditions):
+        return False
+    return True
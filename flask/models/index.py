@@ -0,0 +1,78 @@
+import bisect
+
+CHUNK_SIZE = 1000
+
+
+class SortedIndex:
+    # Names are kept sorted in chunks of up to twice CHUNK_SIZE names, along with the
+    # largest name in each chunk, so adding or removing a name only shifts the names in
+    # its own chunk, and finding one is two binary searches. Callers handle locking
+    def __init__(self):
+        self._chunks = []
+        self._maxes = []
+
+    def _find(self, name):
+        position = bisect.bisect_left(self._maxes, name)
+        if position == len(self._maxes):
+            return None, None
+        chunk = self._chunks[position]
+        return position, chunk
+
+    def add(self, name):
+        if not self._chunks:
+            self._chunks.append([name])
+            self._maxes.append(name)
+            return
+        position, chunk = self._find(name)
+        if position is None:
+            # Larger than every name, so it goes at the end of the last chunk
+            position = len(self._chunks) - 1
+            chunk = self._chunks[position]
+        index = bisect.bisect_left(chunk, name)
+        if index < len(chunk) and chunk[index] == name:
+            return
+        chunk.insert(index, name)
+        self._maxes[position] = chunk[-1]
+        if len(chunk) > 2 * CHUNK_SIZE:
+            self._chunks[position:position + 1] = [chunk[:CHUNK_SIZE], chunk[CHUNK_SIZE:]]
+            self._maxes[position:position + 1] = [chunk[CHUNK_SIZE - 1], chunk[-1]]
+
+    def remove(self, name):
+        position, chunk = self._find(name)
+        if position is None:
+            return
+        index = bisect.bisect_left(chunk, name)
+        if index == len(chunk) or chunk[index] != name:
+            return
+        del chunk[index]
+        if chunk:
+            self._maxes[position] = chunk[-1]
+        else:
+            del self._chunks[position]
+            del self._maxes[position]
+
+    def range(self, prefix, after, limit):
+        # Up to limit names starting with prefix, after the name after (if given)
+        if after is not None and after >= prefix:
+            position = bisect.bisect_right(self._maxes, after)
+            find = bisect.bisect_right
+            start = after
+        else:
+            position = bisect.bisect_left(self._maxes, prefix)
+            find = bisect.bisect_left
+            start = prefix
+
+        names = []
+        index = None
+        while position < len(self._chunks) and len(names) < limit:
+            chunk = self._chunks[position]
+            index = find(chunk, start) if index is None else 0
+            for name in chunk[index:index + limit - len(names)]:
+                if not name.startswith(prefix):
+                    return names
+                names.append(name)
+            position += 1
+        return names
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
@@ -1,30 +1,42 @@
 from flask_restful import Resource
 from flask_restful import reqparse
+from models.conditional import cache_headers,not_modified
+from models.conditional import current_version, has_preconditions, preconditions_met
 
 # Intentionally formatted poorly to check pylint functionality
-objects = {"ball": "red", "clown": "fun"}
+INITIAL_OBJECTS = {"ball": "red", "clown": "fun"}
+parser = reqparse.RequestParser()
+parser.add_argument('value')
 def formatMessage(name, message):
     return ("Object {} {}".format(name, message))
 class Object( Resource ):
-    def get(self, newNAME ):
-        if newNAME in objects.keys():    return objects[ newNAME ],   200
-        else: return formatMessage(newNAME, "not found"), 404
+    def __init__(self,store): self.store=store
+    def get(self, name ):
+        Entry=self.store.get_entry( name )
+        if Entry is None:    return formatMessage(name, "not found"), 404
+        Value,version=Entry
+        if not_modified(version) : return None,304,cache_headers(version)
+        else: return Value,   200,cache_headers( version )
     def post(self, name):
-        parser = reqparse.RequestParser()
-        parser.add_argument('value')
         args = parser.parse_args()
         if args.get('value') is None:
             return "Malformed request", 400
+        elif has_preconditions() and not preconditions_met(current_version(self.store,name)):
+            return formatMessage(name,"has changed"),412
         else:
-            if name not in objects.keys():
-                objects[name]=args.get( 'value')
-                return formatMessage(name, "created successfully").format(name),201
+            version=self.store.put_if_absent(name,args.get( 'value'))
+            if version!=None:
+                return formatMessage(name, "created successfully").format(name),201,cache_headers(version)
             else:
                 return "Object {} already exists".format(name),402
     def delete(self, name):
-        if (name in objects.keys()):
-            del objects[name]
+        version=None
+        if has_preconditions():
+            version=current_version(self.store,name)
+            if not preconditions_met(version): return formatMessage(name,"has changed"),412
+        if (self.store.delete(name,version)):
             return "Object {} deleted".format(
                 name),   200
+        elif version!=None: return formatMessage(name,"has changed"),412
         else:
             return formatMessage(name, "not found"), 404
@@ -1,6 +1,11 @@
 from flask_restful import Resource, reqparse
+from models.conditional import (cache_headers, current_version, has_preconditions,
+                                not_modified, preconditions_met)
 
-objects = {"ball": "red", "clown": "fun"}
+INITIAL_OBJECTS = {"ball": "red", "clown": "fun"}
+
+value_parser = reqparse.RequestParser()
+value_parser.add_argument('value')
 
 
 def format_message(name, message):
@@ -8,27 +13,42 @@ def format_message(name, message):
 
 
 class Object(Resource):
+    def __init__(self, store):
+        self.store = store
+
     def get(self, name):
-        if name in objects.keys():
-            return objects[name], 200
-        return format_message(name, "not found"), 404
+        entry = self.store.get_entry(name)
+        if entry is None:
+            return format_message(name, "not found"), 404
+        value, version = entry
+        if not_modified(version):
+            return None, 304, cache_headers(version)
+        return value, 200, cache_headers(version)
 
     def post(self, name):
-        parser = reqparse.RequestParser()
-        parser.add_argument('value')
-        args = parser.parse_args()
+        args = value_parser.parse_args()
         if args.get('value') is None:
             return "Malformed request", 400
+        elif has_preconditions() and not preconditions_met(current_version(self.store, name)):
+            return format_message(name, "has changed"), 412
         else:
-            if name not in objects.keys():
-                objects[name] = args.get('value')
-                return format_message(name, "created successfully").format(name), 201
+            version = self.store.put_if_absent(name, args.get('value'))
+            if version is not None:
+                return format_message(name, "created successfully").format(name), 201, \
+                    cache_headers(version)
             else:
                 return "Object {} already exists".format(name), 402
 
     def delete(self, name):
-        if name in objects.keys():
-            del objects[name]
+        # Only deletes the version the preconditions were checked against
+        version = None
+        if has_preconditions():
+            version = current_version(self.store, name)
+            if not preconditions_met(version):
+                return format_message(name, "has changed"), 412
+        if self.store.delete(name, version):
             return "Object {} deleted".format(name), 200
+        elif version is not None:
+            return format_message(name, "has changed"), 412
         else:
             return format_message(name, "not found"), 404
@@ -0,0 +1,93 @@
+from flask import request
+from flask_restful import Resource, reqparse
+from models.conditional import cache_headers, format_etag, not_modified
+
+MAX_BATCH_SIZE = 10000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+page_parser = reqparse.RequestParser()
+page_parser.add_argument('prefix', location='args', default='')
+page_parser.add_argument('cursor', location='args')
+page_parser.add_argument('limit', type=int, location='args', default=DEFAULT_PAGE_SIZE)
+
+
+def format_result(name, status, message):
+    return {'name': name, 'status': status, 'message': "Object {} {}".format(name, message)}
+
+
+def parse_batch(is_item):
+    # Batches are JSON arrays, checked in full before any of them is applied
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, list) or not all(is_item(item) for item in batch):
+        return None
+    return batch
+
+
+def is_new_object(item):
+    return isinstance(item, dict) and isinstance(item.get('name'), str) \
+        and item.get('value') is not None
+
+
+def is_name(item):
+    return isinstance(item, str)
+
+
+class Objects(Resource):
+    def __init__(self, store):
+        self.store = store
+
+    def get(self):
+        names = request.args.getlist('name')
+        if names:
+            return self.get_many(names)
+        args = page_parser.parse_args()
+        if not 1 <= args['limit'] <= MAX_PAGE_SIZE:
+            return "Malformed request", 400
+        # Checking the version first skips listing and serializing unchanged pages. It is
+        # read before the page, so a page is never cached under an older version
+        version = self.store.version()
+        if not_modified(version):
+            return None, 304, cache_headers(version)
+        items, cursor = self.store.list_page(args['prefix'], args['cursor'], args['limit'])
+        return {'objects': [{'name': name, 'value': value} for name, value in items],
+                'cursor': cursor}, 200, cache_headers(version)
+
+    def get_many(self, names):
+        if len(names) > MAX_BATCH_SIZE:
+            return "Batch too large", 413
+        results = []
+        for name, entry in zip(names, self.store.get_many(names)):
+            if entry is None:
+                results.append(format_result(name, 404, "not found"))
+            else:
+                results.append({'name': name, 'status': 200, 'value': entry[0],
+                                'etag': format_etag(entry[1])})
+        return results, 200
+
+    def post(self):
+        batch = parse_batch(is_new_object)
+        if batch is None:
+            return "Malformed request", 400
+        elif len(batch) > MAX_BATCH_SIZE:
+            return "Batch too large", 413
+        versions = self.store.put_many([(item['name'], item['value']) for item in batch])
+        results = []
+        for item, version in zip(batch, versions):
+            if version is None:
+                results.append(format_result(item['name'], 402, "already exists"))
+            else:
+                result = format_result(item['name'], 201, "created successfully")
+                result['etag'] = format_etag(version)
+                results.append(result)
+        return results, 200
+
+    def delete(self):
+        names = parse_batch(is_name)
+        if names is None:
+            return "Malformed request", 400
+        elif len(names) > MAX_BATCH_SIZE:
+            return "Batch too large", 413
+        return [format_result(name, 200, "deleted") if deleted
+                else format_result(name, 404, "not found")
+                for name, deleted in zip(names, self.store.delete_many(names))], 200
@@ -0,0 +1,511 @@
+import os
+import json
+import mmap
+import queue
+import sqlite3
+import threading
+from contextlib import ExitStack, contextmanager
+from models.index import SortedIndex
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (on Windows), the log store can only be shared by threads
+    fcntl = None
+
+STRIPE_COUNT = 16
+POOL_SIZE = 8
+SQLITE_TIMEOUT = 30
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS objects (name TEXT PRIMARY KEY, value TEXT, version INTEGER);
+CREATE TABLE IF NOT EXISTS counter (version INTEGER);
+INSERT INTO counter SELECT 0 WHERE NOT EXISTS (SELECT * FROM counter);
+'''
+LOCK_SUFFIX = '.lock'
+# The log is compacted once it holds this many times more records than live objects
+COMPACT_RATIO = 4
+COMPACT_MINIMUM = 1024
+DEFAULT_PATHS = {'sqlite': 'objects.sqlite3', 'log': 'objects.log'}
+
+# Every store has the same API: get, get_entry, put_if_absent, delete, version, list_page,
+# len and close, plus get_many, put_many and delete_many, which apply a whole batch at
+# once. Each change bumps the store's version, and objects keep the version they were
+# created at, so an object's version never refers to two different values
+BOOT_ID_BYTES = 4
+
+
+class ObjectStore:
+    def __init__(self, initial=None, stripe_count=STRIPE_COUNT):
+        # Each key lives in one stripe, so requests for keys in different stripes
+        # never wait on each other's locks. Each stripe counts its own changes, and the
+        # store's version is their sum
+        self._stripes = [({}, threading.Lock()) for _ in range(stripe_count)]
+        self._versions = [0] * stripe_count
+        # The counts restart with the store, so versions start with an id of their own
+        # for each store, which keeps a version from before a restart from matching
+        # a different value after it
+        self._boot_id = os.urandom(BOOT_ID_BYTES).hex()
+        # The sorted index of every name has a lock of its own, always taken after the
+        # stripe locks
+        self._index = SortedIndex()
+        self._index_lock = threading.Lock()
+        for name, value in (initial or {}).items():
+            self.put_if_absent(name, value)
+
+    def _stripe(self, name):
+        index = hash(name) % len(self._stripes)
+        values, lock = self._stripes[index]
+        return index, values, lock
+
+    @staticmethod
+    @contextmanager
+    def _holding(stripes):
+        # Stripe locks are always taken in the same order, so batches can't deadlock
+        locks = {index: lock for index, _, lock in stripes}
+        with ExitStack() as stack:
+            for index in sorted(locks):
+                stack.enter_context(locks[index])
+            yield
+
+    def _put(self, stripe, name, value):
+        index, values, _ = stripe
+        if name in values:
+            return None
+        self._versions[index] += 1
+        version = '{}-{}'.format(self._boot_id, self._versions[index])
+        values[name] = (value, version)
+        with self._index_lock:
+            self._index.add(name)
+        return version
+
+    def _delete(self, stripe, name, version):
+        index, values, _ = stripe
+        entry = values.get(name)
+        if entry is None or version is not None and entry[1] != version:
+            return False
+        self._versions[index] += 1
+        del values[name]
+        with self._index_lock:
+            self._index.remove(name)
+        return True
+
+    def get(self, name):
+        entry = self.get_entry(name)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, name):
+        _, values, lock = self._stripe(name)
+        with lock:
+            return values.get(name)
+
+    def put_if_absent(self, name, value):
+        stripe = self._stripe(name)
+        with stripe[2]:
+            return self._put(stripe, name, value)
+
+    def delete(self, name, version=None):
+        stripe = self._stripe(name)
+        with stripe[2]:
+            return self._delete(stripe, name, version)
+
+    def get_many(self, names):
+        stripes = [self._stripe(name) for name in names]
+        with self._holding(stripes):
+            return [values.get(name) for (_, values, _), name in zip(stripes, names)]
+
+    def put_many(self, items):
+        stripes = [self._stripe(name) for name, _ in items]
+        with self._holding(stripes):
+            return [self._put(stripe, name, value)
+                    for stripe, (name, value) in zip(stripes, items)]
+
+    def delete_many(self, names):
+        stripes = [self._stripe(name) for name in names]
+        with self._holding(stripes):
+            return [self._delete(stripe, name, None) for stripe, name in zip(stripes, names)]
+
+    def version(self):
+        # Stripe versions only grow, so a version read before a change never matches one
+        # read after it
+        return '{}-{}'.format(self._boot_id, sum(self._versions))
+
+    def list_page(self, prefix, after, limit):
+        with self._index_lock:
+            names = self._index.range(prefix, after, limit + 1)
+        # Objects deleted since their names were read are left out
+        return paginate(names, limit, self.get_many(names[:limit]))
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return sum(len(values) for values, _ in self._stripes)
+
+
+class SQLiteStore:
+    def __init__(self, path, initial=None, pool_size=POOL_SIZE):
+        created = not os.path.exists(path)
+        self._path = path
+        self._pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        self._reset_pool()
+        with self._connection() as connection:
+            connection.executescript(SQLITE_SCHEMA)
+        # Only seed new databases, so deleted objects stay deleted across restarts
+        if created:
+            for name, value in (initial or {}).items():
+                self.put_if_absent(name, value)
+
+    def _reset_pool(self):
+        # Connections can't be shared with forked worker processes, which get their own
+        self._pid = os.getpid()
+        self._pool = queue.LifoQueue()
+        self._opened = 0
+
+    def _connect(self):
+        # Autocommit mode makes each statement its own transaction, and WAL mode lets
+        # readers carry on while another connection (or process) writes
+        connection = sqlite3.connect(self._path, timeout=SQLITE_TIMEOUT, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @contextmanager
+    def _connection(self):
+        with self._pool_lock:
+            if self._pid != os.getpid():
+                self._reset_pool()
+            pool = self._pool
+            opened = self._opened < self._pool_size and pool.empty()
+            if opened:
+                self._opened += 1
+        connection = self._connect() if opened else pool.get()
+        try:
+            yield connection
+        finally:
+            pool.put(connection)
+
+    @contextmanager
+    def _transaction(self, immediate=True):
+        # An immediate transaction takes the write lock up front, so the version read at
+        # its start can't change before it commits
+        with self._connection() as connection:
+            connection.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    @staticmethod
+    def _next_version(connection):
+        connection.execute('UPDATE counter SET version = version + 1')
+        return connection.execute('SELECT version FROM counter').fetchone()[0]
+
+    def _put(self, connection, name, value):
+        if connection.execute('SELECT 1 FROM objects WHERE name = ?', (name,)).fetchone():
+            return None
+        version = self._next_version(connection)
+        connection.execute('INSERT INTO objects VALUES (?, ?, ?)',
+                           (name, json.dumps(value), version))
+        return version
+
+    def _delete(self, connection, name, version):
+        row = connection.execute('SELECT version FROM objects WHERE name = ?',
+                                 (name,)).fetchone()
+        if row is None or version is not None and row[0] != version:
+            return False
+        self._next_version(connection)
+        connection.execute('DELETE FROM objects WHERE name = ?', (name,))
+        return True
+
+    @staticmethod
+    def _get_entry(connection, name):
+        row = connection.execute('SELECT value, version FROM objects WHERE name = ?',
+                                 (name,)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def get(self, name):
+        entry = self.get_entry(name)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, name):
+        with self._connection() as connection:
+            return self._get_entry(connection, name)
+
+    def put_if_absent(self, name, value):
+        with self._transaction() as connection:
+            return self._put(connection, name, value)
+
+    def delete(self, name, version=None):
+        with self._transaction() as connection:
+            return self._delete(connection, name, version)
+
+    def get_many(self, names):
+        with self._transaction(immediate=False) as connection:
+            return [self._get_entry(connection, name) for name in names]
+
+    def put_many(self, items):
+        with self._transaction() as connection:
+            return [self._put(connection, name, value) for name, value in items]
+
+    def delete_many(self, names):
+        with self._transaction() as connection:
+            return [self._delete(connection, name, None) for name in names]
+
+    def version(self):
+        with self._connection() as connection:
+            return connection.execute('SELECT version FROM counter').fetchone()[0]
+
+    def list_page(self, prefix, after, limit):
+        # Walks the primary key's index from the first name in the page, stopping at the
+        # first name without the prefix
+        if after is not None and after >= prefix:
+            query, start = 'SELECT name, value FROM objects WHERE name > ?', after
+        else:
+            query, start = 'SELECT name, value FROM objects WHERE name >= ?', prefix
+        names = []
+        entries = []
+        with self._connection() as connection:
+            for name, value in connection.execute(query + ' ORDER BY name LIMIT ?',
+                                                  (start, limit + 1)):
+                if not name.startswith(prefix):
+                    break
+                names.append(name)
+                entries.append((json.loads(value), None))
+        return paginate(names, limit, entries)
+
+    def close(self):
+        with self._pool_lock:
+            while not self._pool.empty():
+                self._pool.get().close()
+            self._reset_pool()
+
+    def __len__(self):
+        with self._connection() as connection:
+            return connection.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+
+class LogStore: # pylint: disable=too-many-instance-attributes
+    def __init__(self, path, initial=None, compact_ratio=COMPACT_RATIO):
+        created = not os.path.exists(path)
+        self._path = path
+        self._compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lock_file = None
+        self._fd = None
+        self._inode = None
+        self._values = {}
+        self._index = SortedIndex()
+        self._version = 0
+        self._offset = 0
+        self._records = 0
+        # Replays the log, compacting it if it has mostly gone stale
+        with self._locked(exclusive=True):
+            self._compact_if_stale()
+        if created:
+            for name, value in (initial or {}).items():
+                self.put_if_absent(name, value)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        # The thread lock guards this process' view of the log, and the file lock keeps
+        # other processes from appending (or compacting) at the same time
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reopen_lock_file()
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _reopen_lock_file(self):
+        # A forked process shares its parent's open files (and so its file locks)
+        if self._lock_file is not None:
+            self._lock_file.close()
+        self._lock_file = open(self._path + LOCK_SUFFIX, 'a') # pylint: disable=consider-using-with
+        self._pid = os.getpid()
+        self._inode = None
+
+    def _catch_up(self):
+        # Another process compacting the log replaces it with a new file
+        if self._inode is None or os.stat(self._path).st_ino != self._inode:
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT | os.O_APPEND)
+            self._inode = os.fstat(self._fd).st_ino
+            self._values = {}
+            self._index = SortedIndex()
+            self._version = 0
+            self._offset = 0
+            self._records = 0
+
+        size = os.fstat(self._fd).st_size
+        if size <= self._offset:
+            return
+        with mmap.mmap(self._fd, size, access=mmap.ACCESS_READ) as data:
+            # A record cut short by a crash is skipped, and truncated by the next append
+            end = data.rfind(b'\n', self._offset, size) + 1
+            if end <= self._offset:
+                return
+            for line in data[self._offset:end].splitlines():
+                self._apply(json.loads(line.decode('utf-8')))
+                self._records += 1
+        self._offset = end
+
+    def _apply(self, record):
+        # Records are ['put', name, value, version], ['delete', name, version],
+        # ['batch', records] or, at the start of a compacted log, ['version', version].
+        # A batch is a single line, so a crash can't leave half of one in the log
+        if record[0] == 'batch':
+            for batched_record in record[1]:
+                self._apply(batched_record)
+            return
+        if record[0] == 'put':
+            self._values[record[1]] = (record[2], record[3])
+            self._index.add(record[1])
+        elif record[0] == 'delete':
+            self._values.pop(record[1], None)
+            self._index.remove(record[1])
+        self._version = record[-1]
+
+    def _put(self, name, value, records):
+        if name in self._values:
+            return None
+        records.append(['put', name, value, self._version + 1])
+        self._apply(records[-1])
+        return self._version
+
+    def _delete(self, name, version, records):
+        entry = self._values.get(name)
+        if entry is None or version is not None and entry[1] != version:
+            return False
+        records.append(['delete', name, self._version + 1])
+        self._apply(records[-1])
+        return True
+
+    def _append(self, records):
+        # The records have already been applied, so if they can't be written, the log is
+        # replayed from scratch on the next call
+        if not records:
+            return
+        try:
+            if os.fstat(self._fd).st_size != self._offset:
+                os.ftruncate(self._fd, self._offset)
+            record = records[0] if len(records) == 1 else ['batch', records]
+            line = (json.dumps(record) + '\n').encode('utf-8')
+            os.write(self._fd, line)
+        except OSError:
+            self._inode = None
+            raise
+        self._offset += len(line)
+        self._records += 1
+
+    def _compact_if_stale(self):
+        if self._records > max(COMPACT_MINIMUM, self._compact_ratio * len(self._values)):
+            self._compact()
+
+    def _compact(self):
+        temporary_path = '{}.{}.tmp'.format(self._path, os.getpid())
+        with open(temporary_path, 'wb') as log_file:
+            records = [['version', self._version]]
+            records.extend(['put', name, value, version]
+                           for name, (value, version) in self._values.items())
+            for record in records:
+                log_file.write((json.dumps(record) + '\n').encode('utf-8'))
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        os.replace(temporary_path, self._path)
+        # Reloads the compacted log, and lets other processes know to do the same
+        self._inode = None
+        self._catch_up()
+
+    def get(self, name):
+        entry = self.get_entry(name)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, name):
+        with self._locked(exclusive=False):
+            return self._values.get(name)
+
+    def put_if_absent(self, name, value):
+        return self.put_many([(name, value)])[0]
+
+    def delete(self, name, version=None):
+        with self._locked(exclusive=True):
+            records = []
+            deleted = self._delete(name, version, records)
+            self._append(records)
+            self._compact_if_stale()
+            return deleted
+
+    def get_many(self, names):
+        with self._locked(exclusive=False):
+            return [self._values.get(name) for name in names]
+
+    def put_many(self, items):
+        with self._locked(exclusive=True):
+            records = []
+            versions = [self._put(name, value, records) for name, value in items]
+            self._append(records)
+            return versions
+
+    def delete_many(self, names):
+        with self._locked(exclusive=True):
+            records = []
+            deleted = [self._delete(name, None, records) for name in names]
+            self._append(records)
+            self._compact_if_stale()
+            return deleted
+
+    def version(self):
+        with self._locked(exclusive=False):
+            return self._version
+
+    def list_page(self, prefix, after, limit):
+        with self._locked(exclusive=False):
+            names = self._index.range(prefix, after, limit + 1)
+            return paginate(names, limit, [self._values.get(name) for name in names[:limit]])
+
+    def compact(self):
+        with self._locked(exclusive=True):
+            self._compact()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+            if self._lock_file is not None:
+                self._lock_file.close()
+            self._fd = self._lock_file = self._inode = self._pid = None
+
+    def __len__(self):
+        with self._locked(exclusive=False):
+            return len(self._values)
+
+
+def paginate(names, limit, entries):
+    # Pages hold the objects still found among the first limit names (with entries for
+    # each), and a cursor to carry on from when there were more names
+    items = [(name, entry[0]) for name, entry in zip(names[:limit], entries)
+             if entry is not None]
+    return items, names[limit - 1] if len(names) > limit else None
+
+
+STORES = {'memory': ObjectStore, 'sqlite': SQLiteStore, 'log': LogStore}
+
+
+def create_store(backend, path=None, initial=None):
+    if backend not in STORES:
+        raise ValueError('Unknown object store {!r} (expected one of {})'.format(
+            backend, ', '.join(STORES)))
+    if backend == 'memory':
+        return ObjectStore(initial)
+    return STORES[backend](path or DEFAULT_PATHS[backend], initial)
@@ -0,0 +1,26 @@
+import json
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encoding with a single compact encoder skips flask_restful's per-response settings
+# lookups, and orjson (when installed) encodes several times faster still
+encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def dumps_fast(data):
+    if orjson is not None:
+        return orjson.dumps(data) + b'\n'
+    return encoder.encode(data) + '\n'
+
+
+def output_fast_json(data, code, headers=None):
+    return current_app.response_class(dumps_fast(data), status=code, headers=headers,
+                                      mimetype='application/json')
+
+
+# JSON_REPRESENTATION picks one of these, or 'default' for flask_restful's own
+REPRESENTATIONS = {'fast': output_fast_json}
@@ -0,0 +1,7 @@
+from api import app_factory, environment_config
+
+# Entry point for WSGI servers running several worker processes, such as
+#     gunicorn --workers 4 --bind 0.0.0.0:8000 wsgi:application
+# Workers don't share memory, so objects are kept in SQLite unless OBJECT_STORE says
+# otherwise. Each worker (forked with --preload or not) opens its own connections
+application = app_factory(environment_config({'OBJECT_STORE': 'sqlite'}))
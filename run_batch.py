@@ -0,0 +1,582 @@
+"""
+Batch script to run pylint and Checkstyle over many projects (such as every team's
+repository) at once, using a shared pool of worker processes
+"""
+
+__author__ = "CS 2340 TAs"
+__version__ = "1.0"
+
+# pylint: disable=wrong-import-position
+# Python version check
+import sys
+if sys.version_info[0] < 3:
+    print(
+        """This script requires Python 3 to run:
+https://www.python.org/downloads/
+""")
+    sys.exit(-1)
+
+import os
+import io
+import json
+import time
+import signal
+import argparse
+import traceback
+import contextlib
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+from shutil import which
+
+import run_checkstyle
+
+DESCRIPTION = "Batch script to run pylint and Checkstyle over every project in a manifest"
+CHECKERS = ["pylint", "checkstyle"]
+DEFAULT_TIMEOUT = 10 * 60
+STATE_SUFFIX = ".state.json"
+STATE_VERSION = 2
+POLL_INTERVAL = 1.0
+
+# Output
+LABEL_WIDTH = 40
+LABEL_FORMAT = "{:<40}"
+CELL_FORMAT = " {:>12}"
+SCORE_CELL_FORMAT = "{:.2f}"
+PROGRESS_FORMAT = "[{}/{}] {} {}: {}"
+RESUMED_TEXT = "> Note: resuming from {}, where {} of {} jobs are already done (see --fresh)"
+INTERRUPTED_TEXT = """
+> Note: the batch was interrupted. Finished jobs were saved to {},
+        so running the same command again resumes where it left off.""".lstrip()
+NO_PYLINT_TEXT = "pylint is not installed"
+PYLINT_INCOMPLETE_TEXT = "pylint did not finish running"
+NO_JAVA_TEXT = "Java is not installed"
+NO_CHECKSTYLE_TEXT = "the Checkstyle jar or configuration could not be fetched"
+
+
+def main(manifest, checkers=None, process_count=None, timeout=DEFAULT_TIMEOUT, # pylint: disable=too-many-arguments,too-many-locals
+         state_path=None, fresh=False, strict=False, report_file=None):
+    """
+    Runs every checker over every project in the manifest, printing a table of the scores
+    of each project and an aggregate over all of them
+
+    Parameters:
+    manifest (string): the path to a file listing one project root per line
+
+    Named:
+    checkers (list): the checkers to run (defaults to all of CHECKERS)
+    process_count (int): the number of worker processes (defaults to the number of cores)
+    timeout (float): the number of seconds a single job may run before it is stopped
+    state_path (string): where finished jobs are saved to resume an interrupted batch
+                         (defaults to the manifest's path followed by STATE_SUFFIX), which
+                         is removed once the batch is over
+    fresh (bool): whether to ignore the jobs finished by a previous batch
+    report_file (file): if specified, a JSON report of every job is written to it
+    """
+
+    checkers = checkers or CHECKERS
+    roots = read_manifest(manifest)
+    jobs = [(checker, root) for root in roots for checker in checkers]
+    settings = {"strict": strict, "jar_path": None, "xml_path": None,
+                "pylint": importlib.util.find_spec("pylint") is not None,
+                "java": which("java") is not None}
+    state_path = state_path or manifest + STATE_SUFFIX
+    state = empty_state() if fresh else load_state(state_path)
+    # The results of this batch by job, starting with the jobs a previous batch finished
+    results = {job: state["jobs"][get_job_key(job, settings)] for job in jobs
+               if get_job_key(job, settings) in state["jobs"]}
+    if fresh:
+        save_state(state, state_path)
+    elif results:
+        print(RESUMED_TEXT.format(state_path, len(results), len(jobs)))
+
+    # Check dependencies (and download Checkstyle) once for the whole batch
+    if "checkstyle" in checkers and settings["java"]:
+        mirror = os.environ.get(run_checkstyle.MIRROR_VARIABLE)
+        settings["xml_path"], _ = run_checkstyle.find_or_download(
+            run_checkstyle.CHECKSTYLE_XML_NAME, run_checkstyle.CHECKSTYLE_XML_URL, mirror=mirror)
+        settings["jar_path"], _ = run_checkstyle.find_or_download(
+            run_checkstyle.CHECKSTYLE_JAR_NAME, run_checkstyle.CHECKSTYLE_JAR_URL, mirror=mirror)
+
+    pending = [job for job in jobs if job not in results]
+    # Workers only get the cached pylint results of their own project, and send back the
+    # entries to merge, so that the cache is only read and written once for the batch
+    cache = load_pylint_cache() if "pylint" in checkers and settings["pylint"] else None
+    start = time.perf_counter()
+    try:
+        for index, (job, result) in enumerate(run_jobs(pending, settings, process_count,
+                                                       timeout, cache=cache)):
+            entries = result.pop("cache", None)
+            if entries:
+                cache["files"].update(entries)
+            results[job] = result
+            # Failed and timed out jobs are run again when the batch is resumed
+            if result["status"] == "done":
+                state["jobs"][get_job_key(job, settings)] = result
+                save_state(state, state_path)
+            print(PROGRESS_FORMAT.format(len(jobs) - len(pending) + index + 1, len(jobs),
+                                         job[0], job[1], format_result(result)))
+    except KeyboardInterrupt:
+        print()
+        print(INTERRUPTED_TEXT.format(state_path))
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            save_pylint_cache(cache)
+    # Only an interrupted batch is resumed, so the next batch runs every job again
+    remove_state(state_path)
+
+    print()
+    print(format_table(roots, checkers, results))
+    print()
+    print("Finished {} jobs in {:.1f}s".format(len(pending), time.perf_counter() - start))
+
+    if report_file is not None:
+        json.dump(build_report(roots, checkers, results), report_file, indent=2)
+        report_file.write("\n")
+
+
+def read_manifest(manifest):
+    """
+    Reads the project roots listed in a manifest, one per line, ignoring blank lines and
+    comments starting with "#". Relative roots are relative to the manifest's directory
+    """
+
+    base = os.path.dirname(os.path.abspath(manifest))
+    roots = []
+    with open(manifest, "r") as manifest_file:
+        for line in manifest_file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                root = os.path.normpath(os.path.join(base, os.path.expanduser(line)))
+                if root not in roots:
+                    roots.append(root)
+
+    return roots
+
+
+def run_jobs(jobs, settings, process_count=None, timeout=DEFAULT_TIMEOUT, cache=None):
+    """
+    Runs (checker, root) jobs on a pool of worker processes, each of which keeps its
+    checkers loaded between jobs. Workers whose job runs longer than timeout seconds are
+    stopped and replaced
+
+    Named:
+    cache (dict): the pylint result cache, whose entries for a project are sent along
+                  with its pylint job
+
+    Returns:
+    an iterator of (job, result) pairs in the order that the jobs finish
+    """
+
+    process_count = min(process_count or os.cpu_count() or 1, len(jobs))
+    queue = list(reversed(jobs))
+    # Workers by their connection, each a dict with its process, job and start time
+    workers = {}
+    try:
+        while queue or any(worker["job"] is not None for worker in workers.values()):
+            # Give every idle worker a job, starting new workers as needed
+            while queue and len(workers) < process_count:
+                connection, process = start_worker(settings)
+                workers[connection] = {"process": process, "job": None, "started": None}
+            for connection, worker in workers.items():
+                if worker["job"] is None and queue:
+                    worker["job"] = queue.pop()
+                    worker["started"] = time.perf_counter()
+                    checker, root = worker["job"]
+                    connection.send((worker["job"], get_cache_entries(cache, root)
+                                     if checker == "pylint" else None))
+
+            busy = [connection for connection, worker in workers.items()
+                    if worker["job"] is not None]
+            for connection in wait(busy, timeout=POLL_INTERVAL):
+                worker = workers[connection]
+                job = worker["job"]
+                try:
+                    result = connection.recv()
+                except EOFError:
+                    # The worker crashed, so it has to be replaced
+                    stop_worker(worker["process"], connection)
+                    del workers[connection]
+                    result = {"status": "error", "error": "the worker exited with code "
+                                                          "{}".format(worker["process"].exitcode)}
+                else:
+                    worker["job"] = None
+                yield job, result
+
+            for connection, worker in list(workers.items()):
+                if worker["job"] is not None and \
+                        time.perf_counter() - worker["started"] > timeout:
+                    stop_worker(worker["process"], connection)
+                    del workers[connection]
+                    yield worker["job"], {"status": "timeout", "duration": timeout}
+    finally:
+        for connection, worker in workers.items():
+            stop_worker(worker["process"], connection)
+
+
+def start_worker(settings):
+    """
+    Starts a worker process, returning the connection to it and the process
+    """
+
+    parent_connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=run_worker, args=(child_connection, settings),
+                                      daemon=True)
+    process.start()
+    child_connection.close()
+    return parent_connection, process
+
+
+def stop_worker(process, connection):
+    """
+    Stops a worker process, including any job that it is running
+    """
+
+    connection.close()
+    if process.is_alive():
+        process.terminate()
+    process.join()
+
+
+def run_worker(connection, settings):
+    """
+    Runs jobs sent by the batch until the connection closes
+    """
+
+    # Only the batch handles interruptions
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        try:
+            job, entries = connection.recv()
+        except (EOFError, OSError):
+            return
+
+        connection.send(run_job(job, settings, entries))
+
+
+def run_job(job, settings, entries=None):
+    """
+    Runs a single (checker, root) job, returning its result as a dict with its status
+    ("done" or "error"), the score, file/violation/statement counts and duration. The
+    result of a pylint job also holds the project's updated pylint cache entries under
+    "cache", starting from the given entries
+    """
+
+    checker, root = job
+    start = time.perf_counter()
+    output = io.StringIO()
+    try:
+        # The checkers' own messages would interleave between workers
+        with contextlib.redirect_stdout(output):
+            if not os.path.isdir(root):
+                raise OSError("{} is not a directory".format(root))
+            if checker == "pylint":
+                result = run_pylint_job(root, settings, entries)
+            else:
+                result = run_checkstyle_job(root, settings)
+    # pylint: disable=broad-except
+    except (Exception, SystemExit) as error:
+        result = {"status": "error", "error": str(error) or type(error).__name__,
+                  "output": output.getvalue()[-2000:] or traceback.format_exc()}
+
+    result["duration"] = time.perf_counter() - start
+    return result
+
+
+def run_pylint_job(root, settings, entries=None):
+    """
+    Lints a project with pylint in the worker's own interpreter, reusing the given
+    cache entries of its files
+    """
+
+    if not settings["pylint"]:
+        raise RuntimeError(NO_PYLINT_TEXT)
+
+    # pylint: disable=import-outside-toplevel
+    import run_pylint
+
+    files = run_pylint.get_files(root, (None, None))
+    options_key = run_pylint.get_options_key(run_pylint.get_options([], strict=settings["strict"]))
+    cache = dict(run_pylint.empty_cache(), files=dict(entries or {}))
+    try:
+        results, _, complete = run_pylint.lint_cached(files, [], cache, options_key, root=root,
+                                                      strict=settings["strict"])
+    finally:
+        # Projects share module names, so keep third-party modules cached but not theirs
+        run_pylint.evict_modules(root)
+    if not complete:
+        raise RuntimeError(PYLINT_INCOMPLETE_TEXT)
+
+    return {"status": "done", "score": run_pylint.compute_score(results.values()),
+            "files": len(files),
+            "violations": sum(len(result["messages"]) for result in results.values()),
+            "statements": sum(result["statements"] for result in results.values()),
+            "cache": {filename: cache["files"][filename] for filename in files
+                      if filename in cache["files"]}}
+
+
+def run_checkstyle_job(root, settings):
+    """
+    Checks a project with Checkstyle using the shared Checkstyle server, which keeps a
+    JVM loaded between jobs (falling back to a one-shot Checkstyle process)
+    """
+
+    if not settings["java"]:
+        raise RuntimeError(NO_JAVA_TEXT)
+    if settings["jar_path"] is None or settings["xml_path"] is None:
+        raise RuntimeError(NO_CHECKSTYLE_TEXT)
+
+    files = run_checkstyle.find_files(root, run_checkstyle.JAVA_EXTENSION)
+    report = run_checkstyle.empty_report()
+    for line in run_checkstyle.iter_checkstyle(files, jar_path=settings["jar_path"],
+                                               xml_path=settings["xml_path"], server=True):
+        run_checkstyle.update_report(report, line, run_checkstyle.parse_violation(line))
+
+    statements = sum(run_checkstyle.count_batch_statements(files))
+    score = 0 if report["failed"] else run_checkstyle.calculate_score(report["violations"],
+                                                                      statements)
+    return {"status": "done", "score": score, "files": len(files),
+            "violations": report["violations"], "statements": statements}
+
+
+def build_report(roots, checkers, results):
+    """
+    Builds the JSON report of a batch: the result of every job by project root and
+    checker, and the aggregated scores of each checker
+
+    Parameters:
+    results (dict): the result of each (checker, root) job that has run
+    """
+
+    jobs = {checker: [results.get((checker, root)) for root in roots]
+            for checker in checkers}
+    return {"roots": roots,
+            "results": {root: {checker: jobs[checker][index] for checker in checkers}
+                        for index, root in enumerate(roots)},
+            "aggregate": {checker: aggregate_scores(jobs[checker]) for checker in checkers}}
+
+
+def format_result(result):
+    """
+    Formats the result of a job for a progress line
+    """
+
+    if result["status"] == "done":
+        score = "no score" if result["score"] is None else \
+            "{:.2f}/10".format(max(result["score"], 0))
+        return "{} ({} files, {:.1f}s)".format(score, result["files"], result["duration"])
+    if result["status"] == "timeout":
+        return "timed out after {:.0f}s".format(result["duration"])
+    return "failed: {}".format(result["error"])
+
+
+def format_table(roots, checkers, results):
+    """
+    Formats the (clamped) scores of every project as a table, followed by the average,
+    lowest and highest score of each checker
+    """
+
+    lines = [format_row("Project", checkers)]
+    lines.append(len(lines[0]) * "-")
+    for root in roots:
+        lines.append(format_row(shorten(root, LABEL_WIDTH),
+                                [format_cell(results.get((checker, root)))
+                                 for checker in checkers]))
+
+    lines.append(len(lines[0]) * "-")
+    aggregates = [aggregate_scores([results.get((checker, root)) for root in roots])
+                  for checker in checkers]
+    for label, key in [("Average", "average"), ("Lowest", "lowest"), ("Highest", "highest")]:
+        lines.append(format_row(label, [SCORE_CELL_FORMAT.format(aggregate[key])
+                                        if aggregate[key] is not None else "-"
+                                        for aggregate in aggregates]))
+    lines.append(format_row("Scored projects", ["{}/{}".format(aggregate["scored"], len(roots))
+                                                for aggregate in aggregates]))
+
+    return "\n".join(lines)
+
+
+def format_row(label, cells):
+    """
+    Formats a row of the score table
+    """
+
+    return LABEL_FORMAT.format(label) + "".join(CELL_FORMAT.format(cell) for cell in cells)
+
+
+def format_cell(result):
+    """
+    Formats the result of a job as a table cell
+    """
+
+    if result is None:
+        return "-"
+    if result["status"] == "done":
+        return SCORE_CELL_FORMAT.format(max(result["score"], 0)) \
+            if result["score"] is not None else "no score"
+    return result["status"]
+
+
+def shorten(text, width):
+    """
+    Shortens text to the given width by removing characters from its start
+    """
+
+    return text if len(text) <= width else "..." + text[-(width - 3):]
+
+
+def aggregate_scores(results):
+    """
+    Aggregates the (clamped) scores of the finished jobs among results
+    """
+
+    scores = [max(result["score"], 0) for result in results
+              if result is not None and result["status"] == "done"
+              and result["score"] is not None]
+    return {"scored": len(scores),
+            "average": sum(scores) / len(scores) if scores else None,
+            "lowest": min(scores) if scores else None,
+            "highest": max(scores) if scores else None}
+
+
+def get_job_key(job, settings):
+    """
+    Gets the key that identifies a (checker, root) job in the batch state, which includes
+    the options the checker runs with so that changing them runs the job again
+    """
+
+    checker, root = job
+    if checker == "pylint":
+        options = "strict" if settings["strict"] else "default"
+    else:
+        options = run_checkstyle.CHECKSTYLE_VERSION
+    return "{}:{}:{}".format(checker, options, root)
+
+
+def get_cache_entries(cache, root):
+    """
+    Gets the entries of the pylint result cache for the files under root
+    """
+
+    if cache is None:
+        return None
+
+    prefix = os.path.join(root, "")
+    return {filename: entry for filename, entry in cache["files"].items()
+            if filename.startswith(prefix)}
+
+
+def load_pylint_cache():
+    """
+    Loads the pylint result cache shared with run_pylint.py
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import run_pylint
+
+    return run_pylint.load_cache()
+
+
+def save_pylint_cache(cache):
+    """
+    Writes the pylint result cache back once the batch is over
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import run_pylint
+
+    run_pylint.save_cache(cache)
+
+
+def empty_state():
+    """
+    Creates the state of a batch without any finished jobs
+    """
+
+    return {"version": STATE_VERSION, "jobs": {}}
+
+
+def load_state(state_path):
+    """
+    Loads the finished jobs of an interrupted batch, or an empty state if there are none
+    """
+
+    try:
+        with open(state_path, "r") as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return empty_state()
+
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        return empty_state()
+
+    return state
+
+
+def save_state(state, state_path):
+    """
+    Saves the batch state after a job finishes. The file is replaced atomically so that
+    an interruption can't corrupt it
+    """
+
+    temp_path = "{}.{}.tmp".format(state_path, os.getpid())
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, state_path)
+
+
+def remove_state(state_path):
+    """
+    Removes the batch state once every job has run
+    """
+
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(state_path)
+
+
+def bootstrap():
+    """
+    Runs CLI parsing/execution
+    """
+
+    # Argument definitions
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("manifest",
+                        help="a file listing the root of each project to check, one per line")
+    parser.add_argument("--checker", "-c", choices=CHECKERS, action="append",
+                        help="only runs the given checker (can be repeated)")
+    parser.add_argument("--parallel", "-p", "-j", metavar="count", type=int,
+                        help="the number of worker processes (defaults to every core)")
+    parser.add_argument("--timeout", "-t", metavar="seconds", type=float,
+                        default=DEFAULT_TIMEOUT,
+                        help="how long a single checker may run on a project before it is "
+                        "stopped (default: %(default)s)")
+    parser.add_argument("--state", metavar="path",
+                        help="where finished jobs are saved so an interrupted batch can be "
+                        "resumed (defaults to the manifest path followed by {})".format(
+                            STATE_SUFFIX))
+    parser.add_argument("--fresh", action="store_true",
+                        help="runs every job again instead of resuming the previous batch")
+    parser.add_argument("--all", "-a", "--strict", action="store_true",
+                        help="enables all pylint checks (strict mode)")
+    parser.add_argument("--output", "-o", metavar="path",
+                        help="also writes a JSON report of every job to the given file")
+
+    # Parse arguments
+    parsed_args = parser.parse_args()
+    with contextlib.ExitStack() as stack:
+        report_file = None
+        if parsed_args.output is not None:
+            report_file = stack.enter_context(open(parsed_args.output, "w"))
+
+        main(parsed_args.manifest, checkers=parsed_args.checker,
+             process_count=parsed_args.parallel, timeout=parsed_args.timeout,
+             state_path=parsed_args.state, fresh=parsed_args.fresh, strict=parsed_args.all,
+             report_file=report_file)
+
+
+# Run script
+if __name__ == "__main__":
+    bootstrap()
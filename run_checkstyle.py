@@ -7,7 +7,7 @@ the current working directory (using class-specific options)
 __author__ = "CS 2340 TAs"
 __version__ = "1.0"
 
-# pylint: disable=wrong-import-position
+# pylint: disable=wrong-import-position,too-many-lines
 # Python version check
 import sys
 if sys.version_info[0] < 3:
@@ -21,49 +21,423 @@ import os
 import ssl
 import argparse
 import urllib.request
+import urllib.error
 import re
+import json
+import time
+import errno
+import ctypes
+import select
+import socket
+import hashlib
+import cProfile
 import datetime
 import platform
 import warnings
+import pathlib
 import functools
+import contextlib
+import shutil
+import threading
 import traceback
 import subprocess
-from subprocess import PIPE
+import http.client
+import concurrent.futures
+from subprocess import PIPE, STDOUT
 from shutil import which
 
-# Make requests with SSL verification disabled - misconfiguration of Python3 on OSX causes crash
-# https://stackoverflow.com/questions/52805115/certificate-verify-failed-unable-to-get-local-issuer-certificate
-# pylint: disable=protected-access
-ssl._create_default_https_context = ssl._create_unverified_context
-
 DESCRIPTION = "Checkstyle script to run checkstyle on every .java file in the CWD"
 JAVA_EXTENSION = ".java"
+IGNORED_DIRECTORIES = {".git", ".hg", ".svn", ".gradle", ".idea", "node_modules", "build",
+                       "out", "target", "bin"}
 BASE_PROCESS = ["java", "-jar"]
 CHECKSTYLE_XML_NAME = "cs2340_checks.xml"
 CHECKSTYLE_XML_URL = "https://raw.githubusercontent.com/Georgia-Tech-CS2340/cs2340-codestyle/master/cs2340_checks.xml" # pylint: disable=line-too-long
+CHECKSTYLE_VERSION = "8.41"
 CHECKSTYLE_JAR_NAME = "checkstyle-8.41-all.jar"
 CHECKSTYLE_JAR_URL = "https://github.com/checkstyle/checkstyle/releases/download/checkstyle-8.41/checkstyle-8.41-all.jar" # pylint: disable=line-too-long
-CHECKSTYLE_JAR_GITIGNORE = "checkstyle-*.jar"
-CHECKSTYLE_JAR_PATTERN = r"checkstyle-.*\.jar"
 SENTINEL = object()
 
 # Scoring
-MULTILINE_COMMENT_REGEX = r"\/\*([\S\s]+?)\*\/"
-SINGLELINE_COMMENT_REGEX = r"\/{2,}.+"
-STATEMENT_REGEX = r"[^;]+?;"
-AFTER_BRACE_REGEX = r"{\s*;"
-EMPTY_STATEMENT_REGEX = r"^\s*;"
-CHECKSTYLE_OUTPUT_REGEX = r"^\[[A-Z]+\] (.+?):\d+(?::\d+?)?:"
-ERROR_TEXT_REGEX = r"CheckstyleException: Exception was thrown while processing .+\.java"
+# Java tokens relevant to counting statements, each optionally preceded by a run of other
+# code: a bracket/semicolon, a comment, or a literal (text blocks, strings and chars, which
+# may be unterminated in invalid code). The groups are (code, punctuation, literal). Code
+# left at the end of the source matches on its own, instead of failing to match and being
+# scanned again from each of its positions, which took quadratic time
+JAVA_TOKEN_REGEX = (r"\s*([^\s;{}()\"'/][^;{}()\"'/]*)?"
+                    r"(?:([;{}()])|//[^\n]*|/\*[^*]*(?:\*+[^*/][^*]*)*(?:\*+/|\Z)"
+                    r"|(\"\"\"[^\"\\]*(?:(?:\\[\s\S]|\"(?!\"\"))[^\"\\]*)*(?:\"\"\"|\Z)"
+                    r"|\"[^\"\\\n]*(?:\\.[^\"\\\n]*)*\"?|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?|/)|\Z)")
+CHECKSTYLE_LINE_REGEX = r"^\[[A-Z]+\] (.+?):(\d+)(?::(\d+))?:"
+CHECKSTYLE_VIOLATION_REGEX = r"^\[([A-Z]+)\] (.+?):(\d+)(?::(\d+))?: ?(.*?)(?: \[([\w.]+)\])?$"
+ERROR_TEXT_REGEX = r"CheckstyleException: Exception was thrown while processing (.+\.java)"
+AUDIT_STARTED_TEXT = "Starting audit..."
+AUDIT_DONE_TEXT = "Audit done."
+ERROR_COUNT_FORMAT = "Checkstyle ends with {} errors."
+ERROR_COUNT_REGEX = r"^Checkstyle ends with (\d+) errors\.$"
 MAX_SCORE=10
 SCORE_FORMAT = """Your code has been rated at {:.2f}/{} [raw score: {:.2f}/{}]"""
 
+# Structured reports
+REPORT_FORMATS = ["text", "json", "sarif"]
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_VERSION = "2.1.0"
+SARIF_ROOT = "ROOT"
+REPORT_SEVERITIES = {"WARN": "warning"}
+SARIF_LEVELS = {"error": "error", "warning": "warning", "info": "note"}
+
+# Statement counting
+STATEMENT_CACHE_NAME = "checkstyle-statements.json"
+STATEMENT_CACHE_VERSION = 1
+STATEMENT_CACHE_LIMIT = 100000
+FILES_PER_TASK = 16
+# The cached statement counts by content hash, copied into each counting worker process
+CACHED_STATEMENTS = {}
+
+# Parallel runs
+# Characters left for file arguments on Windows, whose command lines are limited to 32767
+WINDOWS_ARGUMENT_LIMIT = 30000
+
+# Watch mode
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1.0
+# inotify events: IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE
+# and IN_DELETE
+INOTIFY_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+WATCHING_TEXT = "Watching {} files for changes (press Ctrl+C to stop)"
+CHANGES_FORMAT = "Changes detected in {} files ({} removed):"
+WATCH_FALLBACK_TEXT = "> Note: file system events could not be watched ({}), polling for " \
+                      "changes instead"
+
+# Instrumentation
+# The total time spent in (and number of calls to) every function wrapped by crash_reporter
+SPANS = {}
+SPANS_LOCK = threading.Lock()
+TIMINGS_HEADER = "Timings (seconds):"
+TIMING_FORMAT = "  {:<28} {:>9.3f}"
+SPAN_FORMAT = "  {:<28} {:>9.3f} ({} calls)"
+PROFILE_TEXT = "> Note: profile written to {0} (view it with: python -m pstats {0})"
+
+# Checkstyle server
+CACHE_DIRECTORY = "cs2340-codestyle"
+SERVER_SOURCE_NAME = "CheckstyleServer.java"
+SERVER_STATE_FORMAT = "checkstyle-server-{}"
+SERVER_TOKEN_VARIABLE = "CHECKSTYLE_SERVER_TOKEN"
+SERVER_IDLE_TIMEOUT = 15 * 60
+SERVER_START_TIMEOUT = 60
+SERVER_POLL_INTERVAL = 0.1
+SERVER_SEVERITIES = {"warning": "WARN"}
+SERVER_FALLBACK_TEXT = "> Note: the Checkstyle server could not be used ({}), running Checkstyle " \
+                       "directly"
+SERVER_STOPPED_TEXT = "> Note: the Checkstyle server stopped after checking {} of {} files, " \
+                      "checking the rest directly"
+
+# Artifact cache
+# Downloaded artifacts are shared between projects in the user's cache directory, keyed by
+# their (versioned) names. Each is stored with a ".sha256" file recording its digest, which is
+# checked against ARTIFACT_CHECKSUMS (or a mirror's own ".sha256" file) when it's fetched and
+# verified on every run before the artifact is used. An artifact with a digest pinned in
+# ARTIFACT_CHECKSUMS is never used (even from next to the script) unless it matches, and is
+# the only kind that may be downloaded without verifying the server's SSL certificate. The
+# digest of CHECKSTYLE_JAR_NAME belongs here, taken from the copy published on its release page
+ARTIFACT_DIRECTORY = "artifacts"
+ARTIFACT_CHECKSUMS = {}
+CHECKSUM_SUFFIX = ".sha256"
+PARTIAL_SUFFIX = ".part"
+LOCK_SUFFIX = ".lock"
+MIRROR_VARIABLE = "CS2340_ARTIFACT_MIRROR"
+DOWNLOAD_CHUNK_SIZE = 65536
+DOWNLOAD_TIMEOUT = 30
+LOCK_STALE_TIMEOUT = 60
+LOCK_POLL_INTERVAL = 0.5
+WAITING_TEXT = "Waiting for another run to fetch {}"
+MACOS_ROOTS_COMMAND = ["security", "find-certificate", "-a", "-p",
+                       "/System/Library/Keychains/SystemRootCertificates.keychain"]
+FALLBACK_SSL_TEXT = "> Note: the download's SSL certificate could not be verified with Python's " \
+                    "certificates, retrying with {}"
+UNVERIFIED_SSL_TEXT = "> Note: the download's SSL certificate could not be verified, retrying " \
+                      "without verification (the download is still checked against its pinned " \
+                      "checksum)"
+DOWNLOAD_FAILED_TEXT = """
+> Note: {} could not be downloaded ({})
+        Check your connection and try again (the download resumes where it stopped),
+        or point --mirror at a directory holding it
+""".lstrip()
+OFFLINE_MISSING_TEXT = "> Note: {} isn't cached yet and couldn't be found in the mirror " \
+                       "directory, so it can't be used offline"
+CHECKSUM_MISMATCH_TEXT = """
+> Note: {} does not match its expected SHA-256 checksum and has been discarded
+        (expected {}, got {})
+""".lstrip()
+LOCAL_MISMATCH_TEXT = """
+> Note: the copy of {} next to the script does not match its expected SHA-256 checksum
+        and is ignored (expected {}, got {})
+""".lstrip()
+
+# Source of the long-lived Checkstyle process used by --server, run with Java 11+'s
+# single-file source launcher so that it doesn't need to be compiled
+CHECKSTYLE_SERVER_SOURCE = r"""
+import com.puppycrawl.tools.checkstyle.Checker;
+import com.puppycrawl.tools.checkstyle.ConfigurationLoader;
+import com.puppycrawl.tools.checkstyle.PropertiesExpander;
+import com.puppycrawl.tools.checkstyle.api.AuditEvent;
+import com.puppycrawl.tools.checkstyle.api.AuditListener;
+import com.puppycrawl.tools.checkstyle.api.CheckstyleException;
+import com.puppycrawl.tools.checkstyle.api.SeverityLevel;
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.PrintWriter;
+import java.net.InetAddress;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.net.SocketTimeoutException;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.StandardCopyOption;
+import java.util.ArrayDeque;
+import java.util.ArrayList;
+import java.util.Deque;
+import java.util.List;
+import java.util.concurrent.atomic.AtomicInteger;
+
+/**
+ * Loads a Checkstyle configuration once and checks batches of files sent over a
+ * loopback socket until it has been idle for the given number of seconds.
+ *
+ * Usage: CheckstyleServer config-file state-file idle-seconds
+ *
+ * Each request is the token from $CHECKSTYLE_SERVER_TOKEN followed by one file path
+ * per line and a blank line. Each response line is tab-separated: "V" violations
+ * (severity, file, line, column, message, check), "E" errors, "P" the number of files
+ * checked so far, then a final "D" line.
+ *
+ * Clients are served concurrently, each on its own thread with a Checker of its own
+ * (Checkers are reused between requests, but never shared). Files are checked in
+ * chunks, and the work for a client that has disconnected stops after the chunk
+ * during which it went away.
+ */
+public final class CheckstyleServer {
+    private static final int CHUNK_SIZE = 16;
+
+    private final File config;
+    private final String token;
+    private final Deque<Session> idle = new ArrayDeque<>();
+    private final AtomicInteger active = new AtomicInteger();
+
+    private CheckstyleServer(File config, String token) {
+        this.config = config;
+        this.token = token;
+    }
+
+    public static void main(String[] args) throws IOException {
+        File config = new File(args[0]);
+        File state = new File(args[1]);
+        int idleSeconds = Integer.parseInt(args[2]);
+        String token = System.getenv("CHECKSTYLE_SERVER_TOKEN");
+        if (token == null || token.isEmpty()) {
+            throw new IllegalStateException("CHECKSTYLE_SERVER_TOKEN must be set");
+        }
+
+        String address;
+        try (ServerSocket socket = new ServerSocket(0, 50, InetAddress.getLoopbackAddress())) {
+            socket.setSoTimeout(idleSeconds * 1000);
+            address = socket.getLocalPort() + "\n" + token + "\n";
+            writeState(state, address);
+            new CheckstyleServer(config, token).serve(socket);
+        }
+
+        // Only remove the state file if another server hasn't replaced it since
+        if (state.exists() && new String(Files.readAllBytes(state.toPath()),
+                StandardCharsets.UTF_8).equals(address)) {
+            state.delete();
+        }
+    }
+
+    private static void writeState(File state, String contents) throws IOException {
+        File temp = new File(state.getPath() + "." + contents.hashCode() + ".tmp");
+        Files.write(temp.toPath(), contents.getBytes(StandardCharsets.UTF_8));
+        temp.setReadable(false, false);
+        temp.setReadable(true, true);
+        Files.move(temp.toPath(), state.toPath(), StandardCopyOption.REPLACE_EXISTING,
+                StandardCopyOption.ATOMIC_MOVE);
+    }
+
+    private void serve(ServerSocket socket) {
+        while (true) {
+            Socket client;
+            try {
+                client = socket.accept();
+            } catch (SocketTimeoutException e) {
+                // Only shut down once no clients are being served either
+                if (active.get() == 0) {
+                    return;
+                }
+                continue;
+            } catch (IOException e) {
+                continue;
+            }
+
+            active.incrementAndGet();
+            Thread thread = new Thread(() -> {
+                try {
+                    handle(client);
+                } finally {
+                    active.decrementAndGet();
+                }
+            });
+            thread.setDaemon(true);
+            thread.start();
+        }
+    }
+
+    private void handle(Socket client) {
+        try (Socket connection = client) {
+            BufferedReader in = new BufferedReader(new InputStreamReader(
+                    connection.getInputStream(), StandardCharsets.UTF_8));
+            PrintWriter out = new PrintWriter(new OutputStreamWriter(
+                    connection.getOutputStream(), StandardCharsets.UTF_8));
+            if (!token.equals(in.readLine())) {
+                return;
+            }
+
+            List<File> files = new ArrayList<>();
+            for (String line = in.readLine(); line != null && !line.isEmpty();
+                    line = in.readLine()) {
+                files.add(new File(line));
+            }
+            check(files, out);
+        } catch (IOException e) {
+            // The client went away, so there's nothing left to do
+        }
+    }
+
+    private void check(List<File> files, PrintWriter out) {
+        try {
+            Session session = acquire();
+            session.out = out;
+            int errors = 0;
+            for (int start = 0; start < files.size(); start += CHUNK_SIZE) {
+                int end = Math.min(files.size(), start + CHUNK_SIZE);
+                errors += session.checker.process(files.subList(start, end));
+                // Writing fails once the client has disconnected, which abandons the rest
+                out.println("P\t" + end);
+                if (out.checkError()) {
+                    release(session);
+                    return;
+                }
+            }
+            out.println("D\t" + errors);
+            release(session);
+        } catch (CheckstyleException | RuntimeException e) {
+            // The session is dropped rather than released, so the next one starts afresh
+            out.println("E\t" + clean(e.toString()));
+            out.println("D\t-1");
+        }
+        out.flush();
+    }
+
+    private Session acquire() throws CheckstyleException {
+        long loaded = config.lastModified();
+        synchronized (idle) {
+            // Sessions for an older version of the configuration are dropped
+            for (Session session = idle.poll(); session != null; session = idle.poll()) {
+                if (session.loaded == loaded) {
+                    return session;
+                }
+            }
+        }
+        return new Session(config, loaded);
+    }
+
+    private void release(Session session) {
+        session.out = null;
+        synchronized (idle) {
+            idle.push(session);
+        }
+    }
+
+    private static String clean(String text) {
+        return text == null ? "" : text.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ');
+    }
+
+    /**
+     * A Checker with the configuration loaded, which writes the violations it finds to
+     * the client it is currently serving.
+     */
+    private static final class Session implements AuditListener {
+        private final Checker checker = new Checker();
+        private final long loaded;
+        private PrintWriter out;
+
+        Session(File config, long loaded) throws CheckstyleException {
+            this.loaded = loaded;
+            checker.setModuleClassLoader(Checker.class.getClassLoader());
+            checker.configure(ConfigurationLoader.loadConfiguration(config.getAbsolutePath(),
+                    new PropertiesExpander(System.getProperties()),
+                    ConfigurationLoader.IgnoredModulesOptions.OMIT));
+            checker.addListener(this);
+        }
+
+        private static String getCheckName(AuditEvent event) {
+            if (event.getModuleId() != null) {
+                return event.getModuleId();
+            }
+
+            String name = event.getSourceName();
+            name = name.substring(name.lastIndexOf('.') + 1);
+            return name.endsWith("Check") ? name.substring(0, name.length() - 5) : name;
+        }
+
+        @Override
+        public void auditStarted(AuditEvent event) {
+        }
+
+        @Override
+        public void auditFinished(AuditEvent event) {
+        }
+
+        @Override
+        public void fileStarted(AuditEvent event) {
+        }
+
+        @Override
+        public void fileFinished(AuditEvent event) {
+        }
+
+        @Override
+        public void addError(AuditEvent event) {
+            SeverityLevel severity = event.getSeverityLevel();
+            if (severity != SeverityLevel.IGNORE) {
+                out.println(String.join("\t", "V", severity.getName(), event.getFileName(),
+                        Integer.toString(event.getLine()), Integer.toString(event.getColumn()),
+                        clean(event.getMessage()), getCheckName(event)));
+            }
+        }
+
+        @Override
+        public void addException(AuditEvent event, Throwable throwable) {
+            out.println("E\tError auditing " + event.getFileName() + ": "
+                    + clean(throwable.toString()));
+        }
+    }
+}
+""".lstrip()
+
 # Gitignore analysis
-GIT_REPO_COMMAND = ["git", "rev-parse", "--show-toplevel"]
-GIT_REPO_FAILED_SUBSTRING = "fatal: not a git repository"
 GITIGNORE = ".gitignore"
-IGNORED_FILE_COMMAND = ["git", "status", "--ignored", "--short"]
-IGNORED_FILE_REGEX = "^!! (.+)$"
+
+# Git diff scoping
+# The prefixes are given explicitly so that diff.noprefix/diff.mnemonicPrefix don't apply
+GIT_DIFF_COMMAND = ["git", "-c", "core.quotepath=off", "diff", "--no-color", "--no-ext-diff",
+                    "--relative", "--unified=0", "--diff-filter=ACMR", "--src-prefix=a/",
+                    "--dst-prefix=b/"]
+GIT_UNTRACKED_COMMAND = ["git", "ls-files", "--others", "--exclude-standard", "-z"]
+GIT_DIFF_FAILED_TEXT = "Could not get the changed files from git:\n{}"
+DIFF_FILE_REGEX = r"^\+\+\+ b/(.+)$"
+DIFF_HUNK_REGEX = r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@"
 
 # Patterns
 NO_JAVA_TEXT = """
@@ -71,14 +445,6 @@ Java is required to run Checkstyle. Make sure it is installed
 and that it exists on your PATH. More instructions are available here:
 
 https://www.java.com/en/download/help/path.xml"""
-ADDED_GITIGNORE_TEXT = """
-> Note: The checkstyle jar has been downloaded and a gitignore has automatically been created
-        for you at the project root. This file should be checked into version control.
-""".lstrip()
-MODIFIED_GITIGNORE_TEXT = """
-> Note: The checkstyle jar has been downloaded and automatically added to your gitignore.
-        This change should be checked into version control.
-""".lstrip()
 
 
 def crash_reporter(func=None, fallback=SENTINEL):
@@ -91,6 +457,7 @@ def crash_reporter(func=None, fallback=SENTINEL):
         # closes over func/fallback
         @functools.wraps(function)
         def crash_handler(*args, **kwargs):
+            start = time.perf_counter()
             try:
                 return function(*args, **kwargs)
             # pylint: disable=broad-except
@@ -129,6 +496,8 @@ def crash_reporter(func=None, fallback=SENTINEL):
                     sys.exit(-1)
 
                 return fallback
+            finally:
+                record_span(function.__name__, time.perf_counter() - start)
         return crash_handler
 
     if func:
@@ -137,12 +506,77 @@ def crash_reporter(func=None, fallback=SENTINEL):
     return _decorate
 
 
+def record_span(name, duration):
+    """
+    Adds a call of the given duration to the span of the function with the given name
+    """
+
+    with SPANS_LOCK:
+        span = SPANS.setdefault(name, {"calls": 0, "seconds": 0.0})
+        span["calls"] += 1
+        span["seconds"] += duration
+
+
+def get_spans():
+    """
+    Gets a copy of the spans recorded so far, by function name
+    """
+
+    with SPANS_LOCK:
+        return {name: dict(span) for name, span in SPANS.items()}
+
+
+def print_timings(timings):
+    """
+    Prints the time taken by each phase of the run, followed by the total time spent in
+    each function wrapped by crash_reporter (including the functions it calls)
+    """
+
+    print(TIMINGS_HEADER)
+    for phase, seconds in timings.items():
+        print(TIMING_FORMAT.format(phase, seconds))
+    for name, span in sorted(get_spans().items(), key=lambda item: -item[1]["seconds"]):
+        print(SPAN_FORMAT.format(name + "()", span["seconds"], span["calls"]))
+    print()
+
+
+@contextlib.contextmanager
+def profile_run(path):
+    """
+    Profiles everything run within the context with cProfile, writing the stats to the
+    given path once it exits (including through sys.exit)
+    """
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(PROFILE_TEXT.format(path))
+
+
 @crash_reporter
-def main(root=None, verbose=False):
+def main(root=None, verbose=False, changed_since=None, staged=False, changed_lines=False, # pylint: disable=too-many-arguments,too-many-locals,too-many-statements
+         includes=None, excludes=None, process_count=1, server=False,
+         idle_timeout=SERVER_IDLE_TIMEOUT, report_format="text", report_file=None,
+         mirror=None, offline=False, watch=False, show_timings=False):
     """
     Runs the main checkstyle script and parses/redirects output
+
+    Named:
+    report_format (string): "json" or "sarif" to also write a structured report
+                            (see build_report) to report_file, or "text" for none
+    mirror (string): a directory of artifacts to use instead of downloading them
+    offline (bool): whether to only use cached or mirrored artifacts
+    watch (bool): whether to keep re-checking files as they change afterwards
+    show_timings (bool): whether to print how long each phase of the run took
     """
 
+    start = time.perf_counter()
+    timings = {}
+
     # Verify java is installed
     if which("java") is None:
         print(NO_JAVA_TEXT)
@@ -150,32 +584,68 @@ def main(root=None, verbose=False):
 
     # Assemble dependencies
     print()
-    xml_path, _ = find_or_download(CHECKSTYLE_XML_NAME, CHECKSTYLE_XML_URL)
-    jar_path, jar_downloaded = find_or_download(CHECKSTYLE_JAR_NAME, CHECKSTYLE_JAR_URL)
-    if jar_downloaded:
-        result, mode = add_to_gitignore(jar_path)
-        if result:
-            print(ADDED_GITIGNORE_TEXT if mode == "add" else MODIFIED_GITIGNORE_TEXT)
+    xml_path, _ = find_or_download(CHECKSTYLE_XML_NAME, CHECKSTYLE_XML_URL, mirror=mirror,
+                                   offline=offline)
+    jar_path, _ = find_or_download(CHECKSTYLE_JAR_NAME, CHECKSTYLE_JAR_URL, mirror=mirror,
+                                   offline=offline)
+    if xml_path is None or jar_path is None:
+        return
+    timings["setup"] = time.perf_counter() - start
 
+    phase_start = time.perf_counter()
     path = os.path.abspath(root) if root is not None else os.getcwd()
-    files = find_files(path, JAVA_EXTENSION)
+    files, changes = select_files(path, (includes, excludes), changed_since=changed_since,
+                                  staged=staged)
+    timings["discovery"] = time.perf_counter() - phase_start
+    if files is None:
+        sys.exit(1)
 
     verbose_tip = " (run with -v to view files)" if not verbose else ""
-    print("Running Checkstyle on {} files{}:".format(len(files), verbose_tip))
+    qualifier = "changed " if changes is not None else ""
+    print("Running Checkstyle on {} {}files{}:".format(len(files), qualifier, verbose_tip))
     # Print each file in verbose mode
     if verbose:
         for file in files:
             print(" - {}".format(file))
 
-    output = run_checkstyle(files, jar_path=jar_path, xml_path=xml_path)
+    # Count statements while Checkstyle runs, and print its output as it arrives
+    counting = start_counting(files)
+    report = empty_report()
+    violations = {} if report_format != "text" or watch else None
+    options = {"jar_path": jar_path, "xml_path": xml_path, "process_count": process_count,
+               "server": server, "idle_timeout": idle_timeout}
     print()
-    print(output)
-    # Print score
-    score = 0 if re.search(ERROR_TEXT_REGEX, output) else assemble_score(files, output)
-    score_output = SCORE_FORMAT.format(max(score, 0), MAX_SCORE, score, MAX_SCORE)
-    print(len(score_output) * "-")
-    print(score_output)
+    phase_start = time.perf_counter()
+    stream_output(iter_checkstyle(files, **options), report,
+                  changes=changes if changed_lines else None, violations=violations)
     print()
+    timings["checkstyle"] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
+    statements = finish_counting(counting)
+    timings["statements"] = time.perf_counter() - phase_start
+
+    if verbose and report["violations"]:
+        severities = ", ".join("{} {}".format(count, severity)
+                               for severity, count in sorted(report["severities"].items()))
+        print("Found {} violations ({})".format(report["violations"], severities))
+
+    # Print score
+    statement_count = sum(statements.get(filename, 0) for filename in files)
+    score = 0 if report["failed"] else calculate_score(report["violations"], statement_count)
+    print_score(score)
+
+    timings["total"] = time.perf_counter() - start
+    if show_timings:
+        print_timings(timings)
+    if report_format != "text":
+        write_report(build_report(files, violations, statements, path, score, timings,
+                                  failed=report["failed"]),
+                     report_format, report_file or sys.stdout)
+
+    if watch:
+        score = watch_files(path, (includes, excludes),
+                            {"violations": violations, "statements": statements,
+                             "errors": set(report["errors"])}, options)
 
     # Exit with a proper exit code (epsilon equality)
     if score >= (MAX_SCORE - 0.0000001):
@@ -184,138 +654,761 @@ def main(root=None, verbose=False):
         sys.exit(1)
 
 
-@crash_reporter(fallback=(False, ""))
-def add_to_gitignore(filename):
+def print_score(score):
+    """
+    Prints the final score
+    """
+
+    score_output = SCORE_FORMAT.format(max(score, 0), MAX_SCORE, score, MAX_SCORE)
+    print(len(score_output) * "-")
+    print(score_output)
+    print()
+
+
+def watch_files(path, patterns, state, options):
+    """
+    Re-checks files as they change until interrupted, printing the violations in the
+    changed files and the project's score. Since the score only depends on the total
+    violation and statement counts, it is recomputed exactly from the latest counts of
+    every file
+
+    Parameters:
+    state (dict): the violations and statements by filepath and the set of files
+                  Checkstyle failed on from the initial run, which are kept up to date
+    options (dict): the keyword arguments to run iter_checkstyle with
+
+    Returns:
+    the latest score
+    """
+
+    print(WATCHING_TEXT.format(len(state["statements"])))
+    print()
+    includes, excludes = patterns
+    score = score_state(state, list(state["statements"]))
+    try:
+        for files, changed, removed in iter_changes(path, JAVA_EXTENSION, includes=includes,
+                                                    excludes=excludes):
+            print(CHANGES_FORMAT.format(len(changed) + len(removed), len(removed)))
+            for filename in changed + removed:
+                print(" - {}".format(os.path.relpath(filename, path)))
+                for key in ("violations", "statements"):
+                    state[key].pop(filename, None)
+                state["errors"].discard(filename)
+
+            print()
+            if changed:
+                counting = start_counting(changed)
+                report = empty_report()
+                stream_output(iter_checkstyle(changed, **options), report,
+                              violations=state["violations"])
+                state["statements"].update(finish_counting(counting))
+                state["errors"].update(report["errors"])
+                print()
+
+            score = score_state(state, files)
+            print_score(score)
+    except KeyboardInterrupt:
+        print()
+
+    return score
+
+
+def score_state(state, files):
+    """
+    Calculates the score of the given files from their latest counts in the state kept
+    by watch_files
     """
-    Adds the given file to the gitignore if applicable/necessary
+
+    if state["errors"]:
+        return 0
+
+    violation_count = sum(len(state["violations"].get(f, [])) for f in files)
+    statement_count = sum(state["statements"].get(f, 0) for f in files)
+    return calculate_score(violation_count, statement_count)
+
+
+def select_files(path, patterns, changed_since=None, staged=False):
+    """
+    Gets the java source files to check: every file in the given path, or only
+    those changed according to git
+
+    Parameters:
+    path (string): the path to check
+    patterns (tuple): lists of globs to include and exclude (either can be None)
+
+    Returns:
+    the filepaths (None if git failed) and their changed line ranges (None if every
+    file is checked)
+    """
+
+    includes, excludes = patterns
+    if changed_since is None and not staged:
+        return find_files(path, JAVA_EXTENSION, includes=includes, excludes=excludes), None
+
+    changes, error = get_changed_files(path, JAVA_EXTENSION, ref=changed_since, staged=staged)
+    if changes is None:
+        print(GIT_DIFF_FAILED_TEXT.format(error))
+        return None, None
+
+    files = [f for f in changes
+             if os.path.isfile(f) and matches_patterns(f, path, includes, excludes)]
+    return files, changes
+
+
+def matches_patterns(filename, path, includes=None, excludes=None):
+    """
+    Determines whether a file passes the include/exclude globs that find_files uses,
+    relative to the given path
+    """
+
+    relative = os.path.relpath(filename, path).replace(os.sep, "/")
+    if any(compile_pattern(glob).match(relative) for glob in excludes or []):
+        return False
+
+    return not includes or any(compile_pattern(glob).match(relative) for glob in includes)
+
+
+@crash_reporter(fallback=(None, ""))
+def get_changed_files(path, extension, ref=None, staged=False):
+    """
+    Gets the files with the given extension under the given path that differ from
+    the given git ref (or that are staged, or both), using a single git diff. Unless
+    only staged changes are wanted, untracked files (that aren't ignored) count as
+    changed in their entirety
+
+    Returns:
+    a dict mapping each changed filepath to a list of (first, last) changed line
+    ranges, or None and git's error output if git failed
     """
 
     if which("git") is None:
-        return False, ""
+        return None, "git is not installed"
+
+    command = GIT_DIFF_COMMAND + (["--cached"] if staged else []) + ([ref] if ref else [])
+    result = subprocess.run(command + ["--"], stdout=PIPE, stderr=PIPE, cwd=path, check=False)
+    if result.returncode != 0:
+        return None, result.stderr.decode(sys.stderr.encoding, "replace").strip()
+
+    changes = {}
+    ranges = None
+    for line in result.stdout.decode("utf-8", "replace").splitlines():
+        file_match = re.match(DIFF_FILE_REGEX, line)
+        if file_match:
+            filename = os.path.normpath(os.path.join(path, file_match.group(1)))
+            ranges = changes.setdefault(filename, []) if filename.endswith(extension) else None
+            continue
+
+        hunk_match = re.match(DIFF_HUNK_REGEX, line)
+        if hunk_match and ranges is not None:
+            start = int(hunk_match.group(1))
+            length = int(hunk_match.group(2) or 1)
+            # Hunks that only remove lines don't have any changed lines left
+            if length:
+                ranges.append((start, start + length - 1))
+
+    if not staged:
+        result = subprocess.run(GIT_UNTRACKED_COMMAND, stdout=PIPE, stderr=PIPE, cwd=path,
+                                check=False)
+        if result.returncode != 0:
+            return None, result.stderr.decode(sys.stderr.encoding, "replace").strip()
+        for name in result.stdout.split(b"\0"):
+            filename = os.path.normpath(os.path.join(path, os.fsdecode(name)))
+            if name and filename.endswith(extension):
+                changes[filename] = [(1, sys.maxsize)]
+
+    return changes, ""
+
+
+def is_changed(filename, line_number, changes):
+    """
+    Determines whether a line of a file is within the file's changed line ranges
+    """
+
+    ranges = changes.get(os.path.normpath(filename), [])
+    return any(first <= line_number <= last for first, last in ranges)
+
+
+def stream_output(lines, report, changes=None, violations=None):
+    """
+    Prints each line of Checkstyle output as it arrives, parsing its violations into the
+    report's running counts
+
+    Named:
+    changes (dict): if specified, violations outside of these changed line ranges
+                    aren't printed
+    violations (dict): if specified, collects the printed violations by filepath
+    """
+
+    for line in lines:
+        violation = parse_violation(line)
+        update_report(report, line, violation)
+        if (changes is not None and violation is not None
+                and not is_changed(violation["file"], violation["line"], changes)):
+            continue
+
+        print(line)
+        if violations is not None and violation is not None:
+            violations.setdefault(os.path.normpath(violation["file"]), []).append(violation)
 
-    repo_relative_folder = os.path.dirname(filename)
-    result = subprocess.run(GIT_REPO_COMMAND, stdout=PIPE, stderr=PIPE,
-                            cwd=repo_relative_folder, check=False)
-    repo_root = result.stdout.decode(sys.stdout.encoding).strip()
-    error = result.stderr.decode(sys.stderr.encoding).strip()
 
-    if GIT_REPO_FAILED_SUBSTRING in repo_root or error:
-        return False, ""
+def build_report(files, violations, statements, root, score, timings, failed=False): # pylint: disable=too-many-arguments
+    """
+    Builds the structured report of a run: every checked file with its statement count
+    and violations, violations in files that weren't checked, the raw and clamped score,
+    the time taken by each phase in seconds and the spans of the functions wrapped by
+    crash_reporter (see get_spans)
 
-    if not os.path.exists(repo_root):
-        return False, ""
+    Parameters:
+    violations (dict): violation records (see parse_violation) by filepath
+    statements (dict): statement counts by filepath
 
-    # Clean path
-    repo_root = os.path.normpath(repo_root)
+    Named:
+    failed (bool): whether Checkstyle crashed, which gives a score of 0
+    """
 
-    # Find .gitignore file if it exists by walking down the tree
-    gitignore_path = find_gitignore(repo_root, repo_relative_folder)
+    entries = []
+    checked = set()
+    for filename in files:
+        checked.add(os.path.normpath(filename))
+        entries.append({"path": get_report_path(filename, root),
+                        "statements": statements.get(filename),
+                        "violations": [get_violation(violation) for violation
+                                       in violations.get(os.path.normpath(filename), [])]})
+
+    unattributed = [dict(get_violation(violation), path=get_report_path(filename, root))
+                    for filename, file_violations in violations.items()
+                    if filename not in checked for violation in file_violations]
+    return {"tool": {"name": "checkstyle", "version": CHECKSTYLE_VERSION},
+            "root": root,
+            "files": entries,
+            "unattributed": unattributed,
+            "violations": sum(len(entry["violations"]) for entry in entries),
+            "failed": failed,
+            "score": {"raw": score, "clamped": max(score, 0), "max": MAX_SCORE},
+            "timings": timings,
+            "spans": get_spans()}
+
+
+def get_violation(violation):
+    """
+    Converts a violation record parsed from Checkstyle's output into a report violation
+    """
 
-    # Do nothing
-    if is_ignored(CHECKSTYLE_JAR_PATTERN, cwd=repo_relative_folder):
-        return False, ""
+    severity = violation["severity"]
+    return {"rule": violation["check"], "severity": REPORT_SEVERITIES.get(severity,
+                                                                          severity.lower()),
+            "line": violation["line"], "column": violation["column"],
+            "message": violation["message"]}
 
-    if gitignore_path is None:
-        # Create gitignore file at project root
-        with open(os.path.join(repo_root, GITIGNORE), "w") as gitignore:
-            gitignore.write(CHECKSTYLE_JAR_GITIGNORE + "\n")
-        return True, "add"
 
-    # Append to existing
-    with open(gitignore_path, "a") as gitignore:
-        gitignore.write("\n" + CHECKSTYLE_JAR_GITIGNORE + "\n")
-    return True, "modify"
+def get_report_path(filename, root):
+    """
+    Gets the path of a file as it appears in reports: relative to the root, using "/"
+    """
+
+    return os.path.relpath(filename, root).replace(os.sep, "/")
 
 
-@crash_reporter(fallback=None)
-def find_gitignore(repo_root, top_folder):
+def to_sarif(report):
     """
-    Finds the first .gitignore file starting at the top_folder and walking up
-    the tree until the repo_root is found, or None if not found
+    Converts a structured report into a SARIF log with a single run
     """
 
-    repo_root = os.path.normpath(repo_root)
-    current_path = os.path.normpath(top_folder)
-    while len(current_path) >= len(repo_root):
-        gitignore_path = os.path.join(current_path, GITIGNORE)
-        if os.path.exists(gitignore_path):
-            return gitignore_path
+    results = []
+    for entry in report["files"] + [{"path": None, "violations": report["unattributed"]}]:
+        for violation in entry["violations"]:
+            region = {}
+            if violation["line"]:
+                region["startLine"] = violation["line"]
+                if violation["column"]:
+                    region["startColumn"] = violation["column"]
+
+            location = {"artifactLocation": {"uri": entry["path"] or violation["path"],
+                                             "uriBaseId": SARIF_ROOT}}
+            if region:
+                location["region"] = region
+            results.append({"ruleId": violation["rule"],
+                            "level": SARIF_LEVELS.get(violation["severity"], "warning"),
+                            "message": {"text": violation["message"]},
+                            "locations": [{"physicalLocation": location}]})
+
+    artifacts = [{"location": {"uri": entry["path"], "uriBaseId": SARIF_ROOT},
+                  "properties": {"statements": entry["statements"]}}
+                 for entry in report["files"]]
+    run = {"tool": {"driver": {"name": report["tool"]["name"],
+                               "version": report["tool"]["version"]}},
+           "originalUriBaseIds": {SARIF_ROOT: {"uri": pathlib.Path(report["root"]).as_uri()
+                                               + "/"}},
+           "artifacts": artifacts,
+           "results": results,
+           "properties": {"score": report["score"], "timings": report["timings"],
+                          "spans": report["spans"]}}
+    return {"$schema": SARIF_SCHEMA, "version": SARIF_VERSION, "runs": [run]}
+
+
+def write_report(report, report_format, report_file):
+    """
+    Writes a structured report to the given file object in the given format
+    ("json" or "sarif"), serializing it as it is written
+    """
 
-        current_path = os.path.dirname(current_path)
+    document = to_sarif(report) if report_format == "sarif" else report
+    json.dump(document, report_file, indent=2)
+    report_file.write("\n")
+    report_file.flush()
 
-    return None
+
+def empty_report():
+    """
+    Creates an empty report of running counts over Checkstyle's output, along with
+    the files Checkstyle failed to process
+    """
+
+    return {"violations": 0, "severities": {}, "failed": False, "errors": []}
 
 
-@crash_reporter(fallback=False)
-def is_ignored(regex, cwd=None):
+def update_report(report, line, violation):
     """
-    Determines whether the given file is ignored in its containing git repository
+    Updates a report's running counts with a line of Checkstyle output and the violation
+    parsed from it (if any)
     """
 
-    result = subprocess.run(IGNORED_FILE_COMMAND, stdout=PIPE, stderr=PIPE, cwd=cwd, check=False)
-    output = result.stdout.decode(sys.stdout.encoding)
-    output += result.stderr.decode(sys.stderr.encoding)
-    for line in output.splitlines():
-        match = re.search(IGNORED_FILE_REGEX, line)
+    if violation is not None:
+        report["violations"] += 1
+        severity = violation["severity"]
+        report["severities"][severity] = report["severities"].get(severity, 0) + 1
+    else:
+        match = re.search(ERROR_TEXT_REGEX, line)
         if match:
-            line_filename = match.group(1)
-            if re.search(regex, line_filename):
-                return True
+            report["failed"] = True
+            report["errors"].append(os.path.normpath(match.group(1)))
 
-    return False
+
+def parse_violation(line):
+    """
+    Parses a line of Checkstyle output into a violation record, a dict with its severity,
+    file, line, column (or None), message and check (or None). Returns None for lines
+    that aren't violations
+    """
+
+    if not line.startswith("["):
+        return None
+
+    match = re.match(CHECKSTYLE_VIOLATION_REGEX, line)
+    if match is None:
+        return None
+
+    severity, filename, line_number, column, message, check = match.groups()
+    return {"severity": severity, "file": filename, "line": int(line_number),
+            "column": int(column) if column else None, "message": message, "check": check}
 
 
 @crash_reporter
-def find_or_download(filename, url):
+def find_or_download(filename, url, mirror=None, offline=False):
     """
     Finds a file with the given filename in the same directory as the current
-    script or downloads it from the given url if it doesn't exist
+    script or in the shared artifact cache, otherwise fetching it into the cache
+    from the mirror directory or by downloading it from the given url
+
+    Named:
+    mirror (string): a directory of artifacts to copy from instead of downloading
+    offline (bool): whether to never download the file
+
+    Returns:
+    the file's path (or None if it couldn't be fetched) and whether it was downloaded
+    """
+
+    local_path = find_local_artifact(filename)
+    if local_path is not None:
+        return local_path, False
+
+    cache_path = os.path.join(get_cache_directory(), ARTIFACT_DIRECTORY, filename)
+    if verify_artifact(cache_path):
+        return cache_path, False
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with artifact_lock(cache_path):
+        # Another run may have fetched the file while this one waited for the lock
+        if verify_artifact(cache_path):
+            return cache_path, False
+
+        mirror_path = os.path.join(mirror, filename) if mirror is not None else None
+        if mirror_path is not None and os.path.isfile(mirror_path):
+            shutil.copyfile(mirror_path, cache_path + PARTIAL_SUFFIX)
+            expected = read_checksum(mirror_path + CHECKSUM_SUFFIX)
+            return (cache_path if install_artifact(cache_path, expected) else None), False
+
+        if offline:
+            print(OFFLINE_MISSING_TEXT.format(filename))
+            return None, False
+
+        downloaded = fetch_download(url, cache_path)
+        return (cache_path if downloaded and install_artifact(cache_path) else None), downloaded
+
+
+def find_local_artifact(filename):
+    """
+    Finds a copy of the artifact with the given filename in the same directory as
+    the current script, ignoring it if it doesn't match its pinned digest
     """
 
     current_dir = os.path.dirname(os.path.realpath(__file__))
     target_path = os.path.join(current_dir, filename)
-    exists = os.path.exists(target_path)
+    if not os.path.exists(target_path):
+        return None
+
+    pinned = ARTIFACT_CHECKSUMS.get(filename)
+    digest = get_content_key(target_path) if pinned is not None else None
+    if digest != pinned:
+        print(LOCAL_MISMATCH_TEXT.format(filename, pinned, digest))
+        return None
+
+    return target_path
+
+
+def verify_artifact(path):
+    """
+    Determines whether the artifact at path exists and matches its recorded digest
+    """
+
+    expected = ARTIFACT_CHECKSUMS.get(os.path.basename(path))
+    if expected is None:
+        expected = read_checksum(path + CHECKSUM_SUFFIX)
+
+    return expected is not None and get_content_key(path) == expected
+
+
+def read_checksum(path):
+    """
+    Reads the SHA-256 digest from a checksum file in the format written by sha256sum,
+    or None if it can't be read
+    """
+
+    try:
+        with open(path, "r") as checksum_file:
+            fields = checksum_file.read().split()
+    except OSError:
+        return None
 
-    if exists:
-        return target_path, False
+    return fields[0].lower() if fields else None
+
+
+def install_artifact(path, expected=None):
+    """
+    Verifies the fetched artifact at path + PARTIAL_SUFFIX against its expected
+    digest (or the pinned one in ARTIFACT_CHECKSUMS), then atomically moves it and
+    its checksum file into place so that concurrent runs never see a partial file
+
+    Returns:
+    whether the artifact was installed
+    """
+
+    partial_path = path + PARTIAL_SUFFIX
+    digest = get_content_key(partial_path)
+    expected = ARTIFACT_CHECKSUMS.get(os.path.basename(path), expected)
+    if expected is not None and digest != expected:
+        os.remove(partial_path)
+        print(CHECKSUM_MISMATCH_TEXT.format(os.path.basename(path), expected, digest))
+        return False
+
+    checksum_path = path + CHECKSUM_SUFFIX
+    temp_path = "{}.{}.tmp".format(checksum_path, os.getpid())
+    with open(temp_path, "w") as checksum_file:
+        checksum_file.write("{}  {}\n".format(digest, os.path.basename(path)))
+    os.replace(temp_path, checksum_path)
+    os.replace(partial_path, path)
+    return True
+
+
+def fetch_download(url, path):
+    """
+    Downloads the file at the given url to path + PARTIAL_SUFFIX (see download_artifact),
+    printing why if it fails. The partial file is kept so the next run resumes it, and is
+    only discarded if it can't be resumed or doesn't match its checksum once complete
+
+    Returns:
+    whether the file was downloaded
+    """
+
+    filename = os.path.basename(path)
+    resuming = os.path.exists(path + PARTIAL_SUFFIX)
+    print("{} {}".format("Resuming download of" if resuming else "Downloading", filename))
+    try:
+        download_artifact(url, path)
+    except (OSError, http.client.HTTPException) as error:
+        print()
+        print(DOWNLOAD_FAILED_TEXT.format(filename, error))
+        return False
 
-    # Download file
-    print("Downloading {}".format(filename))
-    urllib.request.urlretrieve(url, target_path, report_hook)
     print()
-    return target_path, True
+    return True
 
 
-@crash_reporter(fallback=10.0)
-def assemble_score(files, checkstyle_output):
+def download_artifact(url, path):
     """
-    Calculates code "score" using class-specific formula
+    Downloads the file at the given url to path + PARTIAL_SUFFIX, resuming the
+    partial file left behind by a run that was stopped mid-download if the server
+    supports range requests
     """
 
-    errors = count_errors(checkstyle_output)
-    statements = 0
-    for filename in files:
-        statements += count_statements(filename)
+    partial_path = path + PARTIAL_SUFFIX
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", "bytes={}-".format(offset))
+
+    try:
+        response = open_url(request,
+                            allow_unverified=os.path.basename(path) in ARTIFACT_CHECKSUMS)
+    except urllib.error.HTTPError as error:
+        if error.code != 416 or not offset:
+            raise
+        # The partial file can't be resumed, so start over
+        os.remove(partial_path)
+        return download_artifact(url, path)
+
+    with response:
+        content_range = response.headers.get("Content-Range", "")
+        if response.getcode() != 206 or not content_range.startswith("bytes {}-".format(offset)):
+            offset = 0
+        length = int(response.headers.get("Content-Length") or -1)
+        total_size = offset + length if length >= 0 else -1
+
+        with open(partial_path, "ab" if offset else "wb") as partial_file:
+            read_size = offset
+            for block in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b""):
+                partial_file.write(block)
+                read_size += len(block)
+                report_hook(1, read_size, total_size)
+
+    if 0 <= read_size < total_size:
+        raise OSError("The download of {} was interrupted at {} of {}".format(
+            url, format_size(read_size), format_size(total_size)))
+    return None
+
+
+def open_url(request, allow_unverified=False):
+    """
+    Opens the given url request. If the server's certificate can't be verified (a
+    misconfiguration of Python 3 on OSX causes this:
+    https://stackoverflow.com/questions/52805115/certificate-verify-failed-unable-to-get-local-issuer-certificate)
+    it is retried with the certificates of certifi or the system (see get_fallback_context),
+    and then without SSL verification if allow_unverified is set, for downloads whose
+    content is checked against a pinned checksum anyway
+    """
+
+    try:
+        return urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT)
+    except urllib.error.URLError as error:
+        if not isinstance(error.reason, ssl.SSLError):
+            raise
+        failure = error
+
+    context, source = get_fallback_context()
+    if context is not None:
+        print(FALLBACK_SSL_TEXT.format(source))
+        try:
+            return urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT, context=context)
+        except urllib.error.URLError as error:
+            if not isinstance(error.reason, ssl.SSLError):
+                raise
+            failure = error
+
+    if not allow_unverified:
+        raise failure
+
+    print(UNVERIFIED_SSL_TEXT)
+    # pylint: disable=protected-access
+    return urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT,
+                                  context=ssl._create_unverified_context())
+
+
+def get_fallback_context():
+    """
+    Creates an SSL context that trusts the certificates of certifi (if it's installed) or
+    of the OSX system keychain, for Python installs that don't have any of their own
+
+    Returns:
+    the context and a description of where its certificates came from, or None and
+    an empty string if neither is available
+    """
 
-    if statements == 0:
+    try:
+        import certifi # pylint: disable=import-outside-toplevel
+        return ssl.create_default_context(cafile=certifi.where()), "certifi's certificates"
+    except (ImportError, OSError, ssl.SSLError):
+        pass
+
+    if platform.system() != "Darwin" or which("security") is None:
+        return None, ""
+
+    result = subprocess.run(MACOS_ROOTS_COMMAND, stdout=PIPE, stderr=PIPE, check=False)
+    if result.returncode != 0 or not result.stdout.strip():
+        return None, ""
+
+    try:
+        context = ssl.create_default_context(cadata=result.stdout.decode("ascii", "replace"))
+    except (ssl.SSLError, ValueError):
+        return None, ""
+    return context, "the system's certificates"
+
+
+@contextlib.contextmanager
+def artifact_lock(path):
+    """
+    Holds a lock file next to the artifact at path while it's fetched, waiting for
+    other runs fetching the same artifact and taking over locks left by crashed ones
+    """
+
+    lock_path = path + LOCK_SUFFIX
+    waiting = False
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if is_stale_lock(lock_path, path + PARTIAL_SUFFIX):
+                with contextlib.suppress(OSError):
+                    os.remove(lock_path)
+                continue
+
+            if not waiting:
+                print(WAITING_TEXT.format(os.path.basename(path)))
+                waiting = True
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    try:
+        yield
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(lock_path)
+
+
+def is_stale_lock(lock_path, partial_path):
+    """
+    Determines whether neither the lock file nor the partial download it guards
+    have been touched recently, meaning that the run holding the lock has died
+    """
+
+    modified = 0
+    for filename in (lock_path, partial_path):
+        with contextlib.suppress(OSError):
+            modified = max(modified, os.path.getmtime(filename))
+
+    return time.time() - modified > LOCK_STALE_TIMEOUT
+
+
+def calculate_score(errors, statement_count):
+    """
+    Calculates code "score" from the number of violations and statements
+    """
+
+    if statement_count == 0:
         return 10.0
 
-    return 10.0 - ((float(5 * errors) / statements) * 10)
+    return 10.0 - ((float(5 * errors) / statement_count) * 10)
 
 
-@crash_reporter(fallback=0)
-def count_errors(checkstyle_output):
+def start_counting(files):
     """
-    Counts total checkstyle errors given the checkstyle stdout
+    Starts counting the statements in every file using a pool of worker processes, so
+    that counting overlaps with Checkstyle running. The workers hash each file and only
+    count the statements of contents that aren't in the statement cache
+
+    Returns:
+    the counting state to pass to finish_counting
     """
 
-    count = 0
-    for line in checkstyle_output.splitlines():
-        if line.startswith("["):
-            if re.match(CHECKSTYLE_OUTPUT_REGEX, line):
-                count += 1
+    cache = load_statement_cache()
+    batches = [files[index:index + FILES_PER_TASK]
+               for index in range(0, len(files), FILES_PER_TASK)]
+    state = {"cache": cache, "pool": None, "batches": [(batch, None) for batch in batches]}
 
-    return count
+    # Small batches of work aren't worth starting worker processes for
+    if len(batches) > 1:
+        try:
+            # pylint: disable=consider-using-with
+            state["pool"] = concurrent.futures.ProcessPoolExecutor(
+                initializer=set_cached_statements, initargs=(cache["statements"],))
+            state["batches"] = [(batch, state["pool"].submit(count_cached_statements, batch))
+                                for batch in batches]
+        except (OSError, ImportError, NotImplementedError):
+            # Process pools aren't available everywhere (such as in some sandboxes)
+            pass
+
+    return state
+
+
+def finish_counting(state):
+    """
+    Waits for the statement counts started by start_counting (counting any batches the
+    worker processes couldn't) and stores them in the statement cache
+
+    Returns:
+    a dict of statement counts by filepath
+    """
+
+    cache = state["cache"]
+    counts = {}
+    for batch, future in state["batches"]:
+        try:
+            batch_counts = future.result() if future is not None else None
+        except (OSError, RuntimeError):
+            batch_counts = None
+        if batch_counts is None:
+            batch_counts = count_cached_statements(batch, cache["statements"])
+
+        for filename, (key, count) in zip(batch, batch_counts):
+            counts[filename] = count
+            # Re-inserting the key keeps the most recently used counts last (see
+            # save_statement_cache)
+            if key is not None:
+                cache["statements"].pop(key, None)
+                cache["statements"][key] = count
+
+    if state["pool"] is not None:
+        state["pool"].shutdown()
+
+    save_statement_cache(cache)
+    return counts
+
+
+def set_cached_statements(statements):
+    """
+    Copies the cached statement counts into a counting worker process
+    """
+
+    CACHED_STATEMENTS.update(statements)
+
+
+def count_cached_statements(files, statements=None):
+    """
+    Counts the statements in each of the files, reusing the cached count of any file
+    whose contents haven't changed
+
+    Named:
+    statements (dict): the cached statement counts by content hash (defaults to those
+                       copied into this worker process by set_cached_statements)
+
+    Returns:
+    a list of (content hash, statement count) pairs
+    """
+
+    statements = CACHED_STATEMENTS if statements is None else statements
+    counts = []
+    for filename in files:
+        key = get_content_key(filename)
+        count = statements.get(key) if key is not None else None
+        counts.append((key, count if count is not None else count_statements(filename)))
+    return counts
+
+
+def count_batch_statements(files):
+    """
+    Counts the statements in each of the files, returning a list of counts
+    """
+
+    return [count_statements(filename) for filename in files]
 
 
 @crash_reporter(fallback=0)
@@ -329,35 +1422,44 @@ def count_statements(filename):
     if not os.path.exists(filename):
         return 0
 
-    count = 0
-    with open(filename, "r+") as java_file:
-        contents = remove_comments(java_file.read())
-        for match in re.finditer(STATEMENT_REGEX, contents):
-            statement_candidate = match.group()
-            if not is_invalid_statement(statement_candidate):
-                count += 1
-
-    return count
+    with open(filename, "r", encoding="utf-8", errors="replace") as java_file:
+        return count_source_statements(java_file.read())
 
 
-def remove_comments(java_source):
+def count_source_statements(java_source):
     """
-    First removes multiline comments using regex before removing single line
-    comments. Might not catch all due to regex-based parsing
+    Counts the statements in Java source code in a single scan over its tokens.
+    A semicolon ends a statement unless nothing but whitespace/comments precedes it
+    since the previous statement or opening brace, or it is inside parentheses (such
+    as the header of a for loop). Semicolons in comments and literals are ignored
     """
 
-    without_multiline = re.sub(MULTILINE_COMMENT_REGEX, "", java_source)
-    return re.sub(SINGLELINE_COMMENT_REGEX, "", without_multiline)
-
+    count = 0
+    pending = False
+    brackets = []
+    for match in re.finditer(JAVA_TOKEN_REGEX, java_source):
+        # Only the groups' positions are read, so no token's text is copied out
+        if match.start(1) >= 0 or match.start(3) >= 0:
+            pending = True
+
+        punctuation = java_source[match.start(2)] if match.start(2) >= 0 else None
+        if punctuation == ";":
+            if pending and (not brackets or brackets[-1] == "{"):
+                count += 1
+                pending = False
+        elif punctuation == "{":
+            brackets.append(punctuation)
+            pending = False
+        elif punctuation == "(":
+            brackets.append(punctuation)
+            pending = True
+        elif punctuation:
+            if brackets:
+                brackets.pop()
+            pending = True
 
-def is_invalid_statement(statement):
-    """
-    Filters out whether the statement candidate is valid or not. Rejects "statements"
-    such as: "{ ;" and " ;"
-    """
+    return count
 
-    return (re.search(AFTER_BRACE_REGEX, statement)
-            or re.search(EMPTY_STATEMENT_REGEX, statement))
 
 def format_size(size):
     """
@@ -370,7 +1472,7 @@ def format_size(size):
 
 def report_hook(block_num, block_size, total_size):
     """
-    Report hook callback for urllib.request.urlretrieve
+    Report hook callback for download progress (in the format of urllib.request.urlretrieve)
     Sourced from:
     https://stackoverflow.com/questions/13881092/download-progressbar-for-python-3
     """
@@ -388,11 +1490,13 @@ def report_hook(block_num, block_size, total_size):
         sys.stdout.write("read {:d}\n".format(read_progress))
 
 
-@crash_reporter
-def run_checkstyle(files, jar_path=None, xml_path=None):
+def iter_checkstyle(files, jar_path=None, xml_path=None, process_count=1, server=False, # pylint: disable=too-many-arguments
+                    idle_timeout=SERVER_IDLE_TIMEOUT):
     """
-    Runs checkstyle on every file specified using the class-specific
-    arguments as well as any additional ones specified
+    Runs checkstyle on every file specified using the class-specific arguments,
+    yielding each line of its output as soon as it is available instead of buffering
+    all of it. Output from several processes (see process_count) is only available
+    once all of them finish, so it can be merged
 
     Parameters:
     files (array(string)): filepaths to java source files
@@ -400,32 +1504,686 @@ def run_checkstyle(files, jar_path=None, xml_path=None):
     Named:
     jar_path (string): The filepath to the checkstyle jar
     xml_path (string): The filepath to the checkstyle config XML file
-
-    Returns:
-    the stdout output from checkstyle
+    process_count (int): The number of Checkstyle processes to split the files between
+                         (0 to use every core)
+    server (bool): Whether to use (and spawn if needed) the persistent Checkstyle server,
+                   falling back to a one-shot Checkstyle process if it can't be used
+    idle_timeout (int): The number of idle seconds before a spawned server shuts down
     """
 
     if not files or jar_path is None or xml_path is None:
-        return ""
+        return
+
+    started = False
+    if server:
+        try:
+            connection, token = connect_server(jar_path, xml_path, idle_timeout)
+        except (OSError, ValueError) as error:
+            print(SERVER_FALLBACK_TEXT.format(error or type(error).__name__))
+        else:
+            checked = yield from iter_server_output(connection, token, files)
+            if checked is None:
+                return
+            # The server went away, so only the files it didn't finish are left
+            print(SERVER_STOPPED_TEXT.format(checked, len(files)))
+            started = checked > 0
+            files = files[checked:]
+            if not files:
+                yield AUDIT_DONE_TEXT
+                return
+
+    for line in iter_processes(files, jar_path, xml_path, process_count):
+        if not started or line != AUDIT_STARTED_TEXT:
+            yield line
+
+
+def iter_processes(files, jar_path, xml_path, process_count):
+    """
+    Runs one-shot Checkstyle processes over the files (see iter_checkstyle), yielding
+    the lines of their output
+    """
+
+    process_count = process_count or os.cpu_count() or 1
+    base_args = BASE_PROCESS + [jar_path, "-c", xml_path]
+    limit = get_argument_limit() - sum(len(arg) + 1 for arg in base_args)
+    commands = [base_args + chunk for shard in shard_files(files, process_count)
+                for chunk in split_arguments(shard, limit)]
+    if len(commands) == 1:
+        yield from iter_command(commands[0])
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=process_count) as executor:
+        outputs = list(executor.map(run_command, commands))
+    yield from merge_outputs(outputs, files).splitlines()
+
+
+def iter_command(args):
+    """
+    Runs a single Checkstyle process, yielding each line of its combined stdout and
+    stderr output as it is written
+    """
+
+    with subprocess.Popen(args, stdout=PIPE, stderr=STDOUT) as process:
+        for line in process.stdout:
+            yield line.decode(sys.stdout.encoding, errors="replace").rstrip("\r\n")
+
+
+def run_command(args):
+    """
+    Runs a single Checkstyle process, returning its combined stdout and stderr output
+    """
 
-    args = BASE_PROCESS + [jar_path, "-c", xml_path] + files
     result = subprocess.run(args, stdout=PIPE, stderr=PIPE, check=False)
     return result.stdout.decode(sys.stdout.encoding) + result.stderr.decode(sys.stderr.encoding)
 
 
+def shard_files(files, shard_count):
+    """
+    Partitions the files into at most shard_count shards of similar total size by adding
+    each file (from largest to smallest) to the currently smallest shard. Each shard keeps
+    the original order of its files
+    """
+
+    shards = [(0, index, []) for index in range(min(shard_count, len(files)))]
+    for filename in sorted(files, key=get_size, reverse=True):
+        size, index, shard = min(shards)
+        shard.append(filename)
+        shards[index] = (size + get_size(filename), index, shard)
+
+    order = {filename: index for index, filename in enumerate(files)}
+    return [sorted(shard, key=order.get) for _, _, shard in shards if shard]
+
+
+def get_size(filename):
+    """
+    Gets the size of a file in bytes, or 0 if it can't be read
+    """
+
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def split_arguments(files, limit):
+    """
+    Splits the files into chunks whose combined length as command line arguments stays
+    under limit characters, so that huge file lists don't exceed the OS's limits
+    """
+
+    chunks = []
+    chunk = []
+    length = 0
+    for filename in files:
+        # Leave room for a separating space and quotes on Windows
+        argument_length = len(filename) + 3
+        if chunk and length + argument_length > limit:
+            chunks.append(chunk)
+            chunk = []
+            length = 0
+        chunk.append(filename)
+        length += argument_length
+
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def get_argument_limit():
+    """
+    Gets the number of characters that can safely be passed as command line arguments
+    """
+
+    if sys.platform == "win32":
+        return WINDOWS_ARGUMENT_LIMIT
+
+    try:
+        # Leave half of the space for the environment, which shares the same limit
+        return os.sysconf("SC_ARG_MAX") // 2
+    except (AttributeError, ValueError, OSError):
+        return WINDOWS_ARGUMENT_LIMIT
+
+
+def merge_outputs(outputs, files):
+    """
+    Merges the output of several Checkstyle processes into the output of a single run,
+    ordering violations by the position of their file in files and then by line/column
+    (other output, such as exceptions, is kept in process order)
+    """
+
+    order = {os.path.abspath(filename): index for index, filename in enumerate(files)}
+    violations = []
+    other = []
+    error_count = 0
+    for output in outputs:
+        for line in output.splitlines():
+            match = re.match(CHECKSTYLE_LINE_REGEX, line)
+            error_match = re.match(ERROR_COUNT_REGEX, line)
+            if match:
+                filename, line_number, column = match.groups()
+                key = (order.get(os.path.abspath(filename), len(order)), filename,
+                       int(line_number), int(column or 0))
+                violations.append((key, line))
+            elif error_match:
+                error_count += int(error_match.group(1))
+            elif line not in (AUDIT_STARTED_TEXT, AUDIT_DONE_TEXT):
+                other.append(line)
+
+    # Sorting is stable, so violations at the same position keep Checkstyle's order
+    violations.sort(key=lambda violation: violation[0])
+    merged = [AUDIT_STARTED_TEXT] + [line for _, line in violations] + [AUDIT_DONE_TEXT] + other
+    if error_count:
+        merged.append(ERROR_COUNT_FORMAT.format(error_count))
+    return "\n".join(merged) + "\n"
+
+
+def iter_server_output(connection, token, files):
+    """
+    Checks the files using a connection to the persistent Checkstyle server, which keeps
+    a JVM with the configuration loaded between runs, yielding its violations formatted
+    the same way Checkstyle's own command line does. The server checks files in chunks,
+    and each chunk's violations are yielded once it reports the chunk done, so that if
+    the server goes away mid-run none of the files it didn't finish have been reported
+
+    Returns:
+    None, or the number of files checked if the server went away before it was done
+    """
+
+    error_count = 0
+    failed = False
+    checked = 0
+    pending = []
+    with connection, connection.makefile("rb") as response:
+        request = [token] + [os.path.abspath(file) for file in files] + ["", ""]
+        try:
+            connection.sendall("\n".join(request).encode("utf-8"))
+            for line in response:
+                kind, _, rest = line.decode("utf-8").rstrip("\n").partition("\t")
+                if kind == "V":
+                    pending.append(("V", format_violation(rest.split("\t")),
+                                    rest.startswith("error\t")))
+                elif kind == "E":
+                    pending.append(("E", rest, False))
+                elif kind in ("P", "D"):
+                    if not checked:
+                        yield AUDIT_STARTED_TEXT
+                    for pending_kind, output, is_error in pending:
+                        failed = failed or pending_kind == "E"
+                        error_count += is_error
+                        yield output
+                    pending = []
+                    if kind == "D":
+                        break
+                    checked = int(rest)
+            else:
+                return checked
+        except (OSError, ValueError):
+            return checked
+
+    if not failed:
+        yield AUDIT_DONE_TEXT
+        if error_count:
+            yield ERROR_COUNT_FORMAT.format(error_count)
+    return None
+
+
+def format_violation(violation):
+    """
+    Formats a violation reported by the Checkstyle server as a (severity, file, line,
+    column, message, check) list like Checkstyle's default logger
+    """
+
+    severity, filename, line, column, message, check = violation
+    location = "{}:{}".format(filename, line) if column == "0" else \
+        "{}:{}:{}".format(filename, line, column)
+    level = SERVER_SEVERITIES.get(severity, severity.upper())
+    return "[{}] {}: {} [{}]".format(level, location, message, check)
+
+
+def connect_server(jar_path, xml_path, idle_timeout=SERVER_IDLE_TIMEOUT):
+    """
+    Connects to the Checkstyle server for the given jar and configuration, spawning it
+    in the background if it isn't running yet
+
+    Returns:
+    a tuple of the connected socket and the server's access token
+    """
+
+    state_path = get_server_state_path(jar_path, xml_path)
+    try:
+        return open_server_connection(state_path)
+    except (OSError, ValueError):
+        pass
+
+    # Start a new server, clearing any state left behind by one that crashed
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    process = spawn_server(jar_path, xml_path, state_path, idle_timeout)
+
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            return open_server_connection(state_path)
+        except (OSError, ValueError) as error:
+            if process.poll() is not None:
+                raise OSError("the server exited with code {}; Java 11 or newer is "
+                              "required".format(process.returncode)) from error
+            if time.time() > deadline:
+                raise
+            time.sleep(SERVER_POLL_INTERVAL)
+
+
+def open_server_connection(state_path):
+    """
+    Opens a connection to the server described by the given state file, which holds
+    the server's port and access token on separate lines
+    """
+
+    with open(state_path, "r") as state_file:
+        port, token = state_file.read().split()
+
+    connection = socket.create_connection(("127.0.0.1", int(port)))
+    return connection, token
+
+
+def spawn_server(jar_path, xml_path, state_path, idle_timeout):
+    """
+    Starts a detached Checkstyle server that publishes its address to state_path,
+    using Java's single-file source launcher to run the bundled server source
+    """
+
+    source_path = os.path.join(get_cache_directory(), SERVER_SOURCE_NAME)
+    temporary_path = "{}.{}".format(source_path, os.getpid())
+    with open(temporary_path, "w") as source_file:
+        source_file.write(CHECKSTYLE_SERVER_SOURCE)
+    os.replace(temporary_path, source_path)
+
+    args = ["java", "-cp", jar_path, source_path, os.path.abspath(xml_path), state_path,
+            str(int(idle_timeout))]
+    environment = dict(os.environ)
+    environment[SERVER_TOKEN_VARIABLE] = os.urandom(16).hex()
+    if sys.platform == "win32":
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP |
+                                   subprocess.DETACHED_PROCESS}
+    else:
+        detach = {"start_new_session": True}
+
+    # pylint: disable=consider-using-with
+    return subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, env=environment, **detach)
+
+
+def get_server_state_path(jar_path, xml_path):
+    """
+    Gets the path of the state file for the server running the given jar and configuration
+    """
+
+    key = "\n".join(os.path.abspath(path) for path in (jar_path, xml_path))
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_cache_directory(), SERVER_STATE_FORMAT.format(digest))
+
+
+def get_cache_directory():
+    """
+    Gets (and creates) the directory in the user's cache directory shared between runs
+    """
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    directory = os.path.join(base, CACHE_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def load_statement_cache():
+    """
+    Loads the persistent cache of statement counts by file content hash, starting over
+    if it is missing, unreadable, or was written by a different version of this script
+    """
+
+    try:
+        with open(os.path.join(get_cache_directory(), STATEMENT_CACHE_NAME), "r") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {"version": STATEMENT_CACHE_VERSION, "statements": {}}
+
+    if not isinstance(cache, dict) or cache.get("version") != STATEMENT_CACHE_VERSION:
+        return {"version": STATEMENT_CACHE_VERSION, "statements": {}}
+
+    return cache
+
+
+def save_statement_cache(cache):
+    """
+    Writes the statement cache back to disk, keeping only the most recently used
+    STATEMENT_CACHE_LIMIT entries. The file is replaced atomically so concurrent runs
+    can't corrupt it
+    """
+
+    statements = cache["statements"]
+    if len(statements) > STATEMENT_CACHE_LIMIT:
+        # Entries are ordered from least to most recently used
+        cache["statements"] = dict(list(statements.items())[-STATEMENT_CACHE_LIMIT:])
+
+    try:
+        cache_path = os.path.join(get_cache_directory(), STATEMENT_CACHE_NAME)
+        temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(temp_path, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # The cache is only an optimization
+        pass
+
+
+def get_content_key(filename):
+    """
+    Gets the hash of a file's contents, or None if it can't be read
+    """
+
+    digest = hashlib.sha256()
+    try:
+        with open(filename, "rb") as source_file:
+            for block in iter(lambda: source_file.read(65536), b""):
+                digest.update(block)
+    except OSError:
+        return None
+
+    return digest.hexdigest()
+
+
 @crash_reporter
-def find_files(path, extension):
+def find_files(path, extension, includes=None, excludes=None):
     """
     Gets a list of every file in the given path that has the given file extension
     """
 
-    file_list = []
-    for root, _, files in os.walk(path):
-        for file in files:
-            if file.endswith(extension):
-                file_list.append(os.path.join(root, file))
+    return list(iter_files(path, extension, includes=includes, excludes=excludes))
+
+
+def iter_files(path, extension, includes=None, excludes=None, directories=None):
+    """
+    Yields every file in the given path that has the given file extension as it is found,
+    without descending into ignored directories (see IGNORED_DIRECTORIES) or into
+    anything excluded by a .gitignore file along the way
+
+    Named:
+    includes (list): if specified, only files matching one of these globs are yielded
+    excludes (list): files and directories matching any of these globs are skipped
+    directories (list): if specified, every directory that is visited is appended to it
+    """
+
+    includes = [compile_pattern(glob) for glob in includes or []]
+    excludes = [compile_pattern(glob) for glob in excludes or []]
+
+    # Directories to visit, paired with their path relative to the root (using "/")
+    # and the gitignore rules that apply within them
+    pending = [(os.path.abspath(path), "", [])]
+    while pending:
+        directory, relative_directory, rules = pending.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        if directories is not None:
+            directories.append(directory)
+        if any(entry.name == GITIGNORE for entry in entries):
+            rules = rules + read_gitignore(os.path.join(directory, GITIGNORE),
+                                           relative_directory)
+
+        subdirectories = []
+        for entry in entries:
+            relative = relative_directory + "/" + entry.name if relative_directory else entry.name
+            is_directory = entry.is_dir(follow_symlinks=False)
+            if is_directory and entry.name in IGNORED_DIRECTORIES:
+                continue
+            if any(regex.match(relative) for regex in excludes):
+                continue
+            if is_ignored_path(relative, is_directory, rules):
+                continue
+
+            if is_directory:
+                subdirectories.append((entry.path, relative, rules))
+            elif entry.name.endswith(extension) and entry.is_file():
+                if not includes or any(regex.match(relative) for regex in includes):
+                    yield entry.path
+
+        # Visit subdirectories in order after the files in the current directory
+        pending.extend(reversed(subdirectories))
+
+
+def read_gitignore(gitignore_path, base):
+    """
+    Reads the rules from a .gitignore file as (regex, negated, directory only, base)
+    tuples, where base is the relative path of the directory containing the file
+    """
+
+    rules = []
+    try:
+        with open(gitignore_path, "r", encoding="utf-8", errors="replace") as gitignore:
+            lines = gitignore.read().splitlines()
+    except OSError:
+        return rules
+
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+
+        negated = line.startswith("!")
+        if negated or line.startswith("\\"):
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if line:
+            rules.append((compile_pattern(line), negated, directory_only, base))
+
+    return rules
+
+
+def is_ignored_path(relative, is_directory, rules):
+    """
+    Determines whether a relative path is excluded by the given gitignore rules,
+    where later (deeper) rules take precedence over earlier ones
+    """
+
+    ignored = False
+    for regex, negated, directory_only, base in rules:
+        if directory_only and not is_directory:
+            continue
+        if regex.match(relative[len(base) + 1:] if base else relative):
+            ignored = not negated
+
+    return ignored
+
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(glob):
+    """
+    Compiles a gitignore-style glob into a regex matched against "/"-separated relative
+    paths. Globs without a slash match at any depth, "*" doesn't match "/" but "**" does,
+    and matching a directory also matches everything within it
+    """
+
+    if "/" not in glob:
+        glob = "**/" + glob
+
+    parts = []
+    index = 0
+    glob = glob.lstrip("/")
+    while index < len(glob):
+        if glob.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif glob.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif glob[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif glob[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        elif glob[index] == "[" and "]" in glob[index + 2:]:
+            end = glob.index("]", index + 2)
+            characters = glob[index + 1:end]
+            if characters.startswith("!"):
+                characters = "^" + characters[1:]
+            parts.append("[" + characters.replace("\\", "\\\\") + "]")
+            index = end + 1
+        else:
+            parts.append(re.escape(glob[index]))
+            index += 1
+
+    return re.compile("".join(parts) + "(?:/.*)?$")
+
+
+def iter_changes(path, extension, includes=None, excludes=None):
+    """
+    Watches the files that find_files discovers in the given path, yielding after each
+    burst of changes once no more changes arrive for WATCH_DEBOUNCE seconds. Changes
+    wake this up through inotify on Linux, falling back to polling the files every
+    WATCH_POLL_INTERVAL seconds
+
+    Yields:
+    every file that is currently found, the files that were added or modified, and
+    the files that were removed
+    """
+
+    directories = []
+    files = list(iter_files(path, extension, includes=includes, excludes=excludes,
+                            directories=directories))
+    snapshot = take_snapshot(files)
+    watcher = open_watcher()
+    try:
+        while True:
+            try:
+                if watcher is not None:
+                    update_watches(watcher, directories)
+            except OSError as error:
+                # Such as when running out of inotify watches on large trees
+                print(WATCH_FALLBACK_TEXT.format(error))
+                close_watcher(watcher)
+                watcher = None
+
+            wait_for_changes(watcher)
+            directories = []
+            files = list(iter_files(path, extension, includes=includes, excludes=excludes,
+                                    directories=directories))
+            current = take_snapshot(files)
+            # Polling can catch a burst of saves midway, so wait for it to settle
+            while watcher is None and current != snapshot:
+                time.sleep(WATCH_DEBOUNCE)
+                settled = take_snapshot(files)
+                if settled == current:
+                    break
+                current = settled
+
+            changed = [f for f in files if f in current and current[f] != snapshot.get(f)]
+            removed = [f for f in snapshot if f not in current]
+            snapshot = current
+            if changed or removed:
+                yield [f for f in files if f in current], changed, removed
+    finally:
+        if watcher is not None:
+            close_watcher(watcher)
+
+
+def take_snapshot(files):
+    """
+    Gets the modification time and size of every file that still exists
+    """
+
+    snapshot = {}
+    for filename in files:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        snapshot[filename] = (stat.st_mtime_ns, stat.st_size)
+
+    return snapshot
+
+
+def open_watcher():
+    """
+    Opens an inotify instance to wait for changes with, or None if inotify isn't
+    available (anywhere other than Linux)
+    """
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        descriptor = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+
+    if descriptor < 0:
+        return None
+    return {"libc": libc, "descriptor": descriptor, "watches": {}}
+
+
+def update_watches(watcher, directories):
+    """
+    Watches every given directory that isn't being watched yet (keyed by inode, since a
+    directory can be replaced by another with the same path), and stops watching the
+    directories that are no longer given
+    """
+
+    libc = watcher["libc"]
+    watches = watcher["watches"]
+    keys = set()
+    for directory in directories:
+        try:
+            key = (directory, os.stat(directory).st_ino)
+        except OSError:
+            continue
+
+        keys.add(key)
+        if key not in watches:
+            descriptor = libc.inotify_add_watch(watcher["descriptor"], os.fsencode(directory),
+                                                INOTIFY_MASK)
+            if descriptor < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue
+                raise OSError(error, os.strerror(error), directory)
+            watches[key] = descriptor
+
+    for key in set(watches) - keys:
+        libc.inotify_rm_watch(watcher["descriptor"], watches.pop(key))
+
+
+def wait_for_changes(watcher):
+    """
+    Waits until inotify reports events and then until none arrive for WATCH_DEBOUNCE
+    seconds, or for WATCH_POLL_INTERVAL seconds when polling
+    """
+
+    if watcher is None:
+        time.sleep(WATCH_POLL_INTERVAL)
+        return
+
+    # The events themselves aren't needed since the files are compared afterwards
+    descriptor = watcher["descriptor"]
+    select.select([descriptor], [], [])
+    while select.select([descriptor], [], [], WATCH_DEBOUNCE)[0]:
+        os.read(descriptor, 65536)
+
+
+def close_watcher(watcher):
+    """
+    Closes an inotify instance, along with all of its watches
+    """
 
-    return file_list
+    os.close(watcher["descriptor"])
 
 
 def bootstrap():
@@ -437,12 +2195,69 @@ def bootstrap():
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     parser.add_argument("--root", "-r", metavar="path",
                         help="the path to run checkstyle over (defaults to current directory)")
+    parser.add_argument("--parallel", "-p", "-j", metavar="count", type=int, default=1,
+                        help="the number of parallel Checkstyle processes to split files "
+                        "between (0 to use every core)")
     parser.add_argument("--verbose", "-v", action="store_true",
                         help="whether to display additional output")
+    parser.add_argument("--include", metavar="glob", action="append",
+                        help="only checks files matching the glob (can be repeated)")
+    parser.add_argument("--exclude", metavar="glob", action="append",
+                        help="skips files and directories matching the glob (can be repeated)")
+    parser.add_argument("--changed-since", metavar="ref",
+                        help="only checks files that changed since the given git ref")
+    parser.add_argument("--staged", action="store_true",
+                        help="only checks files with changes staged in git")
+    parser.add_argument("--changed-lines", action="store_true",
+                        help="only reports violations on changed lines (with --changed-since "
+                        "or --staged)")
+    parser.add_argument("--server", action="store_true",
+                        help="runs Checkstyle in a background JVM that is reused between runs "
+                        "(requires Java 11+)")
+    parser.add_argument("--idle-timeout", metavar="seconds", type=int,
+                        default=SERVER_IDLE_TIMEOUT,
+                        help="how long the Checkstyle server waits for another run before "
+                        "exiting (default: %(default)s)")
+    parser.add_argument("--format", "-f", choices=REPORT_FORMATS, default=REPORT_FORMATS[0],
+                        help="also writes a JSON or SARIF report of the run (the text output "
+                        "moves to stderr if the report is written to stdout)")
+    parser.add_argument("--output", "-o", metavar="path", default="-",
+                        help="the file to write the report to (defaults to stdout)")
+    parser.add_argument("--mirror", metavar="path", default=os.environ.get(MIRROR_VARIABLE),
+                        help="a directory of artifacts (the Checkstyle jar and configuration) "
+                        "to use instead of downloading them (defaults to ${})".format(
+                            MIRROR_VARIABLE))
+    parser.add_argument("--offline", action="store_true",
+                        help="never downloads artifacts, only using cached or mirrored ones")
+    parser.add_argument("--watch", "-w", action="store_true",
+                        help="keeps running, re-checking files whenever they change")
+    parser.add_argument("--timings", action="store_true",
+                        help="prints how long each phase of the run took")
+    parser.add_argument("--profile", metavar="path",
+                        help="profiles the run with cProfile, writing the stats to the file")
 
     # Parse arguments
     parsed_args = parser.parse_args()
-    main(root=parsed_args.root, verbose=parsed_args.verbose)
+    if parsed_args.watch and (parsed_args.changed_since or parsed_args.staged):
+        parser.error("--watch can't be combined with --changed-since or --staged")
+    with contextlib.ExitStack() as stack:
+        report_file = sys.stdout
+        if parsed_args.format != "text" and parsed_args.output != "-":
+            report_file = stack.enter_context(open(parsed_args.output, "w"))
+        elif parsed_args.format != "text":
+            # Keep stdout for the report alone
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        if parsed_args.profile is not None:
+            stack.enter_context(profile_run(parsed_args.profile))
+
+        main(root=parsed_args.root, verbose=parsed_args.verbose,
+             changed_since=parsed_args.changed_since, staged=parsed_args.staged,
+             changed_lines=parsed_args.changed_lines, includes=parsed_args.include,
+             excludes=parsed_args.exclude, process_count=parsed_args.parallel,
+             server=parsed_args.server, idle_timeout=parsed_args.idle_timeout,
+             report_format=parsed_args.format, report_file=report_file,
+             mirror=parsed_args.mirror, offline=parsed_args.offline, watch=parsed_args.watch,
+             show_timings=parsed_args.timings)
 
 
 # Run script
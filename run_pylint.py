@@ -6,7 +6,7 @@ the current working directory (using class-specific options)
 __author__ = "CS 2340 TAs"
 __version__ = "1.0"
 
-# pylint: disable=wrong-import-position
+# pylint: disable=wrong-import-position,too-many-lines
 # Python version check
 import sys
 if sys.version_info[0] < 3:
@@ -18,7 +18,6 @@ https://www.python.org/downloads/
 
 # Dependency check
 try:
-    # pylint: disable=unused-import
     import pylint
 except ImportError:
     print(
@@ -32,24 +31,116 @@ It can be installed by running:
 
 import os
 import re
+import ast
+import json
+import errno
+import ctypes
+import select
+import signal
+import socket
+import hashlib
+import cProfile
 import datetime
 import argparse
 import platform
 import functools
 import subprocess
+import importlib
+import threading
+import concurrent.futures
+import time
 import traceback
 import warnings
-from subprocess import PIPE
+import contextlib
+import pathlib
+from subprocess import PIPE, DEVNULL
+from shutil import which
 
 DESCRIPTION = "Checkstyle script to run pylint on every .py file in the CWD"
 DISABLED_CHECKS = ["missing-docstring", "no-member",
                    "no-else-return", "import-error", "no-self-use"]
 BASE_OPTIONS = "--const-naming-style=any"
 PYTHON_EXTENSION = ".py"
+GITIGNORE = ".gitignore"
+IGNORED_DIRECTORIES = {".git", ".hg", ".svn", "__pycache__", ".mypy_cache", ".pytest_cache",
+                       ".tox", ".nox", ".venv", "venv", "node_modules", "build", "dist",
+                       ".eggs", "site-packages"}
 SCORE_REGEX = (r"-+\s+Your code has been rated at (-?[0-9\.]+)\/10( \(previous "
                r"run: -?[0-9\.]+\/10, [-+][0-9\.]+\))?")
 SCORE_FORMAT = """Your code has been rated at {:.2f}/10 [raw score: {:.2f}/10]"""
+PREVIOUS_SCORE_FORMAT = " (previous run: {:.2f}/10, {:+.2f})"
+PROJECT_SCORE_FORMAT = "Project score with cached results for {} unchanged files: {:.2f}/10"
+UNSCORED_PROJECT_TEXT = """
+> Note: {} unchanged files have no cached results, so the project can't be scored.
+        Run without --changed-since/--staged to score the whole project.""".lstrip()
 SENTINEL = object()
+ENGINES = ["inprocess", "subprocess"]
+FALLBACK_TEXT = "> Note: pylint could not be run in-process ({}), falling back to a subprocess"
+DAEMON_FALLBACK_TEXT = "> Note: the lint daemon could not be reached ({}), linting in-process"
+INCOMPLETE_TEXT = "Error, pylint did not finish running, so the code could not be scored"
+
+# Output parsing
+MESSAGE_REGEX = r"^\s*(.+?):(\d+): ([a-z]+) \(([A-Z]\d+), ([a-z0-9-]+), (.*?)\) (.*)$"
+MODULE_REGEX = r"^\s*\*+ Module (.+)$"
+MESSAGE_FORMAT = " {path}:{line}: {category} ({msg_id}, {symbol}, {obj}) {msg}"
+MODULE_FORMAT = "************* Module {}"
+MESSAGE_CATEGORIES = ["convention", "refactor", "warning", "error", "fatal", "info"]
+# Nodes that can have a docstring, which pylint doesn't count as a statement
+DOCUMENTED_NODES = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+# Before pylint 3 (astroid 3), a try with both except and finally clauses is two statements
+SPLIT_TRY_FINALLY = int(getattr(pylint, "__version__", "3").split(".", maxsplit=1)[0]) < 3
+
+# Structured reports
+REPORT_FORMATS = ["text", "json", "sarif"]
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_VERSION = "2.1.0"
+SARIF_ROOT = "ROOT"
+SARIF_LEVELS = {"fatal": "error", "error": "error", "warning": "warning",
+                "refactor": "note", "convention": "note", "info": "note"}
+
+# Result cache
+CACHE_VERSION = 3
+CACHE_DIRECTORY = "cs2340-codestyle"
+CACHE_NAME = "pylint-cache.json"
+
+# Git diff scoping
+# The prefixes are given explicitly so that diff.noprefix/diff.mnemonicPrefix don't apply
+GIT_DIFF_COMMAND = ["git", "-c", "core.quotepath=off", "diff", "--no-color", "--no-ext-diff",
+                    "--relative", "--unified=0", "--diff-filter=ACMR", "--src-prefix=a/",
+                    "--dst-prefix=b/"]
+GIT_UNTRACKED_COMMAND = ["git", "ls-files", "--others", "--exclude-standard", "-z"]
+GIT_DIFF_FAILED_TEXT = "Could not get the changed files from git:\n{}"
+DIFF_FILE_REGEX = r"^\+\+\+ b/(.+)$"
+DIFF_HUNK_REGEX = r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@"
+
+# Lint daemon
+DAEMON_SOCKET_FORMAT = "pylint-{}.sock"
+DAEMON_IDLE_TIMEOUT = 15 * 60
+DAEMON_START_TIMEOUT = 30
+DAEMON_POLL_INTERVAL = 0.1
+
+# Parallel scheduling
+TASKS_PER_PROCESS = 4
+
+# Watch mode
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1.0
+# inotify events: IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE
+# and IN_DELETE
+INOTIFY_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+WATCHING_TEXT = "Watching {} files for changes (press Ctrl+C to stop)"
+CHANGES_FORMAT = "Changes detected in {} files ({} removed):"
+WATCH_FALLBACK_TEXT = "> Note: file system events could not be watched ({}), polling for " \
+                      "changes instead"
+
+# Instrumentation
+# The total time spent in (and number of calls to) every function wrapped by crash_reporter
+SPANS = {}
+SPANS_LOCK = threading.Lock()
+TIMINGS_HEADER = "Timings (seconds):"
+TIMING_FORMAT = "  {:<28} {:>9.3f}"
+SPAN_FORMAT = "  {:<28} {:>9.3f} ({} calls)"
+PROFILE_TEXT = "> Note: profile written to {0} (view it with: python -m pstats {0})"
 
 
 def crash_reporter(func=None, fallback=SENTINEL):
@@ -62,6 +153,7 @@ def crash_reporter(func=None, fallback=SENTINEL):
         # closes over func/fallback
         @functools.wraps(function)
         def crash_handler(*args, **kwargs):
+            start = time.perf_counter()
             try:
                 return function(*args, **kwargs)
             # pylint: disable=broad-except
@@ -92,6 +184,8 @@ def crash_reporter(func=None, fallback=SENTINEL):
                     sys.exit()
 
                 return fallback
+            finally:
+                record_span(function.__name__, time.perf_counter() - start)
         return crash_handler
 
     if func:
@@ -100,49 +194,847 @@ def crash_reporter(func=None, fallback=SENTINEL):
     return _decorate
 
 
+def record_span(name, duration):
+    """
+    Adds a call of the given duration to the span of the function with the given name
+    """
+
+    with SPANS_LOCK:
+        span = SPANS.setdefault(name, {"calls": 0, "seconds": 0.0})
+        span["calls"] += 1
+        span["seconds"] += duration
+
+
+def get_spans():
+    """
+    Gets a copy of the spans recorded so far, by function name
+    """
+
+    with SPANS_LOCK:
+        return {name: dict(span) for name, span in SPANS.items()}
+
+
+def print_timings(timings):
+    """
+    Prints the time taken by each phase of the run, followed by the total time spent in
+    each function wrapped by crash_reporter (including the functions it calls)
+    """
+
+    print(TIMINGS_HEADER)
+    for phase, seconds in timings.items():
+        print(TIMING_FORMAT.format(phase, seconds))
+    for name, span in sorted(get_spans().items(), key=lambda item: -item[1]["seconds"]):
+        print(SPAN_FORMAT.format(name + "()", span["seconds"], span["calls"]))
+    print()
+
+
+@contextlib.contextmanager
+def profile_run(path):
+    """
+    Profiles everything run within the context with cProfile, writing the stats to the
+    given path once it exits (including through sys.exit)
+    """
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(PROFILE_TEXT.format(path))
+
+
 @crash_reporter
-def main(root=None, verbose=False, process_count=None, strict=False):
+def main(root=None, verbose=False, process_count=None, strict=False, use_cache=True, # pylint: disable=too-many-arguments,too-many-locals,too-many-branches,too-many-statements
+         engine="inprocess", changed_since=None, staged=False, changed_lines=False,
+         includes=None, excludes=None, report_format="text", report_file=None, watch=False,
+         show_timings=False):
     """
     Runs the main pylint script and parses/redirects output
-    """
 
-    args = []
-    if process_count is not None:
-        args.append("-j {}".format(process_count))
+    Named:
+    report_format (string): "json" or "sarif" to also write a structured report
+                            (see build_report) to report_file, or "text" for none
+    watch (bool): whether to keep re-linting files as they change afterwards
+    show_timings (bool): whether to print how long each phase of the run took
+    """
 
+    start = time.perf_counter()
+    timings = {}
     path = os.path.abspath(root) if root is not None else os.getcwd()
-    # Filter out the current script
-    current_script = os.path.basename(__file__)
-    files = [f for f in find_files(
-        path, PYTHON_EXTENSION) if not f.endswith(current_script)]
+    patterns = (includes, excludes)
+    files, changes = select_files(path, patterns, changed_since=changed_since, staged=staged)
+    timings["discovery"] = time.perf_counter() - start
+    if files is None:
+        return
 
     print()
-    print("Running pylint on {} files:".format(len(files)))
+    qualifier = "changed " if changes is not None else ""
+    print("Running pylint on {} {}files:".format(len(files), qualifier))
     # Print each file in verbose mode
     if verbose:
         for file in files:
             print(" - {}".format(file))
 
-    output = run_linter(files, args, strict=strict)
+    options_key = get_options_key(get_options([], strict=strict))
+    phase_start = time.perf_counter()
+    cache = load_cache() if use_cache else empty_cache()
+    timings["cache"] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
+    results, extra, complete = lint_cached(files, [], cache, options_key, root=path,
+                                           strict=strict, engine=engine,
+                                           process_count=process_count)
+    timings["lint"] = time.perf_counter() - phase_start
+    if verbose and use_cache:
+        print()
+        print("Cache: {} hits, {} misses".format(*cache["stats"]))
+
+    print()
+    phase_start = time.perf_counter()
+    line_ranges = changes if changed_lines else None
+    print(format_results(files, results, extra, path, line_ranges=line_ranges).rstrip())
     print()
-    print(re.sub(SCORE_REGEX, "", output).rstrip())
+
+    # Print score, only comparing against the previous run when the whole project was linted
+    score = compute_score(results.values()) if complete else None
+    if not complete:
+        print(INCOMPLETE_TEXT)
+        print()
+    elif score is not None and changes is not None:
+        print_score(score)
+    elif score is not None:
+        print_score(score, cache["scores"].get(path + options_key))
+        cache["scores"][path + options_key] = score
+
+    if changes is not None and use_cache and complete:
+        print_project_score(path, patterns, results, cache, options_key)
+    timings["output"] = time.perf_counter() - phase_start
+
+    if use_cache:
+        phase_start = time.perf_counter()
+        save_cache(cache)
+        timings["cache"] += time.perf_counter() - phase_start
+
+    timings["total"] = time.perf_counter() - start
+    if show_timings:
+        print_timings(timings)
+
+    if report_format != "text":
+        report = build_report(files, results, extra, path, score, timings,
+                              line_ranges=line_ranges)
+        write_report(report, report_format, report_file or sys.stdout)
+
+    if not complete:
+        sys.exit(1)
+
+    if watch:
+        watch_files(path, patterns, results, cache, options_key, strict=strict, engine=engine,
+                    process_count=process_count, use_cache=use_cache)
+
+
+def watch_files(path, patterns, results, cache, options_key, strict=False, # pylint: disable=too-many-arguments,too-many-locals,too-many-branches
+                engine="inprocess", process_count=None, use_cache=True):
+    """
+    Re-lints files as they change until interrupted, printing the messages in the changed
+    files and the project's score. Since the score is a sum over per-file results, it is
+    recomputed exactly from the latest result of every file
+
+    Parameters:
+    results (dict): the results of the initial run by filepath, which are kept up to date
+    """
+
+    # Parsed modules are kept between runs in-process, so changed ones must be evicted
+    mtimes = {}
+    if engine == "inprocess":
+        record_modules(mtimes)
+
+    print(WATCHING_TEXT.format(len(results)))
+    print()
+    previous = compute_score(results.values())
+    includes, excludes = patterns
+    # Files whose last lint didn't finish, which are linted again with the next change
+    failed = set()
+    try:
+        for files, changed, removed in iter_changes(path, PYTHON_EXTENSION, includes=includes,
+                                                    excludes=excludes):
+            files = get_files(path, patterns, candidates=files)
+            changed = failed.union(changed)
+            changed = [f for f in files if f in changed]
+            for filename in removed:
+                results.pop(filename, None)
+            if not changed and not removed:
+                continue
+
+            print(CHANGES_FORMAT.format(len(changed) + len(removed), len(removed)))
+            for filename in changed + removed:
+                print(" - {}".format(os.path.relpath(filename, path)))
+
+            fresh, extra, complete = {}, [], True
+            if changed:
+                if engine == "inprocess":
+                    invalidate_modules(mtimes, path)
+                fresh, extra, complete = lint_cached(changed, [], cache, options_key, root=path,
+                                                     strict=strict, engine=engine,
+                                                     process_count=process_count)
+                if engine == "inprocess":
+                    record_modules(mtimes)
+            if complete:
+                results.update(fresh)
+                failed.clear()
+            else:
+                failed.update(changed)
+
+            print()
+            output = format_results(changed, fresh, extra, path).rstrip()
+            if output:
+                print(output)
+                print()
+
+            if not complete:
+                print(INCOMPLETE_TEXT)
+                print()
+                continue
+
+            score = compute_score(results.values())
+            if score is not None:
+                print_score(score, previous)
+                previous = score
+            if use_cache:
+                save_cache(cache)
+    except KeyboardInterrupt:
+        print()
+
+
+def print_score(score, previous=None):
+    """
+    Prints the final score, along with the previous run's score if it exists
+    """
+
+    score_output = SCORE_FORMAT.format(max(score, 0), score)
+    if previous is not None:
+        score_output += PREVIOUS_SCORE_FORMAT.format(previous, score - previous)
+
+    print(len(score_output) * "-")
+    print(score_output)
     print()
 
-    # Print score
-    match = re.search(SCORE_REGEX, output)
-    if match:
-        score = float(match.group(1))
-        score_output = SCORE_FORMAT.format(max(score, 0), score)
 
-        # Add previous score addendum if it exists
-        if match.group(2) is not None:
-            score_output += match.group(2)
+def print_project_score(path, patterns, results, cache, options_key):
+    """
+    Prints the score of the whole project, combining the results of the changed files
+    with cached results for every other file
+    """
+
+    unchanged = [f for f in get_files(path, patterns) if f not in results]
+    cached, missing = lookup_cache(cache, unchanged, options_key)
+    if missing:
+        print(UNSCORED_PROJECT_TEXT.format(len(missing)))
+        print()
+        return
 
-        print(len(score_output) * "-")
-        print(score_output)
+    score = compute_score(list(results.values()) + list(cached.values()))
+    if score is not None:
+        print(PROJECT_SCORE_FORMAT.format(len(cached), max(score, 0)))
         print()
 
 
+def select_files(path, patterns, changed_since=None, staged=False):
+    """
+    Gets the python source files to lint: every file in the given path, or only
+    those changed according to git
+
+    Parameters:
+    path (string): the path to lint
+    patterns (tuple): lists of globs to include and exclude (either can be None)
+
+    Returns:
+    the filepaths (None if git failed) and their changed line ranges (None if every
+    file is linted)
+    """
+
+    if changed_since is None and not staged:
+        return get_files(path, patterns), None
+
+    changes, error = get_changed_files(path, PYTHON_EXTENSION, ref=changed_since,
+                                       staged=staged)
+    if changes is None:
+        print(GIT_DIFF_FAILED_TEXT.format(error))
+        return None, None
+
+    return get_files(path, patterns, candidates=changes), changes
+
+
+@crash_reporter(fallback=(None, ""))
+def get_changed_files(path, extension, ref=None, staged=False):
+    """
+    Gets the files with the given extension under the given path that differ from
+    the given git ref (or that are staged, or both), using a single git diff. Unless
+    only staged changes are wanted, untracked files (that aren't ignored) count as
+    changed in their entirety
+
+    Returns:
+    a dict mapping each changed filepath to a list of (first, last) changed line
+    ranges, or None and git's error output if git failed
+    """
+
+    if which("git") is None:
+        return None, "git is not installed"
+
+    command = GIT_DIFF_COMMAND + (["--cached"] if staged else []) + ([ref] if ref else [])
+    result = subprocess.run(command + ["--"], stdout=PIPE, stderr=PIPE, cwd=path, check=False)
+    if result.returncode != 0:
+        return None, result.stderr.decode(sys.stderr.encoding, "replace").strip()
+
+    changes = {}
+    ranges = None
+    for line in result.stdout.decode("utf-8", "replace").splitlines():
+        file_match = re.match(DIFF_FILE_REGEX, line)
+        if file_match:
+            filename = os.path.normpath(os.path.join(path, file_match.group(1)))
+            ranges = changes.setdefault(filename, []) if filename.endswith(extension) else None
+            continue
+
+        hunk_match = re.match(DIFF_HUNK_REGEX, line)
+        if hunk_match and ranges is not None:
+            start = int(hunk_match.group(1))
+            length = int(hunk_match.group(2) or 1)
+            # Hunks that only remove lines don't have any changed lines left
+            if length:
+                ranges.append((start, start + length - 1))
+
+    if not staged:
+        result = subprocess.run(GIT_UNTRACKED_COMMAND, stdout=PIPE, stderr=PIPE, cwd=path,
+                                check=False)
+        if result.returncode != 0:
+            return None, result.stderr.decode(sys.stderr.encoding, "replace").strip()
+        for name in result.stdout.split(b"\0"):
+            filename = os.path.normpath(os.path.join(path, os.fsdecode(name)))
+            if name and filename.endswith(extension):
+                changes[filename] = [(1, sys.maxsize)]
+
+    return changes, ""
+
+
+def in_ranges(line, ranges):
+    """
+    Determines whether the given line number is within any of the (first, last) ranges
+    """
+
+    return any(first <= line <= last for first, last in ranges)
+
+
+def lint_cached(files, args, cache, options_key, root=None, strict=False, # pylint: disable=too-many-arguments
+                engine="inprocess", process_count=None):
+    """
+    Lints only the files that have changed since their results were last cached,
+    storing the fresh results back in the cache
+
+    Returns:
+    a dict of results for every file, a list of unattributed (module, messages) pairs
+    and whether the run completed
+    """
+
+    results, stale = lookup_cache(cache, files, options_key)
+    cache["stats"] = (len(files) - len(stale), len(stale))
+
+    if process_count == 0:
+        process_count = os.cpu_count() or 1
+
+    if process_count is not None and process_count > 1 and engine != "daemon":
+        # Stale entries still hold how long each file took to lint last time
+        durations = {f: cache["files"][f]["result"].get("duration")
+                     for f in stale if f in cache["files"]}
+        fresh, extra, complete = lint_parallel(stale, args, process_count, durations,
+                                               root=root, strict=strict, engine=engine)
+    else:
+        fresh, extra, complete = lint_files(stale, args, root=root, strict=strict,
+                                            engine=engine)
+    results.update(fresh)
+
+    # Only cache complete runs so that a crashed pylint can't poison the cache
+    if complete:
+        update_cache(cache, fresh, options_key)
+
+    return results, extra, complete
+
+
+def lint_files(files, args, root=None, strict=False, engine="inprocess"):
+    """
+    Lints the given files using the given engine, falling back to running pylint
+    in a subprocess if it can't be run in-process
+
+    Returns:
+    a dict of results by filepath, a list of unattributed (module, messages) pairs,
+    and whether the run completed
+    """
+
+    if not files:
+        return {}, [], True
+
+    start = time.time()
+    results, extra, complete = run_engine(files, args, root=root, strict=strict, engine=engine)
+    record_durations(results, time.time() - start)
+    return results, extra, complete
+
+
+def run_engine(files, args, root=None, strict=False, engine="inprocess"):
+    """
+    Runs the given engine over the files, falling back from the daemon to running
+    pylint in-process and from in-process to a subprocess
+    """
+
+    if engine == "daemon":
+        try:
+            return run_linter_daemon(files, args, root=root, strict=strict)
+        except (OSError, ValueError, KeyError) as error:
+            print(DAEMON_FALLBACK_TEXT.format(error or type(error).__name__))
+            engine = "inprocess"
+
+    if engine == "inprocess":
+        try:
+            results, extra = run_linter_inprocess(files, args, root=root, strict=strict)
+            return results, extra, True
+        # pylint: disable=broad-except
+        except (Exception, SystemExit) as error:
+            print(FALLBACK_TEXT.format(error or type(error).__name__))
+
+    output = run_linter(files, args, strict=strict)
+    results, extra = parse_linter_output(output, files)
+    return results, extra, re.search(SCORE_REGEX, output) is not None
+
+
+def record_durations(results, duration):
+    """
+    Splits the time spent linting a group of files between them in proportion to their
+    sizes, which is used to schedule the slowest files first in later parallel runs
+    """
+
+    sizes = {filename: get_size(filename) for filename in results}
+    total = sum(sizes.values())
+    for filename, result in results.items():
+        share = sizes[filename] / total if total else 1 / len(results)
+        result["duration"] = duration * share
+
+
+def get_size(filename):
+    """
+    Gets the size of a file in bytes, or 0 if it doesn't exist
+    """
+
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def lint_parallel(files, args, process_count, durations, root=None, strict=False, # pylint: disable=too-many-arguments
+                  engine="inprocess"):
+    """
+    Lints the given files across a pool of processes. Files are grouped into tasks that
+    are handed out slowest-first, so idle processes pick up the remaining work and a
+    few large modules can't hold up the end of the run
+
+    Parameters:
+    files (array(string)): filepaths to python source files
+    args (list): CLI arguments
+    process_count (int): the number of processes to use
+    durations (dict): how long each file took to lint in a previous run, if known
+
+    Returns:
+    a dict of results by filepath, a list of unattributed (module, messages) pairs,
+    and whether every task completed
+    """
+
+    if engine == "inprocess":
+        # Import pylint before the pool is created so forked workers share it
+        importlib.import_module("pylint.lint")
+
+    tasks = schedule_tasks(files, durations, process_count * TASKS_PER_PROCESS)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=process_count) as executor:
+        futures = [executor.submit(lint_files, task, args, root=root, strict=strict,
+                                   engine=engine)
+                   for task in tasks]
+        return merge_outcomes([future.result() for future in futures])
+
+
+def schedule_tasks(files, durations, task_count):
+    """
+    Groups files into roughly task_count tasks of similar estimated cost, ordered from
+    most to least expensive. Files that have been linted before are estimated by their
+    previous lint time, and the rest by their size (scaled to the same units)
+
+    Returns:
+    a list of tasks, each a list of filepaths
+    """
+
+    costs = estimate_costs(files, durations)
+    target = sum(costs.values()) / max(task_count, 1)
+    tasks = []
+    task = []
+    task_cost = 0
+    for filename in sorted(files, key=lambda f: costs[f], reverse=True):
+        task.append(filename)
+        task_cost += costs[filename]
+        if task_cost >= target:
+            tasks.append((task_cost, task))
+            task = []
+            task_cost = 0
+
+    if task:
+        tasks.append((task_cost, task))
+
+    tasks.sort(key=lambda pair: pair[0], reverse=True)
+    return [task for _, task in tasks]
+
+
+def estimate_costs(files, durations):
+    """
+    Estimates how long each file will take to lint, using its previous lint time if
+    known or otherwise its size multiplied by the average time per byte
+    """
+
+    sizes = {filename: get_size(filename) for filename in files}
+    known = [f for f in files if durations.get(f)]
+    known_size = sum(sizes[f] for f in known)
+    rate = sum(durations[f] for f in known) / known_size if known and known_size else 1.0
+    return {f: durations.get(f) or sizes[f] * rate for f in files}
+
+
+def merge_outcomes(outcomes):
+    """
+    Merges the (results, extra, complete) outcomes of several lint tasks into one
+    """
+
+    results = {}
+    extra = []
+    for task_results, task_extra, _ in outcomes:
+        results.update(task_results)
+        merge_extra(extra, task_extra)
+
+    return results, extra, all(complete for _, _, complete in outcomes)
+
+
+def merge_extra(extra, new_extra):
+    """
+    Merges unattributed messages from a task into those from previous tasks, dropping
+    duplicates (each pylint run reports problems with the command line separately)
+    """
+
+    for module, messages in new_extra:
+        group = next((pair for pair in extra if pair[0] == module), None)
+        if group is None:
+            group = (module, [])
+            extra.append(group)
+
+        for message in messages:
+            if message not in group[1]:
+                group[1].append(message)
+
+
+def create_message_collector():
+    """
+    Creates a pylint reporter that collects messages instead of displaying them.
+    pylint's API is only imported when it is used so that daemon clients stay fast
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pylint.reporters import BaseReporter
+
+    class MessageCollector(BaseReporter):
+        """
+        Pylint reporter that collects messages instead of displaying them
+        """
+
+        name = "collector"
+
+        def __init__(self):
+            BaseReporter.__init__(self)
+            self.messages = []
+
+        def handle_message(self, msg):
+            self.messages.append(msg)
+
+        def _display(self, layout):
+            pass
+
+    return MessageCollector()
+
+
+def run_linter_inprocess(files, args, root=None, strict=False):
+    """
+    Runs pylint within the current interpreter on every file specified, using the
+    class-specific arguments as well as any additional ones specified
+
+    Parameters:
+    files (array(string)): filepaths to python source files
+    args (list): CLI arguments
+
+    Named:
+    root (string): The directory to lint from, which imports are resolved against
+    strict (boolean): Whether to run the linter in strict mode
+
+    Returns:
+    a dict of results by filepath and a list of unattributed (module, messages) pairs
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pylint.lint import Run as PylintRun
+
+    # Mirror running pylint from the root directory in a subprocess
+    root = root or os.getcwd()
+    previous_cwd = os.getcwd()
+    previous_path = list(sys.path)
+    collector = create_message_collector()
+    try:
+        os.chdir(root)
+        sys.path.insert(0, root)
+        PylintRun(get_options(args, strict=strict) + files, reporter=collector, exit=False)
+    finally:
+        os.chdir(previous_cwd)
+        sys.path[:] = previous_path
+
+    results = {filename: empty_result(filename) for filename in files}
+    extra = []
+    for msg in collector.messages:
+        message = {"line": msg.line, "column": msg.column, "category": msg.category,
+                   "msg_id": msg.msg_id, "symbol": msg.symbol, "obj": msg.obj,
+                   "msg": msg.msg}
+        filename = os.path.normpath(msg.abspath) if msg.abspath else None
+        if filename not in results:
+            if not extra or extra[-1][0] != msg.module:
+                extra.append((msg.module, []))
+            extra[-1][1].append(dict(message, path=msg.path))
+            continue
+
+        add_message(results[filename], msg.module, message)
+
+    return results, extra
+
+
+def run_linter_daemon(files, args, root=None, strict=False):
+    """
+    Sends the files to the lint daemon (starting it if it isn't running yet) and
+    waits for its results
+
+    Returns:
+    a dict of results by filepath, a list of unattributed (module, messages) pairs,
+    and whether the run completed
+    """
+
+    connection = connect_daemon()
+    with connection:
+        job = {"files": files, "args": args, "root": root, "strict": strict}
+        connection.sendall(json.dumps(job).encode("utf-8") + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile("rb") as stream:
+            response = json.loads(stream.read().decode("utf-8"))
+
+    if "error" in response:
+        raise ValueError(response["error"])
+
+    extra = [tuple(pair) for pair in response["extra"]]
+    return response["results"], extra, response["complete"]
+
+
+def connect_daemon():
+    """
+    Connects to the lint daemon's socket, spawning the daemon in the background if it
+    isn't running yet
+    """
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("unix sockets aren't supported on this platform")
+
+    address = get_daemon_address()
+    try:
+        return open_daemon_socket(address)
+    except OSError:
+        pass
+
+    # Start a new daemon, clearing any socket left behind by one that crashed
+    if os.path.exists(address):
+        os.remove(address)
+    # pylint: disable=consider-using-with
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--daemon"],
+                     stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL,
+                     start_new_session=True)
+
+    deadline = time.time() + DAEMON_START_TIMEOUT
+    while True:
+        try:
+            return open_daemon_socket(address)
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(DAEMON_POLL_INTERVAL)
+
+
+def open_daemon_socket(address):
+    """
+    Opens a connection to the daemon listening at the given address
+    """
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(address)
+    except OSError:
+        connection.close()
+        raise
+
+    return connection
+
+
+def get_daemon_address():
+    """
+    Gets the path of the daemon's socket. Each interpreter/pylint version pair gets
+    its own daemon so that results always come from the pylint the client would use
+    """
+
+    key = json.dumps([sys.executable, getattr(pylint, "__version__", None), __version__])
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(os.path.dirname(get_cache_path()), DAEMON_SOCKET_FORMAT.format(digest))
+
+
+@crash_reporter
+def run_daemon(idle_timeout=DAEMON_IDLE_TIMEOUT):
+    """
+    Runs the lint daemon, which keeps pylint loaded and astroid's module cache warm
+    between lint jobs sent by clients. Jobs are handled one at a time, and the daemon
+    shuts down after being idle for the given number of seconds
+    """
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("The lint daemon requires unix socket support")
+        return
+
+    address = get_daemon_address()
+    os.makedirs(os.path.dirname(address), exist_ok=True)
+    if os.path.exists(address):
+        os.remove(address)
+
+    # Clean up the socket when terminated
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    mtimes = {}
+    try:
+        server.bind(address)
+        os.chmod(address, 0o600)
+        server.listen(5)
+        server.settimeout(idle_timeout)
+        while True:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                break
+
+            with connection:
+                connection.settimeout(None)
+                handle_daemon_job(connection, mtimes)
+    finally:
+        server.close()
+        if os.path.exists(address):
+            os.remove(address)
+
+
+def handle_daemon_job(connection, mtimes):
+    """
+    Runs a single lint job received from a client and sends back its results
+    """
+
+    with connection.makefile("rb") as stream:
+        job = json.loads(stream.readline().decode("utf-8"))
+
+    try:
+        invalidate_modules(mtimes, job["root"])
+        results, extra = run_linter_inprocess(job["files"], job["args"], root=job["root"],
+                                              strict=job["strict"])
+        response = {"results": results, "extra": extra, "complete": True}
+        record_modules(mtimes)
+    # pylint: disable=broad-except
+    except (Exception, SystemExit) as error:
+        response = {"error": str(error) or type(error).__name__}
+
+    connection.sendall(json.dumps(response).encode("utf-8"))
+
+
+def record_modules(mtimes):
+    """
+    Records the modification time of every module in astroid's module cache that
+    isn't being tracked yet
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import astroid
+
+    for module in astroid.MANAGER.astroid_cache.values():
+        filename = getattr(module, "file", None)
+        if filename and filename not in mtimes:
+            mtimes[filename] = get_mtime(filename)
+
+
+def get_mtime(filename):
+    """
+    Gets the modification time of a file, or None if it doesn't exist
+    """
+
+    try:
+        return os.stat(filename).st_mtime_ns
+    except OSError:
+        return None
+
+
+def invalidate_modules(mtimes, root):
+    """
+    Evicts modules whose source files changed since they were parsed from astroid's
+    module cache. Since inference results can refer to the evicted modules, every
+    module within the linted root is evicted along with them, but third-party
+    modules stay cached
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import astroid
+
+    changed = False
+    cache = astroid.MANAGER.astroid_cache
+    for name, module in list(cache.items()):
+        filename = getattr(module, "file", None)
+        if filename in mtimes and mtimes[filename] != get_mtime(filename):
+            del cache[name]
+            del mtimes[filename]
+            changed = True
+
+    if changed:
+        evict_modules(root, mtimes)
+
+
+def evict_modules(root, mtimes=None):
+    """
+    Evicts every module within the given root from astroid's module cache (and from
+    mtimes, if specified), along with any inference results that refer to them
+    """
+
+    # pylint: disable=import-outside-toplevel
+    import astroid
+
+    cache = astroid.MANAGER.astroid_cache
+    root = os.path.join(os.path.normpath(root), "")
+    for name, module in list(cache.items()):
+        filename = getattr(module, "file", None)
+        if filename and os.path.normpath(filename).startswith(root):
+            del cache[name]
+            if mtimes is not None:
+                mtimes.pop(filename, None)
+
+    # Inference caches are keyed by nodes of the evicted modules
+    for module_name, function_name in (("astroid.context", "_invalidate_cache"),
+                                       ("astroid.inference_tip", "clear_inference_tip_cache")):
+        function = getattr(sys.modules.get(module_name), function_name, None)
+        if function is not None:
+            function()
+
+
 @crash_reporter
 def run_linter(files, args, strict=False):
     """
@@ -175,19 +1067,720 @@ def run_linter(files, args, strict=False):
     return result.stdout.decode(sys.stdout.encoding)
 
 
+def get_files(path, patterns, candidates=None):
+    """
+    Gets every python source file in the given path (or out of the given candidate
+    filepaths, if specified) matching the (includes, excludes) glob patterns, other
+    than the current script
+    """
+
+    current_script = os.path.basename(__file__)
+    includes, excludes = patterns
+    if candidates is None:
+        candidates = find_files(path, PYTHON_EXTENSION, includes=includes, excludes=excludes)
+    else:
+        candidates = [f for f in candidates if matches_patterns(f, path, includes, excludes)]
+
+    return [f for f in candidates if not f.endswith(current_script) and os.path.isfile(f)]
+
+
+def matches_patterns(filename, path, includes=None, excludes=None):
+    """
+    Determines whether a file passes the include/exclude globs that find_files uses,
+    relative to the given path
+    """
+
+    relative = os.path.relpath(filename, path).replace(os.sep, "/")
+    if any(compile_pattern(glob).match(relative) for glob in excludes or []):
+        return False
+
+    return not includes or any(compile_pattern(glob).match(relative) for glob in includes)
+
+
 @crash_reporter
-def find_files(path, extension):
+def find_files(path, extension, includes=None, excludes=None):
     """
     Gets a list of every file in the given path that has the given file extension
     """
 
-    file_list = []
-    for root, _, files in os.walk(path):
-        for file in files:
-            if file.endswith(extension):
-                file_list.append(os.path.join(root, file))
+    return list(iter_files(path, extension, includes=includes, excludes=excludes))
+
+
+def iter_files(path, extension, includes=None, excludes=None, directories=None):
+    """
+    Yields every file in the given path that has the given file extension as it is found,
+    without descending into ignored directories (see IGNORED_DIRECTORIES) or into
+    anything excluded by a .gitignore file along the way
+
+    Named:
+    includes (list): if specified, only files matching one of these globs are yielded
+    excludes (list): files and directories matching any of these globs are skipped
+    directories (list): if specified, every directory that is visited is appended to it
+    """
+
+    includes = [compile_pattern(glob) for glob in includes or []]
+    excludes = [compile_pattern(glob) for glob in excludes or []]
+
+    # Directories to visit, paired with their path relative to the root (using "/")
+    # and the gitignore rules that apply within them
+    pending = [(os.path.abspath(path), "", [])]
+    while pending:
+        directory, relative_directory, rules = pending.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        if directories is not None:
+            directories.append(directory)
+        if any(entry.name == GITIGNORE for entry in entries):
+            rules = rules + read_gitignore(os.path.join(directory, GITIGNORE),
+                                           relative_directory)
+
+        subdirectories = []
+        for entry in entries:
+            relative = relative_directory + "/" + entry.name if relative_directory else entry.name
+            is_directory = entry.is_dir(follow_symlinks=False)
+            if is_directory and entry.name in IGNORED_DIRECTORIES:
+                continue
+            if any(regex.match(relative) for regex in excludes):
+                continue
+            if is_ignored_path(relative, is_directory, rules):
+                continue
+
+            if is_directory:
+                subdirectories.append((entry.path, relative, rules))
+            elif entry.name.endswith(extension) and entry.is_file():
+                if not includes or any(regex.match(relative) for regex in includes):
+                    yield entry.path
+
+        # Visit subdirectories in order after the files in the current directory
+        pending.extend(reversed(subdirectories))
+
+
+def read_gitignore(gitignore_path, base):
+    """
+    Reads the rules from a .gitignore file as (regex, negated, directory only, base)
+    tuples, where base is the relative path of the directory containing the file
+    """
+
+    rules = []
+    try:
+        with open(gitignore_path, "r", encoding="utf-8", errors="replace") as gitignore:
+            lines = gitignore.read().splitlines()
+    except OSError:
+        return rules
+
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+
+        negated = line.startswith("!")
+        if negated or line.startswith("\\"):
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if line:
+            rules.append((compile_pattern(line), negated, directory_only, base))
+
+    return rules
+
+
+def is_ignored_path(relative, is_directory, rules):
+    """
+    Determines whether a relative path is excluded by the given gitignore rules,
+    where later (deeper) rules take precedence over earlier ones
+    """
+
+    ignored = False
+    for regex, negated, directory_only, base in rules:
+        if directory_only and not is_directory:
+            continue
+        if regex.match(relative[len(base) + 1:] if base else relative):
+            ignored = not negated
+
+    return ignored
+
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(glob):
+    """
+    Compiles a gitignore-style glob into a regex matched against "/"-separated relative
+    paths. Globs without a slash match at any depth, "*" doesn't match "/" but "**" does,
+    and matching a directory also matches everything within it
+    """
+
+    if "/" not in glob:
+        glob = "**/" + glob
+
+    parts = []
+    index = 0
+    glob = glob.lstrip("/")
+    while index < len(glob):
+        if glob.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif glob.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif glob[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif glob[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        elif glob[index] == "[" and "]" in glob[index + 2:]:
+            end = glob.index("]", index + 2)
+            characters = glob[index + 1:end]
+            if characters.startswith("!"):
+                characters = "^" + characters[1:]
+            parts.append("[" + characters.replace("\\", "\\\\") + "]")
+            index = end + 1
+        else:
+            parts.append(re.escape(glob[index]))
+            index += 1
+
+    return re.compile("".join(parts) + "(?:/.*)?$")
+
+
+def iter_changes(path, extension, includes=None, excludes=None):
+    """
+    Watches the files that find_files discovers in the given path, yielding after each
+    burst of changes once no more changes arrive for WATCH_DEBOUNCE seconds. Changes
+    wake this up through inotify on Linux, falling back to polling the files every
+    WATCH_POLL_INTERVAL seconds
+
+    Yields:
+    every file that is currently found, the files that were added or modified, and
+    the files that were removed
+    """
+
+    directories = []
+    files = list(iter_files(path, extension, includes=includes, excludes=excludes,
+                            directories=directories))
+    snapshot = take_snapshot(files)
+    watcher = open_watcher()
+    try:
+        while True:
+            try:
+                if watcher is not None:
+                    update_watches(watcher, directories)
+            except OSError as error:
+                # Such as when running out of inotify watches on large trees
+                print(WATCH_FALLBACK_TEXT.format(error))
+                close_watcher(watcher)
+                watcher = None
+
+            wait_for_changes(watcher)
+            directories = []
+            files = list(iter_files(path, extension, includes=includes, excludes=excludes,
+                                    directories=directories))
+            current = take_snapshot(files)
+            # Polling can catch a burst of saves midway, so wait for it to settle
+            while watcher is None and current != snapshot:
+                time.sleep(WATCH_DEBOUNCE)
+                settled = take_snapshot(files)
+                if settled == current:
+                    break
+                current = settled
+
+            changed = [f for f in files if f in current and current[f] != snapshot.get(f)]
+            removed = [f for f in snapshot if f not in current]
+            snapshot = current
+            if changed or removed:
+                yield [f for f in files if f in current], changed, removed
+    finally:
+        if watcher is not None:
+            close_watcher(watcher)
+
+
+def take_snapshot(files):
+    """
+    Gets the modification time and size of every file that still exists
+    """
+
+    snapshot = {}
+    for filename in files:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        snapshot[filename] = (stat.st_mtime_ns, stat.st_size)
+
+    return snapshot
+
+
+def open_watcher():
+    """
+    Opens an inotify instance to wait for changes with, or None if inotify isn't
+    available (anywhere other than Linux)
+    """
+
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        descriptor = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+
+    if descriptor < 0:
+        return None
+    return {"libc": libc, "descriptor": descriptor, "watches": {}}
+
+
+def update_watches(watcher, directories):
+    """
+    Watches every given directory that isn't being watched yet (keyed by inode, since a
+    directory can be replaced by another with the same path), and stops watching the
+    directories that are no longer given
+    """
+
+    libc = watcher["libc"]
+    watches = watcher["watches"]
+    keys = set()
+    for directory in directories:
+        try:
+            key = (directory, os.stat(directory).st_ino)
+        except OSError:
+            continue
+
+        keys.add(key)
+        if key not in watches:
+            descriptor = libc.inotify_add_watch(watcher["descriptor"], os.fsencode(directory),
+                                                INOTIFY_MASK)
+            if descriptor < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue
+                raise OSError(error, os.strerror(error), directory)
+            watches[key] = descriptor
+
+    for key in set(watches) - keys:
+        libc.inotify_rm_watch(watcher["descriptor"], watches.pop(key))
+
+
+def wait_for_changes(watcher):
+    """
+    Waits until inotify reports events and then until none arrive for WATCH_DEBOUNCE
+    seconds, or for WATCH_POLL_INTERVAL seconds when polling
+    """
+
+    if watcher is None:
+        time.sleep(WATCH_POLL_INTERVAL)
+        return
+
+    # The events themselves aren't needed since the files are compared afterwards
+    descriptor = watcher["descriptor"]
+    select.select([descriptor], [], [])
+    while select.select([descriptor], [], [], WATCH_DEBOUNCE)[0]:
+        os.read(descriptor, 65536)
+
+
+def close_watcher(watcher):
+    """
+    Closes an inotify instance, along with all of its watches
+    """
+
+    os.close(watcher["descriptor"])
+
+
+@crash_reporter(fallback=({}, []))
+def parse_linter_output(output, files):
+    """
+    Parses the stdout output from pylint into per-file results
+
+    Parameters:
+    output (string): the stdout output from pylint
+    files (array(string)): filepaths to the python source files that were linted
+
+    Returns:
+    a dict mapping each filepath to its result (messages, message counts and statement
+    count) and a list of (module, messages) pairs that could not be attributed to a file
+    """
+
+    results = {filename: empty_result(filename) for filename in files}
+    extra = []
+    module = None
+    message = None
+    for line in re.sub(SCORE_REGEX, "", output).splitlines():
+        if not line.strip():
+            continue
+
+        module_match = re.match(MODULE_REGEX, line)
+        if module_match:
+            module = module_match.group(1)
+            message = None
+            continue
+
+        match = re.match(MESSAGE_REGEX, line)
+        if match is None:
+            # Continuation of a multiline message (code snippets, similar lines, ...)
+            if message is not None:
+                message["msg"] += "\n" + line[1:] if line.startswith(" ") else line
+            continue
 
-    return file_list
+        message = {"line": int(match.group(2)), "column": None, "category": match.group(3),
+                   "msg_id": match.group(4), "symbol": match.group(5),
+                   "obj": match.group(6), "msg": match.group(7)}
+        filename = resolve_path(match.group(1), module, files)
+        if filename is None:
+            if not extra or extra[-1][0] != module:
+                extra.append((module, []))
+            extra[-1][1].append(dict(message, path=match.group(1)))
+            continue
+
+        add_message(results[filename], module, message)
+
+    return results, extra
+
+
+def empty_result(filename):
+    """
+    Creates the result of a file before any of its messages are added
+    """
+
+    return {"module": None, "messages": [], "counts": dict.fromkeys(MESSAGE_CATEGORIES, 0),
+            "statements": count_statements(filename)}
+
+
+def add_message(result, module, message):
+    """
+    Adds a message to a file's result, updating its message counts
+    """
+
+    result["module"] = module
+    result["messages"].append(message)
+    if message["category"] in result["counts"]:
+        result["counts"][message["category"]] += 1
+
+
+def resolve_path(path, module, files):
+    """
+    Finds the linted file that a path in pylint's output refers to. Paths are either
+    absolute or relative to the directory pylint was run in, so they are matched by suffix
+    (using the module name to break ties), or None if the path isn't a linted file
+    """
+
+    path = os.path.normpath(path)
+    if path in files:
+        return path
+
+    candidates = [f for f in files if f.endswith(os.sep + path)]
+    if len(candidates) > 1 and module is not None:
+        module_path = os.sep + module.replace(".", os.sep)
+        candidates = [f for f in candidates
+                      if os.path.splitext(f)[0].endswith(module_path)] or candidates
+
+    return candidates[0] if candidates else None
+
+
+@crash_reporter(fallback=0)
+def count_statements(filename):
+    """
+    Counts the number of statements in a python source file, the same way pylint
+    does when computing its score (every statement node in the syntax tree, apart
+    from docstrings, which astroid doesn't keep as statements)
+    """
+
+    try:
+        with open(filename, "rb") as source_file:
+            tree = ast.parse(source_file.read(), filename)
+    except (OSError, SyntaxError, ValueError):
+        return 0
+
+    count = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.stmt, ast.ExceptHandler)):
+            count += 1
+        if SPLIT_TRY_FINALLY and isinstance(node, ast.Try) and node.handlers and node.finalbody:
+            count += 1
+        if isinstance(node, DOCUMENTED_NODES) and ast.get_docstring(node, clean=False) is not None:
+            count -= 1
+
+    return count
+
+
+def compute_score(results):
+    """
+    Computes pylint's default evaluation over a collection of per-file results, or
+    None if there weren't any statements to score. Like pylint, any fatal message
+    (such as a file that couldn't be parsed) scores 0
+    """
+
+    counts = dict.fromkeys(MESSAGE_CATEGORIES, 0)
+    statements = 0
+    for result in results:
+        statements += result["statements"]
+        for category, count in result["counts"].items():
+            counts[category] = counts.get(category, 0) + count
+
+    if statements == 0:
+        return None
+    if counts["fatal"]:
+        return 0.0
+
+    weighted = 5 * counts["error"] + counts["warning"] + counts["refactor"] + counts["convention"]
+    return 10.0 - ((float(weighted) / statements) * 10)
+
+
+def format_results(files, results, extra, root, line_ranges=None):
+    """
+    Formats per-file results in the same layout as pylint's text output,
+    with paths relative to the linted root
+
+    Named:
+    line_ranges (dict): if specified, only messages within each file's (first, last)
+                        line ranges are included
+    """
+
+    lines = []
+    groups = list(extra)
+    for filename in files:
+        result = results.get(filename)
+        messages = result["messages"] if result else []
+        if line_ranges is not None:
+            ranges = line_ranges.get(filename, [])
+            messages = [m for m in messages if in_ranges(m["line"] or 0, ranges)]
+
+        if messages:
+            path = os.path.relpath(filename, root)
+            module = result["module"] or os.path.splitext(path)[0].replace(os.sep, ".")
+            groups.append((module, [dict(m, path=path) for m in messages]))
+
+    for module, messages in groups:
+        lines.append(MODULE_FORMAT.format(module))
+        for message in messages:
+            lines.append(MESSAGE_FORMAT.format(**message).replace("\n", "\n "))
+
+    return "\n".join(lines)
+
+
+def build_report(files, results, extra, root, score, timings, line_ranges=None): # pylint: disable=too-many-arguments
+    """
+    Builds the structured report of a run: every linted file with its statement count and
+    messages, messages that couldn't be attributed to a linted file, the raw and clamped
+    score (or None if nothing was scored), the time taken by each phase in seconds and
+    the spans of the functions wrapped by crash_reporter (see get_spans)
+
+    Named:
+    line_ranges (dict): if specified, only messages within each file's (first, last)
+                        line ranges are included
+    """
+
+    entries = []
+    for filename in files:
+        result = results.get(filename)
+        messages = result["messages"] if result else []
+        if line_ranges is not None:
+            ranges = line_ranges.get(filename, [])
+            messages = [m for m in messages if in_ranges(m["line"] or 0, ranges)]
+
+        entries.append({"path": get_report_path(filename, root),
+                        "statements": result["statements"] if result else None,
+                        "violations": [get_violation(message) for message in messages]})
+
+    unattributed = [dict(get_violation(message), path=message["path"].replace(os.sep, "/"))
+                    for _, messages in extra for message in messages]
+    return {"tool": {"name": "pylint", "version": pylint.__version__},
+            "root": root,
+            "files": entries,
+            "unattributed": unattributed,
+            "violations": sum(len(entry["violations"]) for entry in entries),
+            "score": None if score is None else {"raw": score, "clamped": max(score, 0),
+                                                 "max": 10},
+            "timings": timings,
+            "spans": get_spans()}
+
+
+def get_violation(message):
+    """
+    Converts one of pylint's messages into a report violation, with 1-based columns
+    """
+
+    column = message["column"]
+    return {"rule": message["symbol"], "code": message["msg_id"],
+            "severity": message["category"], "line": message["line"],
+            "column": column + 1 if column is not None else None,
+            "message": message["msg"]}
+
+
+def get_report_path(filename, root):
+    """
+    Gets the path of a file as it appears in reports: relative to the root, using "/"
+    """
+
+    return os.path.relpath(filename, root).replace(os.sep, "/")
+
+
+def to_sarif(report):
+    """
+    Converts a structured report into a SARIF log with a single run
+    """
+
+    results = []
+    for entry in report["files"] + [{"path": None, "violations": report["unattributed"]}]:
+        for violation in entry["violations"]:
+            region = {}
+            if violation["line"]:
+                region["startLine"] = violation["line"]
+                if violation["column"]:
+                    region["startColumn"] = violation["column"]
+
+            location = {"artifactLocation": {"uri": entry["path"] or violation["path"],
+                                             "uriBaseId": SARIF_ROOT}}
+            if region:
+                location["region"] = region
+            results.append({"ruleId": violation["rule"],
+                            "level": SARIF_LEVELS.get(violation["severity"], "warning"),
+                            "message": {"text": violation["message"]},
+                            "locations": [{"physicalLocation": location}]})
+
+    artifacts = [{"location": {"uri": entry["path"], "uriBaseId": SARIF_ROOT},
+                  "properties": {"statements": entry["statements"]}}
+                 for entry in report["files"]]
+    run = {"tool": {"driver": {"name": report["tool"]["name"],
+                               "version": report["tool"]["version"]}},
+           "originalUriBaseIds": {SARIF_ROOT: {"uri": pathlib.Path(report["root"]).as_uri()
+                                               + "/"}},
+           "artifacts": artifacts,
+           "results": results,
+           "properties": {"score": report["score"], "timings": report["timings"],
+                          "spans": report["spans"]}}
+    return {"$schema": SARIF_SCHEMA, "version": SARIF_VERSION, "runs": [run]}
+
+
+def write_report(report, report_format, report_file):
+    """
+    Writes a structured report to the given file object in the given format
+    ("json" or "sarif"), serializing it as it is written
+    """
+
+    document = to_sarif(report) if report_format == "sarif" else report
+    json.dump(document, report_file, indent=2)
+    report_file.write("\n")
+    report_file.flush()
+
+
+def get_cache_path():
+    """
+    Gets the path of the persistent result cache, stored in the user's cache directory
+    so that it is shared between every project that is linted
+    """
+
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base, CACHE_DIRECTORY, CACHE_NAME)
+
+
+def empty_cache():
+    """
+    Creates an empty result cache
+    """
+
+    return {"version": CACHE_VERSION, "files": {}, "scores": {}}
+
+
+def load_cache():
+    """
+    Loads the persistent result cache, starting over if it is missing, unreadable,
+    or was written by a different version of this script
+    """
+
+    try:
+        with open(get_cache_path(), "r") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return empty_cache()
+
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return empty_cache()
+
+    return cache
+
+
+def save_cache(cache):
+    """
+    Writes the result cache back to disk, dropping entries for files that no longer
+    exist. The file is replaced atomically so concurrent runs can't corrupt it
+    """
+
+    cache["files"] = {f: entry for f, entry in cache["files"].items() if os.path.exists(f)}
+    cache.pop("stats", None)
+    cache_path = get_cache_path()
+    temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temp_path, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # The cache is only an optimization
+        pass
+
+
+def lookup_cache(cache, files, options_key):
+    """
+    Splits the given files into those with a valid cached result and those that need
+    to be linted (their contents, the options, or the pylint version changed)
+
+    Returns:
+    a dict of cached results by filepath and a list of stale filepaths
+    """
+
+    results = {}
+    stale = []
+    for filename in files:
+        entry = cache["files"].get(filename)
+        if entry is not None and entry["key"] == get_file_key(filename, options_key):
+            results[filename] = entry["result"]
+        else:
+            stale.append(filename)
+
+    return results, stale
+
+
+def update_cache(cache, results, options_key):
+    """
+    Stores fresh per-file results in the cache
+    """
+
+    for filename, result in results.items():
+        cache["files"][filename] = {"key": get_file_key(filename, options_key),
+                                    "result": result}
+
+
+def get_file_key(filename, options_key):
+    """
+    Gets the cache key of a file: the hash of its contents combined with the options key
+    """
+
+    digest = hashlib.sha256()
+    try:
+        with open(filename, "rb") as source_file:
+            for block in iter(lambda: source_file.read(65536), b""):
+                digest.update(block)
+    except OSError:
+        return None
+
+    return "{}-{}".format(digest.hexdigest(), options_key)
+
+
+def get_options_key(options):
+    """
+    Gets a key identifying the effective pylint options and the installed pylint version,
+    both of which invalidate every cached result when changed
+    """
+
+    version = getattr(pylint, "__version__", None)
+    key = json.dumps({"options": options, "pylint": version}, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
 
 
 def get_options(additional_options, strict=False):
@@ -216,17 +1809,74 @@ def bootstrap():
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     parser.add_argument("--root", "-r", metavar="path",
                         help="the path to run pylint over (defaults to current working directory)")
-    parser.add_argument("--parallel", "-p", "-j", metavar="count",
-                        help="the number of parallel processes to split pylint into")
+    parser.add_argument("--parallel", "-p", "-j", metavar="count", type=int,
+                        help="the number of parallel processes to split pylint into "
+                        "(0 to use every core)")
     parser.add_argument("--verbose", "-v", action="store_true",
                         help="whether to display additional output")
     parser.add_argument("--all", "-a", "--strict", action="store_true",
                         help="enables all checks (strict mode)")
+    parser.add_argument("--include", metavar="glob", action="append",
+                        help="only lints files matching the glob (can be repeated)")
+    parser.add_argument("--exclude", metavar="glob", action="append",
+                        help="skips files and directories matching the glob (can be repeated)")
+    parser.add_argument("--changed-since", metavar="ref",
+                        help="only lints files that changed since the given git ref")
+    parser.add_argument("--staged", action="store_true",
+                        help="only lints files with changes staged in git")
+    parser.add_argument("--changed-lines", action="store_true",
+                        help="only reports messages on changed lines (with --changed-since "
+                        "or --staged)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="lints every file instead of reusing cached results")
+    parser.add_argument("--engine", choices=ENGINES, default=ENGINES[0],
+                        help="whether to run pylint within this process (falling back to a "
+                        "subprocess if that fails) or always in a subprocess")
+    parser.add_argument("--client", dest="engine", action="store_const", const="daemon",
+                        help="sends files to the lint daemon, starting it if necessary")
+    parser.add_argument("--daemon", action="store_true",
+                        help="runs the lint daemon, which keeps pylint loaded between runs")
+    parser.add_argument("--idle-timeout", metavar="seconds", type=float,
+                        default=DAEMON_IDLE_TIMEOUT,
+                        help="how long the lint daemon waits for jobs before shutting down")
+    parser.add_argument("--format", "-f", choices=REPORT_FORMATS, default=REPORT_FORMATS[0],
+                        help="also writes a JSON or SARIF report of the run (the text output "
+                        "moves to stderr if the report is written to stdout)")
+    parser.add_argument("--output", "-o", metavar="path", default="-",
+                        help="the file to write the report to (defaults to stdout)")
+    parser.add_argument("--watch", "-w", action="store_true",
+                        help="keeps running, re-linting files whenever they change")
+    parser.add_argument("--timings", action="store_true",
+                        help="prints how long each phase of the run took")
+    parser.add_argument("--profile", metavar="path",
+                        help="profiles the run with cProfile, writing the stats to the file")
 
     # Parse arguments
     parsed_args = parser.parse_args()
-    main(root=parsed_args.root, process_count=parsed_args.parallel,
-         verbose=parsed_args.verbose, strict=parsed_args.all)
+    if parsed_args.watch and (parsed_args.changed_since or parsed_args.staged):
+        parser.error("--watch can't be combined with --changed-since or --staged")
+    if parsed_args.daemon:
+        run_daemon(idle_timeout=parsed_args.idle_timeout)
+        return
+
+    with contextlib.ExitStack() as stack:
+        report_file = sys.stdout
+        if parsed_args.format != "text" and parsed_args.output != "-":
+            report_file = stack.enter_context(open(parsed_args.output, "w"))
+        elif parsed_args.format != "text":
+            # Keep stdout for the report alone
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        if parsed_args.profile is not None:
+            stack.enter_context(profile_run(parsed_args.profile))
+
+        main(root=parsed_args.root, process_count=parsed_args.parallel,
+             verbose=parsed_args.verbose, strict=parsed_args.all,
+             use_cache=not parsed_args.no_cache, engine=parsed_args.engine,
+             changed_since=parsed_args.changed_since, staged=parsed_args.staged,
+             changed_lines=parsed_args.changed_lines, includes=parsed_args.include,
+             excludes=parsed_args.exclude, report_format=parsed_args.format,
+             report_file=report_file, watch=parsed_args.watch,
+             show_timings=parsed_args.timings)
 
 
 # Run script